@@ -13,45 +13,84 @@ from utils.plot_utils import (
     plot_number_of_detections,
     plot_number_of_detections_yolo8,
     plot_number_of_detections_yolo8_and_tracking,
-    plot_number_of_detections_tracked_and_filtered
-
+    plot_number_of_detections_tracked_and_filtered,
+    plot_width_px,
 )
+from utils.lod import load_lod_pyramid, lod_envelope
+
+from utils.product_io import load_products
+from utils.profiling import profiled
+from utils.window_sweep import sweep_windows
+
+
+# Frame column and padding rows of each product when a window is cut out of it (sweep mode, utils/window_sweep.py)
+WINDOW_SLICING = {
+    "time": ("frame", 1),
+    "clean": ("frame", 0),
+    "raw": ("frame", 0),
+}   # YOLO counts are passed whole: their maximum over the event sets the y-axis
+
 
-def plot_detections() -> None:
+@profiled()
+def plot_detections(windows: list | None = None) -> None:
 
     #  Determine detections of YOLOv8
     base_dir = Path(r"D:\roman\Documents\Daten_Masterarbeit\03_output_Detection_Tracking")
     output_file = base_dir / config.EVENT /  'detections' /  f"df_detections_yolo_{config.EVENT}.parquet"
 
-    # Check if file exists
-    if output_file.exists():
-        logging.info(f"File already exists: {output_file}. Loading existing DataFrame.")
-        df = pd.read_parquet(output_file)
-    else:
+    def load_yolo_counts() -> pd.DataFrame:
+        # Check if file exists
+        if output_file.exists():
+            logging.info(f"File already exists: {output_file}. Loading existing DataFrame.")
+            return pd.read_parquet(output_file)
+
         logging.info(f"File not found. Computing detection counts for event {config.EVENT}...")
         df = get_detection_counts_yolo(config.EVENT, base_dir)                                     # calc detections per frame
         df.to_parquet(output_file)
         logging.info(f"Saved DataFrame to {output_file}")
+        return df
+
+    # YOLO cache, LOD pyramid and products loaded concurrently, detections plots only need frame and track
+    extra_loaders = {"yolo": load_yolo_counts}
+    if config.USE_LOD_PYRAMID:
+        extra_loaders["lod"] = load_lod_pyramid
+    dfs = load_products(["time", "clean", "raw"],
+                        columns={"clean": ["frame", "track"], "raw": ["frame", "track"]},
+                        extra_loaders=extra_loaders)
+
+    sweep_windows(render_detections, dfs, WINDOW_SLICING, windows or [(config.START_FRAME, config.END_FRAME)])
+
+
+def render_detections(dfs) -> None:
 
+    df = dfs["yolo"]
+    df_time = dfs["time"]
+    df_clean = dfs["clean"]
+    df_raw = dfs["raw"]
 
-    df_time = pd.read_parquet(config.OUTPUT_DIR/ f"df_time_{config.EVENT}.parquet")
-    df_clean = pd.read_parquet(config.OUTPUT_DIR / f"df_clean_{config.EVENT}.parquet")
-    df_raw = pd.read_parquet(config.OUTPUT_DIR / f"df_raw_{config.EVENT}.parquet")
+    # Long windows: min / max envelope of the tracked / filtered counts at the LOD level of the figure width
+    df_lod_counts = None
+    if dfs.get("lod") is not None:
+        df_lod_counts = lod_envelope(dfs["lod"], "detections", ["tracked", "filtered"],
+                                     config.START_FRAME, config.END_FRAME, plot_width_px(config))
 
-    plot_number_of_detections(df_clean, df_time, config)
+    plot_number_of_detections(df_clean, df_time, config, df_lod_counts=df_lod_counts)
 
-    plot_number_of_detections_yolo8(df_clean=df_clean, df_counts_yolo=df, df_time=df_time, config=config)
+    plot_number_of_detections_yolo8(df_clean=df_clean, df_counts_yolo=df, df_time=df_time, config=config,
+                                    df_lod_counts=df_lod_counts)
 
     plot_number_of_detections_yolo8_and_tracking(df_clean=df_clean, df_counts_yolo=df,df_raw=df_raw, df_time=df_time, config=config,
                                                  legend_loc="upper right",
                                                  add_surge_classes=False,
                                                  legend_loc_surge="upper left",
+                                                 df_lod_counts=df_lod_counts,
     )
 
     plot_number_of_detections_tracked_and_filtered(df_clean=df_clean,df_raw=df_raw, df_time=df_time, config=config,
                                                    legend_loc="upper right",
                                                    add_surge_classes=False,
                                                    legend_loc_surge="upper left",
+                                                   df_lod_counts=df_lod_counts,
                                                    )
 
     logging.info("--- Detections per FRAME plots done --- \n")
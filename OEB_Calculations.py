@@ -10,28 +10,53 @@ from utils.data_utils import (
     load_piv_data,
     merge_piv_and_tracking,
     clean_frames_low_detections,
-    compute_track_grainsize
+    compute_track_grainsize,
+    calculation_window,
+    select_tracks_in_window,
 )
 
+from utils.bootstrap import bootstrap_lowess_bands
+from utils.product_io import read_product, write_product, product_path, resolve_product
+from utils.profiling import profiled
+
+
+def load_clean_for_calculation() -> pd.DataFrame:
+    """
+    df_clean of the whole event, or only the tracks inside the frame window + margin (config.WINDOWED_CALCULATION).
+    """
+    df_clean = read_product("clean")
+
+    if config.WINDOWED_CALCULATION:
+        start, end = calculation_window(config)
+        df_clean = select_tracks_in_window(df_clean, start, end)
+        print(f"Windowed calculation: frames {start} - {end} ({len(df_clean)} detections)")
+
+    return df_clean
+
+
+@profiled()
 def calculate_vel(run_calc_per_frame = True, run_calc_per_track = True)-> None:
 
     event = config.EVENT
-    output_dir = config.OUTPUT_DIR
 
     # -------------------------------------------------------------------------
     # Load Clean DataFrame
     # -------------------------------------------------------------------------
-    df_clean = pd.read_parquet(output_dir / f"df_clean_{event}.parquet")
+    df_clean = load_clean_for_calculation()
 
     if run_calc_per_frame:
         # -------------------------------------------------------------------------
         # Compute Statistics Per Frame
         # -------------------------------------------------------------------------
         # Compute per-frame mean and median statistics
-        df_stats = compute_mean_median_per_frame(df_clean)
+        df_stats = compute_mean_median_per_frame(df_clean, config)
+
+        if config.WINDOWED_CALCULATION:
+            # frames outside the window + margin only have part of their detections
+            df_stats = df_stats[df_stats["frame"].between(*calculation_window(config))]
 
         # Save per-frame statistics as CSV
-        df_stats.to_csv(output_dir / f"df_stats_{event}.csv", index=False)
+        df_stats.to_csv(product_path(resolve_product("stats"), ext="csv"), index=False)
 
         # Prepare moving-average DataFrame for plotting
         df_mova = prepare_df_for_plot(
@@ -41,13 +66,13 @@ def calculate_vel(run_calc_per_frame = True, run_calc_per_track = True)-> None:
         )
 
         # Save moving-average CSV
-        df_mova.to_csv(output_dir / f"df_mova_{event}.csv", index=False)
-        df_mova.to_parquet(output_dir / f"df_mova_{event}.parquet")
+        df_mova.to_csv(product_path(resolve_product("mova"), ext="csv"), index=False)
+        write_product(df_mova, "mova")
 
         # Load and Save PIV Velocities
         df_piv = load_piv_data(event=event)
         df_piv_mova = merge_piv_and_tracking(df_piv, df_mova)
-        df_piv_mova.to_parquet(output_dir / f"df_piv_mova_{event}.parquet")
+        write_product(df_piv_mova, "piv_mova")
         print(f"\nStatistics calculation per FRAME complete for event {event}.")
 
 
@@ -56,34 +81,33 @@ def calculate_vel(run_calc_per_frame = True, run_calc_per_track = True)-> None:
         # Compute Statistics Per Track
         # -------------------------------------------------------------------------
         df_per_track_velocities, df_velocities_lowess = compute_track_velocities(df_clean, config)
+        if config.BOOTSTRAP_REPLICATES > 0:
+            df_velocities_lowess = bootstrap_lowess_bands(df_per_track_velocities,
+                                                          f"{config.STATISTIC_TYPE}_track_velocity",
+                                                          df_velocities_lowess, config)
 
         # Save track-based statistics
-        df_per_track_velocities.to_parquet(
-            output_dir / f"df_per_track_velocities_{event}.parquet"
-        )
-        df_velocities_lowess.to_parquet(
-            output_dir / f"df_velocities_lowess_{event}.parquet"
-        )
+        write_product(df_per_track_velocities, "per_track_velocities")
+        write_product(df_velocities_lowess, "velocities_lowess")
         print(f"\nStatistics calculation per TRACK complete for event {event}.")
 
 
 
+@profiled()
 def calculate_gs() -> None:
 
     event = config.EVENT
-    output_dir = config.OUTPUT_DIR
 
-    df_clean = pd.read_parquet(output_dir / f"df_clean_{event}.parquet")
+    df_clean = load_clean_for_calculation()
 
     df_per_track_grainsize, df_grainsize_lowess = compute_track_grainsize(df_clean, config)
+    if config.BOOTSTRAP_REPLICATES > 0:
+        df_grainsize_lowess = bootstrap_lowess_bands(df_per_track_grainsize, "mean_track_grainsize",
+                                                     df_grainsize_lowess, config)
 
     # Save track-based statistics
-    df_per_track_grainsize.to_parquet(
-        output_dir / f"df_per_track_grainsize_{event}.parquet"
-    )
-    df_grainsize_lowess.to_parquet(
-        output_dir / f"df_grainsize_lowess_{event}.parquet"
-    )
+    write_product(df_per_track_grainsize, "per_track_grainsize")
+    write_product(df_grainsize_lowess, "grainsize_lowess")
     print(f"\nGrain Size calculation per TRACK complete for event {event}.")
 
 
@@ -0,0 +1,322 @@
+# =============================================================================
+# Interactive exploration of an event in the browser
+# =============================================================================
+# Local HTTP server (standard library only) over the Parquet products of an event: per-frame statistics
+# (df_mova, df_piv_mova), per-track statistics with their LOWESS curves and the detection counts per frame.
+# The browser draws with plotly.js and asks for the visible frame range only; the server answers with a
+# min/max decimated series (utils/decimation.py), a few points per pixel column, so zoom and pan stay fast
+# over events of 100k frames.
+#
+#   python OEB_Dashboard.py --event 2024_06_14              (then open http://127.0.0.1:8050)
+#
+# plotly.js is served from config.PLOTLY_JS_PATH or the local plotly Python package, no network service is used:
+# without a local copy the dashboard does not start.
+
+import argparse
+import importlib.util
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.data_utils import count_tracks_per_frame
+from utils.decimation import minmax_decimate
+from utils.lod import LOD_SERIES, load_lod_pyramid, lod_envelope
+from utils.plot_utils import FrameTimeFormatter
+from utils.product_io import read_product, product_path
+from utils.run_utils import apply_run_settings
+
+# Views of the dashboard: traces drawn together, (product, x column, y column) each
+DASHBOARD_VIEWS = {
+    "velocity_per_frame": {
+        "title": "Velocity per frame", "y_label": "Velocity (m/s)",
+        "traces": [
+            {"product": "mova", "y": "mean_velocity_per_frame", "name": "Mean velocity per frame", "color": "#b3b3b3"},
+            {"product": "mova", "y": "mean_vel_ma", "name": "Moving average", "color": "#4682b4"},
+            {"product": "piv_mova", "y": "piv_vel_smoothed", "name": "PIV surface velocity smoothed",
+             "color": "#d62728"},
+        ],
+    },
+    "grainsize_per_frame": {
+        "title": "Grain size per frame", "y_label": "Grain Size (m)",
+        "traces": [
+            {"product": "mova", "y": "mean_grainsize_per_frame", "name": "Mean grain size per frame",
+             "color": "#b3b3b3"},
+            {"product": "mova", "y": "mean_grain_ma", "name": "Moving average", "color": "#ff8c00"},
+        ],
+    },
+    "track_velocity": {
+        "title": "Velocity per track", "y_label": "Velocity (m/s)",
+        "traces": [
+            {"product": "per_track_velocities", "x": "center_frame", "y": "mean_track_velocity",
+             "name": "Mean velocity per track", "color": "#b3b3b3", "mode": "markers"},
+            {"product": "velocities_lowess", "y": "p5", "name": "p5", "color": "#999999", "dash": "dot"},
+            {"product": "velocities_lowess", "y": "p95", "name": "p95", "color": "#999999", "dash": "dot"},
+            {"product": "velocities_lowess", "y": "lowess_mean_track_velocity",
+             "name": "Smoothed track velocities (LOWESS)", "color": "#1f77b4"},
+            {"product": "piv_mova", "y": "piv_vel_smoothed", "name": "PIV surface velocity smoothed",
+             "color": "#d62728"},
+        ],
+    },
+    "track_grainsize": {
+        "title": "Grain size per track", "y_label": "Grain Size (m)",
+        "traces": [
+            {"product": "per_track_grainsize", "x": "center_frame", "y": "mean_track_grainsize",
+             "name": "Mean grain size per track", "color": "#b3b3b3", "mode": "markers"},
+            {"product": "grainsize_lowess", "y": "lowess_mean_track_grainsize",
+             "name": "Smoothed track grain sizes (LOWESS)", "color": "#1f77b4"},
+        ],
+    },
+    "detections": {
+        "title": "Detections per frame", "y_label": "Number of Boulders",
+        "traces": [
+            {"product": "detections", "y": "tracked", "name": "Tracked", "color": "#17becf"},
+            {"product": "detections", "y": "filtered", "name": "Filtered", "color": "#2ca02c"},
+        ],
+    },
+}
+
+
+class DashboardData:
+    """
+    Products of one event, loaded on first use and sorted by their frame column once.
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+        self.series = {}        # (product, x column) -> DataFrame sorted by x
+        df_time = self._load("time")
+        self.formatter = FrameTimeFormatter(df_time)
+        self.frame_range = (int(df_time["frame"].min()), int(df_time["frame"].max())) if df_time is not None else (0, 1)
+        self.lod = load_lod_pyramid(event) if config.USE_LOD_PYRAMID else None
+
+    def _load(self, product: str) -> pd.DataFrame | None:
+        if product == "detections":
+            df_raw, df_clean = self._load("raw"), self._load("clean")
+            return None if df_raw is None or df_clean is None else count_tracks_per_frame(df_raw, df_clean)
+        if not product_path(product, self.event).exists():
+            logging.warning(f"Dashboard: df_{product}_{self.event} not found, its traces are left out")
+            return None
+        columns = ["frame", "track"] if product in ("raw", "clean") else None
+        return read_product(product, columns=columns, event=self.event, windowed=False)
+
+    def get(self, product: str, x: str) -> pd.DataFrame | None:
+        key = (product, x)
+        if key not in self.series:
+            df = self._load(product)
+            self.series[key] = None if df is None else df.sort_values(x, kind="stable").reset_index(drop=True)
+        return self.series[key]
+
+    def view_series(self, view: str, start: float, end: float, width: int) -> list[dict]:
+        """
+        Traces of a view for the frame range start - end, decimated to the pixel width of the plot.
+        """
+        traces = []
+        for spec in DASHBOARD_VIEWS[view]["traces"]:
+            x_col = spec.get("x", "frame")
+            if self.lod is not None and spec["y"] in LOD_SERIES.get(spec["product"], []):
+                # zoomed out: min / max envelope from the LOD pyramid, the product is only loaded for close zooms
+                df_envelope = lod_envelope(self.lod, spec["product"], [spec["y"]], start, end, width)
+                if df_envelope is not None:
+                    x = df_envelope["frame"].to_numpy(dtype=float)
+                    traces.append(self._trace(spec, x, df_envelope[spec["y"]].to_numpy(dtype=float), start))
+                    continue
+
+            df = self.get(spec["product"], x_col)
+            if df is None or spec["y"] not in df.columns:
+                continue
+
+            x = df[x_col].to_numpy(dtype=float)
+            y = df[spec["y"]].to_numpy(dtype=float)
+            rows = minmax_decimate(x, [y], start, end, width)
+            x, y = x[rows], y[rows]
+
+            if "segment" in df.columns and spec.get("mode", "lines") == "lines" and len(rows) > 1:
+                # LOWESS segments: break the line where the segment changes
+                segment = df["segment"].to_numpy()[rows]
+                breaks = np.flatnonzero(segment[1:] != segment[:-1]) + 1
+                x = np.insert(x, breaks, np.nan)
+                y = np.insert(y, breaks, np.nan)
+
+            traces.append(self._trace(spec, x, y, start))
+        return traces
+
+    def _trace(self, spec: dict, x: np.ndarray, y: np.ndarray, start: float) -> dict:
+        return {
+            **spec,
+            "x": _json_values(x),
+            "y": _json_values(y),
+            "time": self.formatter.format_ticks(np.nan_to_num(x, nan=start)),
+        }
+
+
+def _json_values(values: np.ndarray) -> list:
+    # NaN is not valid JSON -> null (gap in the plot)
+    return [None if v != v else v for v in values.tolist()]
+
+
+def plotly_js_path() -> Path | None:
+    """
+    Local plotly.min.js: config.PLOTLY_JS_PATH or the copy shipped with the plotly Python package.
+    """
+    if config.PLOTLY_JS_PATH is not None and Path(config.PLOTLY_JS_PATH).exists():
+        return Path(config.PLOTLY_JS_PATH)
+    spec = importlib.util.find_spec("plotly")
+    if spec is not None and spec.origin is not None:
+        path = Path(spec.origin).parent / "package_data" / "plotly.min.js"
+        if path.exists():
+            return path
+    return None
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+
+    data: DashboardData = None
+    plotly_js: Path | None = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == "/":
+                self._send(DASHBOARD_HTML.encode(), "text/html")
+            elif url.path == "/plotly.min.js":
+                self._send(self.plotly_js.read_bytes(), "application/javascript")
+            elif url.path == "/api/views":
+                views = {name: {"title": v["title"], "y_label": v["y_label"]} for name, v in DASHBOARD_VIEWS.items()}
+                self._send_json({"event": self.data.event, "frame_range": self.data.frame_range, "views": views})
+            elif url.path == "/api/series":
+                view = query.get("view", "velocity_per_frame")
+                if view not in DASHBOARD_VIEWS:
+                    self.send_error(404, f"Unknown view {view}")
+                    return
+                start = float(query.get("start", self.data.frame_range[0]))
+                end = float(query.get("end", self.data.frame_range[1]))
+                width = min(max(int(query.get("width", 1200)), 100), 8000)
+                self._send_json({"traces": self.data.view_series(view, start, end, width)})
+            else:
+                self.send_error(404)
+        except (ValueError, KeyError) as e:
+            self.send_error(400, str(e))
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: dict):
+        self._send(json.dumps(payload).encode(), "application/json")
+
+    def log_message(self, format, *args):
+        logging.debug("Dashboard: " + format % args)
+
+
+def run_dashboard(event: str, host: str = "127.0.0.1", port: int = 8050) -> None:
+    plotly_js = plotly_js_path()
+    if plotly_js is None:
+        raise SystemExit("Dashboard: no local plotly.min.js found. Set config.PLOTLY_JS_PATH to a copy of "
+                         "plotly.min.js or install the plotly Python package.")
+
+    apply_run_settings(config, event=event)
+    DashboardHandler.data = DashboardData(event)
+    DashboardHandler.plotly_js = plotly_js
+
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    print(f"Dashboard of event {event}: http://{host}:{port}  (plotly.js: {plotly_js}, Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Interactive dashboard over the products of an event.")
+    parser.add_argument("--event", default=config.EVENT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=config.DASHBOARD_PORT)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    run_dashboard(args.event, args.host, args.port)
+
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>OEB dashboard</title>
+<script src="/plotly.min.js"></script>
+<style>
+  body { font-family: sans-serif; margin: 12px; }
+  #plot { width: 100%; height: 80vh; }
+  #info { color: #666; margin-left: 12px; }
+</style>
+</head>
+<body>
+<select id="view"></select><span id="info"></span>
+<div id="plot"></div>
+<script>
+const plot = document.getElementById("plot");
+const select = document.getElementById("view");
+const info = document.getElementById("info");
+let meta = null, range = null, pending = null;
+
+async function load(start, end) {
+  range = [start, end];
+  const view = select.value;
+  const url = `/api/series?view=${view}&start=${start}&end=${end}&width=${Math.round(plot.clientWidth)}`;
+  const t0 = performance.now();
+  const payload = await (await fetch(url)).json();
+  const traces = payload.traces.map(t => ({
+    type: "scattergl", name: t.name, x: t.x, y: t.y, customdata: t.time,
+    mode: t.mode || "lines", connectgaps: false,
+    line: {color: t.color, dash: t.dash || "solid", width: 1.5},
+    marker: {color: t.color, size: 4},
+    hovertemplate: "frame %{x}<br>%{customdata}<br>%{y:.3f}<extra>%{fullData.name}</extra>",
+  }));
+  const layout = {
+    title: `${meta.views[view].title} - event ${meta.event}`,
+    xaxis: {title: "Frame Number", range: [start, end]},
+    yaxis: {title: meta.views[view].y_label},
+    uirevision: view, legend: {orientation: "h"}, margin: {t: 50},
+  };
+  await Plotly.react(plot, traces, layout, {responsive: true});
+  const points = payload.traces.reduce((n, t) => n + t.x.length, 0);
+  info.textContent = `frames ${Math.round(start)} - ${Math.round(end)} | ${points} points | ${Math.round(performance.now() - t0)} ms`;
+}
+
+function fullRange() { load(meta.frame_range[0], meta.frame_range[1]); }
+
+async function init() {
+  meta = await (await fetch("/api/views")).json();
+  for (const [name, v] of Object.entries(meta.views)) select.add(new Option(v.title, name));
+  select.onchange = () => load(range[0], range[1]);
+  await load(meta.frame_range[0], meta.frame_range[1]);
+  plot.on("plotly_relayout", ev => {
+    // new data for the zoomed / panned range (debounced)
+    clearTimeout(pending);
+    if (ev["xaxis.range[0]"] !== undefined) {
+      pending = setTimeout(() => load(ev["xaxis.range[0]"], ev["xaxis.range[1]"]), 80);
+    } else if (ev["xaxis.autorange"]) {
+      pending = setTimeout(fullRange, 80);
+    }
+  });
+}
+init();
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# =============================================================================
+# Filter threshold sweep
+# =============================================================================
+# Kept tracks and derived metrics of filter steps 1 - 5 (OEB_Filter_process.py) for a whole grid of thresholds
+# without running the filter per setting. Every filter step decides per track, so one pass computes the
+# sufficient statistics of each track: y-displacement (step 3), largest 3D jump (step 4), number of detections
+# and, once per (VELOCITY_RANGE, MIN_ROLL_WINDOW, MAX_ROLL_WINDOW), the median of the rolling median velocity
+# (step 5). The thresholds YAXIS_MIN_LENGTH, JUMP_THRESHOLD and MIN_MEDIAN_TRACK_VEL are then evaluated for all
+# combinations as vectorized masks over the tracks. Grid: config.FILTER_SWEEP_GRID or the command line.
+#
+#   python OEB_Filter_Sweep.py --event 2024_06_14
+#   python OEB_Filter_Sweep.py --event 2024_06_14 --yaxis-min-length 0.1 0.2 0.5 --jump-threshold 0.5 1 2
+#
+# Output: output/<event>/filter_sweep_<event>.csv, one row per combination (columns named like the config values)
+
+import argparse
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils import track_kernels
+from utils.data_utils import load_and_merge_event_data
+from utils.product_io import read_product, product_path
+from utils.profiling import profiled
+from utils.run_utils import apply_run_settings
+from utils.schema import enforce_schema
+
+
+# Parameters of the per-track velocity medians (one rolling median pass per combination) and the thresholds
+# evaluated as masks
+VELOCITY_PARAMETERS = ["VELOCITY_RANGE", "MIN_ROLL_WINDOW", "MAX_ROLL_WINDOW"]
+THRESHOLD_PARAMETERS = ["YAXIS_MIN_LENGTH", "JUMP_THRESHOLD", "MIN_MEDIAN_TRACK_VEL"]
+
+SWEEP_CHUNK = 256               # threshold combinations per (combinations x tracks) mask block
+
+
+def track_statistics(df_raw: pd.DataFrame) -> dict:
+    """
+    Per-track statistics that do not depend on any threshold, tracks in ascending id order.
+    velocity / offsets: raw velocities in the row order of the rolling median filter (step 2).
+    """
+    track = df_raw["track"].to_numpy()
+
+    # steps 3 and 4 work on tracks sorted by frame
+    order = track_kernels.sort_order(track, df_raw["frame"].to_numpy())
+    rows = np.arange(len(df_raw)) if order is None else order
+    offsets = track_kernels.track_offsets(track[rows])
+    xyz = df_raw[["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]].to_numpy(dtype=np.float64)[rows]
+
+    # step 2 keeps the row order within a track
+    order_roll = track_kernels.sort_order(track)
+    rows_roll = np.arange(len(df_raw)) if order_roll is None else order_roll
+
+    return {
+        "track": track[rows][offsets[:-1]],
+        "length": np.diff(offsets),
+        "y_displacement": track_kernels.y_displacement(xyz[:, 1], offsets),
+        "max_jump": track_kernels.max_jump(xyz, offsets),
+        "velocity": df_raw["velocity"].to_numpy(dtype=np.float64)[rows_roll],
+        "offsets": offsets,             # same track lengths in both orders
+    }
+
+
+def track_nanmedian(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Median per track ignoring NaN (groupby median), NaN for tracks without valid value.
+    """
+    lengths = np.diff(offsets)
+    track_index = np.repeat(np.arange(len(lengths)), lengths)
+    valid = ~np.isnan(values)
+
+    # within each track: valid values ascending, NaN last
+    order = np.lexsort((np.where(valid, values, np.inf), track_index))
+    sorted_values = values[order]
+    n_valid = np.add.reduceat(valid.astype(np.int64), offsets[:-1]) if len(lengths) else np.zeros(0, dtype=np.int64)
+
+    lo = offsets[:-1] + np.maximum(n_valid - 1, 0) // 2
+    hi = offsets[:-1] + n_valid // 2
+    median = (sorted_values[lo] + sorted_values[hi]) / 2
+    return np.where(n_valid > 0, median, np.nan)
+
+
+def track_median_velocity(stats: dict, vel_range: tuple, min_window: int, max_window: int) -> np.ndarray:
+    """
+    Step 5 statistic: median of the rolling median velocity (steps 1 - 2 with these settings) per track.
+    """
+    velocity = stats["velocity"]
+    velocity = np.where((velocity >= vel_range[0]) & (velocity <= vel_range[1]) & (velocity != 0), velocity, np.nan)
+    filtered = track_kernels.rolling_median(velocity, stats["offsets"], min_window, max_window, min_periods=3)
+    return track_nanmedian(filtered, stats["offsets"])
+
+
+def evaluate_thresholds(stats: dict, median_velocity: np.ndarray, thresholds: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filter result of every threshold combination (rows of thresholds, columns THRESHOLD_PARAMETERS) as
+    (combinations x tracks) masks, in blocks of SWEEP_CHUNK combinations.
+    """
+    lengths = stats["length"].astype(np.float64)
+    y_displacement = stats["y_displacement"]
+    max_jump = stats["max_jump"]
+    velocity = np.nan_to_num(median_velocity)
+
+    columns = {name: [] for name in ["tracks_moving", "tracks_jumping", "tracks_slow", "tracks_kept",
+                                     "detections_kept", "mean_track_velocity"]}
+    for start in range(0, len(thresholds), SWEEP_CHUNK):
+        block = thresholds.iloc[start:start + SWEEP_CHUNK]
+        y_min = block["YAXIS_MIN_LENGTH"].to_numpy(dtype=np.float64)[:, None]
+        jump = block["JUMP_THRESHOLD"].to_numpy(dtype=np.float64)[:, None]
+        v_min = block["MIN_MEDIAN_TRACK_VEL"].to_numpy(dtype=np.float64)[:, None]
+
+        moving = y_displacement < -y_min                            # step 3 (NaN -> not moving)
+        jumping = moving & (max_jump > jump)                        # step 4: df_bad
+        passed = moving & (max_jump <= jump)                        # tracks without valid step drop out here
+        kept = passed & (median_velocity >= v_min)                  # step 5
+
+        n_kept = kept.sum(axis=1)
+        columns["tracks_moving"].append(moving.sum(axis=1))
+        columns["tracks_jumping"].append(jumping.sum(axis=1))
+        columns["tracks_slow"].append(passed.sum(axis=1) - n_kept)
+        columns["tracks_kept"].append(n_kept)
+        columns["detections_kept"].append((kept @ lengths).astype(np.int64))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns["mean_track_velocity"].append((kept @ velocity) / n_kept)
+
+    df = thresholds.reset_index(drop=True).copy()
+    for name, parts in columns.items():
+        df[name] = np.concatenate(parts) if parts else np.empty(0)
+    df["kept_track_fraction"] = df["tracks_kept"] / max(len(lengths), 1)
+    df["mean_track_length"] = df["detections_kept"] / df["tracks_kept"].replace(0, np.nan)
+    return df
+
+
+@profiled()
+def sweep_filter_thresholds(df_raw: pd.DataFrame, grid: dict) -> pd.DataFrame:
+    """
+    Filter result for all combinations of grid ({config name: list of values}, missing names: config value).
+    Per-track statistics once, the velocity medians once per combination of VELOCITY_PARAMETERS.
+    """
+    grid = {name: list(grid.get(name, [getattr(config, name)])) for name in VELOCITY_PARAMETERS + THRESHOLD_PARAMETERS}
+    thresholds = pd.DataFrame(list(itertools.product(*(grid[name] for name in THRESHOLD_PARAMETERS))),
+                              columns=THRESHOLD_PARAMETERS)
+
+    stats = track_statistics(df_raw)
+    logging.info(f"Filter sweep: {len(stats['track'])} tracks, {len(thresholds)} threshold combinations per "
+                 f"velocity setting")
+
+    results = []
+    for vel_range, min_window, max_window in itertools.product(*(grid[name] for name in VELOCITY_PARAMETERS)):
+        median_velocity = track_median_velocity(stats, tuple(vel_range), min_window, max_window)
+        df = evaluate_thresholds(stats, median_velocity, thresholds)
+        df.insert(0, "VELOCITY_RANGE", [tuple(vel_range)] * len(df))
+        df.insert(1, "MIN_ROLL_WINDOW", min_window)
+        df.insert(2, "MAX_ROLL_WINDOW", max_window)
+        results.append(df)
+
+    df_sweep = pd.concat(results, ignore_index=True)
+    df_sweep.insert(len(VELOCITY_PARAMETERS + THRESHOLD_PARAMETERS), "tracks_total", len(stats["track"]))
+    return df_sweep
+
+
+def load_raw(event: str) -> pd.DataFrame:
+    # df_raw of the filter stage if it exists, else the tracking output
+    columns = ["frame", "track", "velocity", "bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]
+    if product_path("raw", event).exists():
+        return read_product("raw", columns=columns, event=event, windowed=False)
+    return enforce_schema(load_and_merge_event_data(event), "raw")[columns]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Kept tracks for a grid of filter thresholds.")
+    parser.add_argument("--event", default=config.EVENT)
+    for name in ["MIN_ROLL_WINDOW", "MAX_ROLL_WINDOW"]:
+        parser.add_argument(f"--{name.lower().replace('_', '-')}", type=int, nargs="+", dest=name)
+    for name in THRESHOLD_PARAMETERS:
+        parser.add_argument(f"--{name.lower().replace('_', '-')}", type=float, nargs="+", dest=name)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    apply_run_settings(config, event=args.event)
+    config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    grid = dict(config.FILTER_SWEEP_GRID)
+    grid.update({name: values for name, values in vars(args).items() if name.isupper() and values is not None})
+
+    df_sweep = sweep_filter_thresholds(load_raw(args.event), grid)
+
+    out_path = config.OUTPUT_DIR / f"filter_sweep_{args.event}.csv"
+    df_sweep.to_csv(out_path, index=False)
+    logging.info(f"Filter sweep: {len(df_sweep)} combinations saved to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import config
 import logging
+import pandas as pd
 
 from utils.data_filter import (
     filter_tracks_range,
@@ -10,17 +11,56 @@ from utils.data_filter import (
 )
 
 from utils.data_utils import load_and_merge_event_data, extract_frame_time_table
+from utils.product_io import write_product
+from utils.schema import enforce_schema
 
+from utils.profiling import profiled
+
+
+@profiled()
 def filter_process():
     logging.info("Filter Process started...")
 
     # --- Load raw Data ---
-    df_raw = load_and_merge_event_data(config.EVENT)
+    df_raw = enforce_schema(load_and_merge_event_data(config.EVENT), "raw")
 
     # --- Extract df_time for later
     df_time = extract_frame_time_table(df_raw)
 
     # --- Apply filters ---
+    df_clean, df_bad = apply_filters(df_raw)
+
+    # --- Summary ---
+    n_tracks = df_clean["track"].nunique()
+    n_tracks_raw = df_raw["track"].nunique()
+
+    logging.info(f" --- Filtering summary:\n"
+        f"Total track IDs in DF:     {n_tracks_raw}\n"
+        f"Removed track IDs:   {n_tracks_raw - n_tracks}\n"
+        f"Remaining track IDs: {n_tracks}\n"
+        
+        f"\n"
+        f"First Image Frame:   {df_clean['frame'].min()}\n"
+        f"Last Image Frame:   {df_clean['frame'].max()}\n"
+        f"Total number of Image Frames:   {df_clean['frame'].nunique()}\n"
+        "\n--- Filter process finished ---\n"
+    )
+
+    # --- Save DFs---
+    write_product(df_raw, "raw")
+    write_product(df_clean, "clean")
+    write_product(df_time, "time")
+    write_product(df_bad, "bad")
+
+
+def apply_filters(df_raw: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Filter steps 1 - 5 with the configured backend (config.BACKEND). Returns df_clean and df_bad.
+    """
+    if config.BACKEND == "polars":
+        from utils.polars_backend import filter_tracks
+        return filter_tracks(df_raw, config)
+
     # Step 1 - Remove clear OUTLIERS and replace zeros with NANS
     df_filtered_01 = filter_tracks_range(
         df_raw,
@@ -51,24 +91,4 @@ def filter_process():
         min_median_track_vel=config.MIN_MEDIAN_TRACK_VEL,
     )
 
-    # --- Summary ---
-    n_tracks = df_clean["track"].nunique()
-    n_tracks_raw = df_raw["track"].nunique()
-
-    logging.info(f" --- Filtering summary:\n"
-        f"Total track IDs in DF:     {n_tracks_raw}\n"
-        f"Removed track IDs:   {n_tracks_raw - n_tracks}\n"
-        f"Remaining track IDs: {n_tracks}\n"
-        
-        f"\n"
-        f"First Image Frame:   {df_clean['frame'].min()}\n"
-        f"Last Image Frame:   {df_clean['frame'].max()}\n"
-        f"Total number of Image Frames:   {df_clean['frame'].nunique()}\n"
-        "\n--- Filter process finished ---\n"
-    )
-
-    # --- Save DFs---
-    df_raw.to_parquet(config.OUTPUT_DIR / f"df_raw_{config.EVENT}.parquet")
-    df_clean.to_parquet(config.OUTPUT_DIR / f"df_clean_{config.EVENT}.parquet")
-    df_time.to_parquet(config.OUTPUT_DIR / f"df_time_{config.EVENT}.parquet")
-    df_bad.to_parquet(config.OUTPUT_DIR / f"df_bad_{config.EVENT}.parquet")
+    return df_clean, df_bad
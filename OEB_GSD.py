@@ -5,10 +5,16 @@ from utils.gsd_utils import (
     plot_gsd_per_surge,
     plot_gsd_single_event,
     plot_gsd_all_events,
-    plot_surge_types_comparison
+    plot_surge_types_comparison,
+    build_gsd_summary,
+    save_gsd_summary,
 )
 
+from utils.product_io import read_product
+from utils.profiling import profiled
 
+
+@profiled()
 def plot_gsd(plot_gsd_all: bool) -> None:
 
     # --- Mapping ---
@@ -26,13 +32,17 @@ def plot_gsd(plot_gsd_all: bool) -> None:
         "Not classified": "lightgray"
     }
 
-    df_per_track_grainsize = pd.read_parquet(config.OUTPUT_DIR/ f"df_per_track_grainsize_{config.EVENT}.parquet")
+    df_per_track_grainsize = read_product("per_track_grainsize", windowed=False)   # GSD always of the whole event
 
     df_surges = pd.read_csv(
         f"input_data/{config.EVENT}/surge_classification_{config.EVENT}.csv",
         sep=";"
     )
 
+    # --- Cache binned GSD of the event and each surge (merged later for multi-event comparisons)
+    df_gsd_summary = build_gsd_summary(df_per_track_grainsize, config.EVENT, df_surges)
+    save_gsd_summary(df_gsd_summary, config.EVENT, config.OUTPUT_DIR.parent)
+
     df_gsd_stats = plot_gsd_per_surge(
         df_per_track_grainsize= df_per_track_grainsize,
         df_surges = df_surges,
@@ -0,0 +1,234 @@
+# =============================================================================
+# Incremental (append-only) filter and per-frame statistics
+# =============================================================================
+# For events that are still being tracked: each call ingests the complete lines added to all_stats_<event>.txt
+# since the last call (from the stored byte offset; the newest frame is held back until it is complete), filters
+# the tracks that can no longer change (last detection more than INCREMENTAL_FINALIZE_FRAMES before the newest
+# frame) and appends them to df_raw / df_time / df_clean / df_bad as part files, without rewriting the stored rows.
+# Per-frame statistics are appended for the frames whose tracks are all finalized. All filter steps work per
+# track and all statistics per frame, so after the final call (finalize=True, parts compacted into single files
+# in the batch row order) the products equal a batch run.
+#
+#   python OEB_Incremental.py --event 2024_06_14 --up-to 40000     (repeat while new frames arrive)
+#   python OEB_Incremental.py --event 2024_06_14 --finalize        (end of the event)
+#   python OEB_Incremental.py --event 2024_06_14 --reset           (delete state and products, start from the first row)
+
+import argparse
+import json
+import logging
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import config
+from OEB_Filter_process import apply_filters
+from utils.data_utils import (
+    load_new_event_rows,
+    extract_frame_time_table,
+    compute_mean_median_per_frame,
+    prepare_df_for_plot,
+)
+from utils.product_io import append_product, compact_product, write_product, product_path, resolve_product
+from utils.profiling import profiled
+from utils.run_utils import apply_run_settings
+from utils.schema import enforce_schema
+
+
+# --- State between the calls (OUTPUT_DIR/incremental) ---
+# state.json:          bytes / rows read from all_stats, newest frame, first frame without final statistics
+# pending.parquet:     raw rows of the tracks that are still open
+# clean_tail.parquet:  clean rows of frames whose statistics are not final yet
+# frames.parquet:      first detection (track order) of every frame with final statistics -> df_mova
+
+def state_dir():
+    return config.OUTPUT_DIR / "incremental"
+
+
+def load_state() -> dict:
+    state = {"bytes_loaded": 0, "rows_loaded": 0, "last_frame": None, "stats_frame": None, "finalized": False}
+    path = state_dir() / "state.json"
+    if path.exists():
+        with open(path) as f:
+            state.update(json.load(f))
+    return state
+
+
+def save_state(state: dict) -> None:
+    with open(state_dir() / "state.json", "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def _load_table(name: str) -> pd.DataFrame | None:
+    path = state_dir() / f"{name}.parquet"
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def _save_table(df: pd.DataFrame, name: str) -> None:
+    df.to_parquet(state_dir() / f"{name}.parquet")
+
+
+INCREMENTAL_PRODUCTS = ["raw", "time", "clean", "bad", "mova"]
+
+
+def reset_incremental_state() -> None:
+    """
+    Delete the state and the products built by the incremental run (appending starts from an empty event).
+    """
+    shutil.rmtree(state_dir(), ignore_errors=True)
+    for product in INCREMENTAL_PRODUCTS:
+        for ext in ["parquet", "arrow"]:
+            path = product_path(resolve_product(product), ext=ext)
+            if path.is_dir():
+                shutil.rmtree(path)         # parts of the appended product
+            else:
+                path.unlink(missing_ok=True)
+    for product in ["stats", "mova"]:
+        product_path(resolve_product(product), ext="csv").unlink(missing_ok=True)
+
+
+def split_final_tracks(df: pd.DataFrame, last_frame: int, finalize: bool) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split raw rows into tracks that ended more than INCREMENTAL_FINALIZE_FRAMES before last_frame
+    (or all tracks with finalize=True) and the tracks that are still open.
+    """
+    if finalize:
+        return df, df.iloc[0:0]
+
+    track_end = df.groupby("track")["frame"].transform("max")
+    is_final = (track_end < last_frame - config.INCREMENTAL_FINALIZE_FRAMES).to_numpy()
+    return df[is_final], df[~is_final]
+
+
+@profiled()
+def incremental_update(up_to_frame: int | None = None, finalize: bool = False, base_dir="input_data") -> dict:
+    """
+    One incremental step for config.EVENT. Returns the updated state.
+    """
+    state = load_state()
+    if state["bytes_loaded"] == 0:
+        # products of an earlier batch run would be appended to: only deleted on request (--reset)
+        existing = [p for p in INCREMENTAL_PRODUCTS if product_path(resolve_product(p)).exists()]
+        if existing:
+            raise RuntimeError(f"Event {config.EVENT} already has the products {', '.join(existing)}, "
+                               f"use --reset to delete them and start the incremental run")
+    state_dir().mkdir(parents=True, exist_ok=True)
+    if state["finalized"]:
+        raise RuntimeError(f"Incremental run of {config.EVENT} is already finalized (use --reset to start again)")
+
+    # --- New rows ---
+    df_new, state["bytes_loaded"] = load_new_event_rows(config.EVENT, state["bytes_loaded"], state["rows_loaded"],
+                                                        up_to_frame=up_to_frame, complete=finalize, base_dir=base_dir)
+    df_new = enforce_schema(df_new, "raw")
+    state["rows_loaded"] += len(df_new)
+
+    if len(df_new):
+        state["last_frame"] = int(df_new["frame"].max())
+        append_product(df_new, "raw")
+        # complete frames only: the frames of the new rows are not in the stored time table
+        append_product(extract_frame_time_table(df_new), "time")
+
+    logging.info(f"Incremental update {config.EVENT}: {len(df_new)} new rows, "
+                 f"frames up to {state['last_frame']}")
+
+    # --- Finalized tracks -> filters -> clean / bad ---
+    df_pending = _load_table("pending")
+    df_open = df_new if df_pending is None else pd.concat([df_pending, df_new])   # keeps the raw row order
+
+    df_final, df_open = split_final_tracks(df_open, state["last_frame"] or 0, finalize)
+    _save_table(df_open, "pending")
+
+    df_clean_new = None
+    if len(df_final):
+        df_clean_new, df_bad_new = apply_filters(df_final)
+        append_product(df_clean_new, "clean")
+        append_product(df_bad_new, "bad")
+
+    # --- Per-frame statistics of the frames without open tracks ---
+    df_tail = _load_table("clean_tail")
+    if df_clean_new is not None:
+        df_tail = df_clean_new if df_tail is None else pd.concat([df_tail, df_clean_new])
+
+    if finalize or state["last_frame"] is None:
+        stats_frame = np.inf
+    else:
+        # open tracks and frames not received yet may still add detections from this frame on
+        stats_frame = min(df_open["frame"].min() if len(df_open) else np.inf, state["last_frame"] + 1)
+
+    if df_tail is not None and len(df_tail):
+        is_ready = (df_tail["frame"] < stats_frame).to_numpy()
+        df_ready = df_tail[is_ready].sort_values(["track", "frame"], kind="stable")
+        _save_table(df_tail[~is_ready], "clean_tail")
+
+        if len(df_ready):
+            append_per_frame_statistics(df_ready, finalize)
+
+    if finalize:
+        # parts -> single files in the row order of the batch products
+        compact_product("raw", reset_index=True)
+        compact_product("time", reset_index=True)
+        compact_product("clean", sort_by=["track", "frame"], reset_index=True)
+        compact_product("bad", sort_by=["track", "frame"])
+
+    state["stats_frame"] = None if np.isinf(stats_frame) else int(stats_frame)
+    state["finalized"] = finalize
+    save_state(state)
+
+    final_frame = state["last_frame"] if state["stats_frame"] is None else state["stats_frame"] - 1
+    print(f"Incremental update {config.EVENT}: {state['rows_loaded']} rows read, "
+          f"statistics final up to frame {final_frame}")
+    return state
+
+
+def append_per_frame_statistics(df_ready: pd.DataFrame, finalize: bool) -> None:
+    """
+    Per-frame statistics of complete frames: appended to df_stats_<event>.csv, df_mova recomputed from the
+    first detection of every frame (one row per frame, same rows prepare_df_for_plot keeps in a batch run).
+    """
+    df_stats_new = compute_mean_median_per_frame(df_ready, config)
+
+    stats_path = product_path(resolve_product("stats"), ext="csv")
+    df_stats_new.to_csv(stats_path, mode="a", header=not stats_path.exists(), index=False)
+
+    df_frames = _load_table("frames")
+    df_frames_new = df_stats_new.drop_duplicates(subset="frame", keep="first")
+    df_frames = df_frames_new if df_frames is None else pd.concat([df_frames, df_frames_new])
+    _save_table(df_frames, "frames")
+
+    df_mova = prepare_df_for_plot(
+        df_frames,
+        window_size=config.MOVING_AVERAGE_WINDOW_SIZE,
+        gap_threshold=config.GAP_THRESHOLD
+    )
+    df_mova.to_csv(product_path(resolve_product("mova"), ext="csv"), index=False)
+    write_product(df_mova, "mova")
+
+    if finalize:
+        # df_stats in the row order of df_clean, like the batch run
+        df_stats = pd.read_csv(stats_path).sort_values(["track", "frame"], kind="stable")
+        df_stats.to_csv(stats_path, index=False)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Incremental filter and per-frame statistics of a running event.")
+    parser.add_argument("--event", default=config.EVENT)
+    parser.add_argument("--up-to", type=int, default=None, metavar="FRAME",
+                        help="ingest frames up to this frame only (default: all complete frames in the file)")
+    parser.add_argument("--finalize", action="store_true",
+                        help="end of the event: ingest the newest frame and finalize all open tracks")
+    parser.add_argument("--reset", action="store_true",
+                        help="delete the incremental state and the products of the event first")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    apply_run_settings(config, event=args.event)
+    config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    if args.reset:
+        reset_incremental_state()
+
+    incremental_update(up_to_frame=args.up_to, finalize=args.finalize)
+
+
+if __name__ == "__main__":
+    main()
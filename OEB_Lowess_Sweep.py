@@ -0,0 +1,152 @@
+# =============================================================================
+# LOWESS parameter sweep
+# =============================================================================
+# Smoothed per-track velocity and grain size curves for a grid of LOWESS settings (LOWESS_FRAME_WINDOW_SIZE,
+# LOWESS_GAP_THRESHOLD, LOWESS_SEGMENT_LENGTH, LOWESS_ITERATIONS). The per-track tables of the calculation
+# stage (df_per_track_velocities / df_per_track_grainsize) are loaded once, only segmentation and LOWESS run per
+# parameter set, on parallel processes. Grid: config.LOWESS_SWEEP_GRID or the command line.
+#
+#   python OEB_Lowess_Sweep.py --event 2024_06_14 --frames 65500 72500
+#   python OEB_Lowess_Sweep.py --event 2024_06_14 --frame-window 10 20 40 --gap-threshold 100 150 --jobs 4
+#
+# Output: product df_lowess_sweep_<event> (one curve per parameter set and quantity, long format) and one
+# comparison plot per quantity for the frame window.
+
+import argparse
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import config
+from utils.data_utils import assign_segments, lowess_segment
+from utils.plot_utils import plot_lowess_sweep
+from utils.product_io import load_products, product_path, write_product
+from utils.profiling import profiled
+from utils.run_utils import apply_run_settings
+
+
+LOWESS_PARAMETERS = ["LOWESS_FRAME_WINDOW_SIZE", "LOWESS_GAP_THRESHOLD", "LOWESS_SEGMENT_LENGTH", "LOWESS_ITERATIONS"]
+
+# Smoothed quantities: per-track product and its column
+LOWESS_QUANTITIES = {
+    "velocity": ("per_track_velocities", "mean_track_velocity"),
+    "grainsize": ("per_track_grainsize", "mean_track_grainsize"),
+}
+
+
+def lowess_curve(df_per_track: pd.DataFrame, value_col: str, params: dict) -> pd.DataFrame:
+    """
+    Segmentation and LOWESS of one per-track statistic with one parameter set (names of LOWESS_PARAMETERS),
+    same steps as compute_track_velocities / compute_track_grainsize. Returns frame, lowess and segment.
+    """
+    df = assign_segments(df_per_track.sort_values("center_frame", kind="stable").reset_index(drop=True),
+                         params["LOWESS_GAP_THRESHOLD"])
+
+    curves = []
+    for seg_id, seg in df.groupby("segment"):
+        if len(seg) < params["LOWESS_SEGMENT_LENGTH"]:
+            continue  # too short for smoothing
+        df_segment = lowess_segment(seg, value_col, "lowess", params["LOWESS_FRAME_WINDOW_SIZE"],
+                                    params["LOWESS_ITERATIONS"])
+        curves.append(df_segment.assign(segment=seg_id))
+
+    if not curves:
+        return pd.DataFrame(columns=["frame", "lowess", "segment"])
+    return (
+        pd.concat(curves)
+        .sort_values("frame")
+        .drop_duplicates(subset="frame", keep="first")
+        .reset_index(drop=True)
+    )
+
+
+# per-track tables of a worker process, sent once by the pool initializer instead of with every parameter set
+_SWEEP_TABLES: dict = {}
+
+
+def _init_sweep_worker(tables: dict) -> None:
+    global _SWEEP_TABLES
+    _SWEEP_TABLES = tables
+
+
+def _sweep_parameter_set(parameter_set: int, params: dict) -> pd.DataFrame:
+    # worker: all curves of one parameter set, for the quantities whose per-track table was loaded
+    parts = []
+    for quantity, (product, value_col) in LOWESS_QUANTITIES.items():
+        if product not in _SWEEP_TABLES:
+            continue
+        df_curve = lowess_curve(_SWEEP_TABLES[product], value_col, params)
+        parts.append(df_curve.assign(quantity=quantity))
+
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["frame", "lowess", "segment"])
+    return df.assign(parameter_set=parameter_set, **params)
+
+
+@profiled()
+def sweep_lowess_parameters(tables: dict, grid: dict, n_jobs: int | None = None) -> pd.DataFrame:
+    """
+    LOWESS curves of all quantities for every combination of grid ({config name: list of values}, missing
+    names: config value). tables: per-track products {product: DataFrame}, quantities without a table are
+    skipped. n_jobs processes (default config.LOWESS_SWEEP_JOBS) receive the tables once, 1 runs in this process.
+    """
+    grid = {name: list(grid.get(name, [getattr(config, name)])) for name in LOWESS_PARAMETERS}
+    parameter_sets = [dict(zip(LOWESS_PARAMETERS, values))
+                      for values in itertools.product(*(grid[name] for name in LOWESS_PARAMETERS))]
+    n_jobs = config.LOWESS_SWEEP_JOBS if n_jobs is None else n_jobs
+    logging.info(f"LOWESS sweep: {len(parameter_sets)} parameter sets on {n_jobs} process(es)")
+
+    if n_jobs <= 1 or len(parameter_sets) <= 1:
+        _init_sweep_worker(tables)
+        results = [_sweep_parameter_set(i, params) for i, params in enumerate(parameter_sets)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(parameter_sets)), initializer=_init_sweep_worker,
+                                 initargs=(tables,)) as executor:
+            results = list(executor.map(_sweep_parameter_set, range(len(parameter_sets)), parameter_sets))
+
+    columns = ["parameter_set", *LOWESS_PARAMETERS, "quantity", "segment", "frame", "lowess"]
+    return pd.concat(results, ignore_index=True)[columns]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Smoothed per-track curves for a grid of LOWESS settings.")
+    parser.add_argument("--event", default=config.EVENT)
+    parser.add_argument("--frames", type=int, nargs=2, metavar=("START", "END"),
+                        help="frame window of the comparison plots (default: config)")
+    parser.add_argument("--frame-window", type=int, nargs="+", dest="LOWESS_FRAME_WINDOW_SIZE")
+    parser.add_argument("--gap-threshold", type=int, nargs="+", dest="LOWESS_GAP_THRESHOLD")
+    parser.add_argument("--segment-length", type=int, nargs="+", dest="LOWESS_SEGMENT_LENGTH")
+    parser.add_argument("--iterations", type=int, nargs="+", dest="LOWESS_ITERATIONS")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: config.LOWESS_SWEEP_JOBS)")
+    parser.add_argument("--no-plot", action="store_true", help="only write the curves")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    start_frame, end_frame = args.frames if args.frames else (None, None)
+    apply_run_settings(config, event=args.event, start_frame=start_frame, end_frame=end_frame)
+    config.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    grid = dict(config.LOWESS_SWEEP_GRID)
+    grid.update({name: values for name, values in vars(args).items() if name.isupper() and values is not None})
+
+    # grain sizes only when the calc_gs stage has run for the event
+    products = [product for product, _ in LOWESS_QUANTITIES.values() if product_path(product).exists()]
+    if not products:
+        raise FileNotFoundError(f"No per-track products of event {config.EVENT}, run the calculation stages first")
+    tables = load_products(products + ([] if args.no_plot else ["time"]))
+
+    df_sweep = sweep_lowess_parameters({p: tables[p] for p in products}, grid, n_jobs=args.jobs)
+    write_product(df_sweep, "lowess_sweep")
+    logging.info(f"LOWESS sweep: {df_sweep['parameter_set'].nunique()} parameter sets, {len(df_sweep)} rows saved")
+
+    if not args.no_plot:
+        for quantity, (product, value_col) in LOWESS_QUANTITIES.items():
+            if product not in tables:
+                continue
+            plot_lowess_sweep(tables[product], value_col, df_sweep[df_sweep["quantity"] == quantity],
+                              quantity, tables["time"], config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+# =============================================================================
+# Near-real-time surge monitoring
+# =============================================================================
+# Follows the tracking output while a debris flow passes and publishes per-frame velocity / grain size statistics
+# and their moving averages (mean_vel_ma, mean_grain_ma, ...) within a fraction of a second.
+#
+# Input (CSV rows in the all_stats layout, header first):
+#   --dir   folder with appended files (all *.txt / *.csv files are followed like 'tail -f')
+#   --socket HOST:PORT   local TCP socket, e.g. the tracker or a replay script writes the rows to it
+# Output (OUTPUT_DIR of the event):
+#   monitor_<event>.jsonl          one JSON line per finished frame
+#   monitor_latest_<event>.json    newest frame, replaced atomically (for dashboards)
+#
+# The five filter steps run online with bounded state per track (last MAX_ROLL_WINDOW values, first / last five
+# y positions, last position). Differences to the batch filter: the rolling median uses the past detections only,
+# the y-movement rule is evaluated on the track so far, the slow-track rule on the median of the last
+# MAX_ROLL_WINDOW filtered velocities (not the whole track), and detections before a track is accepted are not
+# counted. Rows of a frame that was already published (late or repeated input) are dropped. The monitor is a
+# live view, the batch / incremental products stay the reference.
+#
+#   python OEB_Monitor.py --socket 127.0.0.1:5555 --event 2024_06_14
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import select
+import socket
+import statistics
+import time
+from collections import deque
+from pathlib import Path
+
+import config
+from utils.run_utils import apply_run_settings
+
+
+REQUIRED_COLUMNS = ["frame", "track", "velocity", "grainsize",
+                    "bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]
+
+
+# --- Online filter ----------------------------------------------------------------------------------------------
+def _median(values):
+    return statistics.median(values) if values else None
+
+
+class TrackState:
+    """
+    Bounded state of one track: the raw values of the rolling median window, first / last y positions,
+    last position, recent filtered velocities and the jump flag.
+    """
+
+    def __init__(self, max_window: int):
+        self.n = 0
+        self.velocity = deque(maxlen=max_window)
+        self.grainsize = deque(maxlen=max_window)
+        self.y_first = []
+        self.y_last = deque(maxlen=5)
+        self.last_xyz = None
+        self.last_frame = None
+        self.filtered_velocity = deque(maxlen=max_window)
+        self.jumped = False
+
+
+class OnlineFilter:
+    """
+    Online variant of the filter steps 1 - 5 (utils/data_filter.py) for single detections.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.tracks: dict[int, TrackState] = {}
+
+    def _in_range(self, value, value_range):
+        if value is None or value == 0 or not (value_range[0] <= value <= value_range[1]):
+            return None
+        return value
+
+    def _rolling_median(self, values, n):
+        # adaptive window of the batch filter (1/5 of the track length so far, odd, clipped), past values only
+        window = max(self.cfg.MIN_ROLL_WINDOW, min(self.cfg.MAX_ROLL_WINDOW, n // 5))
+        window += window % 2 == 0
+        recent = [v for v in list(values)[-window:] if v is not None]
+        return _median(recent) if len(recent) >= 3 else None
+
+    def _is_moving(self, state: TrackState) -> bool:
+        if state.n < 3:
+            return False
+        if state.n < 20:
+            diff1 = state.y_last[-1] - state.y_first[1]
+            diff2 = state.y_last[-2] - state.y_first[2]
+            return diff1 < -self.cfg.YAXIS_MIN_LENGTH and diff2 < -self.cfg.YAXIS_MIN_LENGTH
+        diff = _median(list(state.y_last)) - _median(state.y_first)
+        return diff < -self.cfg.YAXIS_MIN_LENGTH
+
+    def process(self, row: dict):
+        """
+        Update the track of one detection. Returns (velocity, grainsize) filtered with the rolling median
+        if the track passes all filters so far, otherwise None.
+        """
+        cfg = self.cfg
+        track = row["track"]
+        state = self.tracks.get(track)
+        if state is None:
+            state = self.tracks[track] = TrackState(max(cfg.MAX_ROLL_WINDOW, cfg.MIN_ROLL_WINDOW))
+
+        # Step 1 - range
+        state.n += 1
+        state.velocity.append(self._in_range(row["velocity"], cfg.VELOCITY_RANGE))
+        state.grainsize.append(self._in_range(row["grainsize"], cfg.GRAINSIZE_RANGE))
+
+        # Step 4 - jump (once a track jumped it stays rejected)
+        xyz = (row["bb_center_lidar_x"], row["bb_center_lidar_y"], row["bb_center_lidar_z"])
+        if state.last_xyz is not None:
+            step = sum((a - b) ** 2 for a, b in zip(xyz, state.last_xyz)) ** 0.5
+            state.jumped |= step > cfg.JUMP_THRESHOLD
+        state.last_xyz = xyz
+        state.last_frame = row["frame"]
+
+        # Step 3 - y movement so far
+        if len(state.y_first) < 5:
+            state.y_first.append(xyz[1])
+        state.y_last.append(xyz[1])
+
+        # Step 2 - rolling median
+        velocity = self._rolling_median(state.velocity, state.n)
+        grainsize = self._rolling_median(state.grainsize, state.n)
+        if velocity is not None:
+            state.filtered_velocity.append(velocity)
+
+        # Step 5 - slow tracks (median of the recent filtered velocities)
+        recent_median = _median(list(state.filtered_velocity))
+        is_slow = recent_median is None or recent_median < cfg.MIN_MEDIAN_TRACK_VEL
+
+        if state.jumped or is_slow or not self._is_moving(state):
+            return None
+        return velocity, grainsize
+
+    def evict(self, frame: int) -> int:
+        """
+        Drop tracks without detection for INCREMENTAL_FINALIZE_FRAMES frames (keeps the state bounded).
+        """
+        stale = [t for t, s in self.tracks.items() if frame - s.last_frame > self.cfg.INCREMENTAL_FINALIZE_FRAMES]
+        for track in stale:
+            del self.tracks[track]
+        return len(stale)
+
+
+# --- Per-frame statistics -----------------------------------------------------------------------------------------
+class FrameStatistics:
+    """
+    Collects the filtered detections of the current frame and, when the frame is closed, returns its per-frame
+    statistics and the trailing moving averages over the last MOVING_AVERAGE_WINDOW_SIZE frames.
+    """
+
+    MA_COLUMNS = {
+        "mean_velocity_per_frame": "mean_vel_ma",
+        "median_velocity_per_frame": "median_vel_ma",
+        "mean_grainsize_per_frame": "mean_grain_ma",
+        "median_grainsize_per_frame": "median_grain_ma",
+    }
+
+    def __init__(self, window_size: int):
+        self.frame = None
+        self.last_published_frame = None
+        self.velocity = []
+        self.grainsize = []
+        self.last_arrival = None
+        self.history = {col: deque(maxlen=window_size) for col in self.MA_COLUMNS}
+
+    def add(self, frame: int, velocity, grainsize, arrival: float) -> None:
+        self.frame = frame
+        self.last_arrival = arrival
+        if velocity is not None:
+            self.velocity.append(velocity)
+        if grainsize is not None:
+            self.grainsize.append(grainsize)
+
+    def close(self) -> dict | None:
+        if self.frame is None:
+            return None
+
+        record = {
+            "frame": self.frame,
+            "n_detections": len(self.velocity),
+            "mean_velocity_per_frame": statistics.fmean(self.velocity) if self.velocity else None,
+            "median_velocity_per_frame": _median(self.velocity),
+            "mean_grainsize_per_frame": statistics.fmean(self.grainsize) if self.grainsize else None,
+            "median_grainsize_per_frame": _median(self.grainsize),
+        }
+        for col, ma_col in self.MA_COLUMNS.items():
+            self.history[col].append(record[col])
+            values = [v for v in self.history[col] if v is not None]
+            record[ma_col] = statistics.fmean(values) if values else None
+
+        record["latency_ms"] = round((time.time() - self.last_arrival) * 1000, 1)
+
+        self.last_published_frame = self.frame
+        self.frame = None
+        self.velocity = []
+        self.grainsize = []
+        return record
+
+
+# --- Sources ----------------------------------------------------------------------------------------------------
+def _parse_row(values: dict) -> dict | None:
+    try:
+        row = {"frame": int(float(values["frame"])), "track": int(float(values["track"]))}
+        for col in REQUIRED_COLUMNS[2:]:
+            value = values.get(col)
+            row[col] = float(value) if value not in (None, "", "nan", "NaN") else None
+    except (KeyError, ValueError):
+        return None
+    if any(row[c] is None for c in ["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]):
+        return None
+    return row
+
+
+class _LineParser:
+    """
+    Turns text chunks into rows: first complete line is the header, incomplete last lines wait for the next chunk.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.rest = ""
+
+    def feed(self, text: str) -> list[dict]:
+        lines = (self.rest + text).split("\n")
+        self.rest = lines.pop()
+        rows = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if self.header is None:
+                self.header = next(csv.reader(io.StringIO(line)))
+                continue
+            row = _parse_row(dict(zip(self.header, next(csv.reader(io.StringIO(line))))))
+            if row is not None:
+                rows.append(row)
+        return rows
+
+
+class DirectorySource:
+    """
+    Follows all *.txt / *.csv files of a folder (new files and appended lines).
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.files: dict[Path, tuple] = {}        # path -> (file object, parser)
+
+    def read(self, timeout: float) -> list[dict]:
+        for path in sorted(self.folder.glob("*")):
+            if path.suffix in (".txt", ".csv") and path not in self.files:
+                self.files[path] = (open(path, "r", newline=""), _LineParser())
+
+        rows = []
+        for f, parser in self.files.values():
+            text = f.read()
+            if text:
+                rows.extend(parser.feed(text))
+        if not rows:
+            time.sleep(timeout)
+        return rows
+
+    def close(self) -> None:
+        for f, _ in self.files.values():
+            f.close()
+
+
+class SocketSource:
+    """
+    Local TCP socket stand-in for the tracker: every connection sends CSV text (header first).
+    """
+
+    def __init__(self, host: str, port: int):
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.clients: dict[socket.socket, _LineParser] = {}
+        logging.info(f"Monitor listening on {host}:{port}")
+
+    def read(self, timeout: float) -> list[dict]:
+        readable, _, _ = select.select([self.server, *self.clients], [], [], timeout)
+        rows = []
+        for sock in readable:
+            if sock is self.server:
+                client, _ = self.server.accept()
+                client.setblocking(False)
+                self.clients[client] = _LineParser()
+                continue
+            data = sock.recv(1 << 16)
+            if not data:
+                # connection closed: flush an incomplete last line
+                rows.extend(self.clients.pop(sock).feed("\n"))
+                sock.close()
+                continue
+            rows.extend(self.clients[sock].feed(data.decode()))
+        return rows
+
+    def close(self) -> None:
+        for sock in self.clients:
+            sock.close()
+        self.server.close()
+
+
+# --- Publishing -------------------------------------------------------------------------------------------------
+class Publisher:
+
+    def __init__(self, output_dir: Path, event: str):
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.log_path = output_dir / f"monitor_{event}.jsonl"
+        self.latest_path = output_dir / f"monitor_latest_{event}.json"
+        self.log_file = open(self.log_path, "a")
+
+    def publish(self, record: dict) -> None:
+        line = json.dumps(record)
+        self.log_file.write(line + "\n")
+        self.log_file.flush()
+
+        tmp_path = self.latest_path.with_suffix(".tmp")
+        tmp_path.write_text(line)
+        os.replace(tmp_path, self.latest_path)
+
+        vel = record["mean_vel_ma"]
+        grain = record["mean_grain_ma"]
+        logging.info(
+            f"[monitor] frame {record['frame']}: {record['n_detections']} det | "
+            f"mean_vel_ma {'-' if vel is None else f'{vel:.2f}'} m/s | "
+            f"mean_grain_ma {'-' if grain is None else f'{grain:.3f}'} m | {record['latency_ms']} ms"
+        )
+
+    def close(self) -> None:
+        self.log_file.close()
+
+
+# --- Service loop -----------------------------------------------------------------------------------------------
+def run_monitor(source, publisher: Publisher, cfg=config, max_seconds: float | None = None) -> int:
+    """
+    Main loop: read rows, filter online, close a frame as soon as a later frame arrives or the input is idle for
+    MONITOR_IDLE_FLUSH_SECONDS. Returns the number of published frames.
+    """
+    online_filter = OnlineFilter(cfg)
+    frames = FrameStatistics(cfg.MOVING_AVERAGE_WINDOW_SIZE)
+    n_published = 0
+    t_start = time.time()
+    last_input = time.time()
+
+    def publish(record):
+        nonlocal n_published
+        if record is not None:
+            publisher.publish(record)
+            n_published += 1
+
+    while max_seconds is None or time.time() - t_start < max_seconds:
+        rows = source.read(timeout=cfg.MONITOR_POLL_SECONDS)
+        now = time.time()
+
+        for row in rows:
+            if frames.frame is not None and row["frame"] > frames.frame:
+                publish(frames.close())
+                online_filter.evict(row["frame"])
+            if frames.frame is not None and row["frame"] < frames.frame:
+                continue        # late row of a closed frame
+            if frames.last_published_frame is not None and row["frame"] <= frames.last_published_frame:
+                continue        # late or repeated row of a published frame (also after an idle flush)
+
+            filtered = online_filter.process(row)
+            velocity, grainsize = filtered if filtered is not None else (None, None)
+            frames.add(row["frame"], velocity, grainsize, now)
+
+        if rows:
+            last_input = now
+        elif frames.frame is not None and now - last_input > cfg.MONITOR_IDLE_FLUSH_SECONDS:
+            publish(frames.close())
+
+    publish(frames.close())
+    return n_published
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Live per-frame velocity / grain size monitoring.")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--dir", type=Path, help="folder with appended tracking output files")
+    source_group.add_argument("--socket", metavar="HOST:PORT", help="local TCP socket to receive rows on")
+    parser.add_argument("--event", default=config.EVENT)
+    parser.add_argument("--max-seconds", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    apply_run_settings(config, event=args.event)
+
+    if args.dir is not None:
+        source = DirectorySource(args.dir)
+    else:
+        host, port = args.socket.rsplit(":", 1)
+        source = SocketSource(host, int(port))
+
+    publisher = Publisher(config.OUTPUT_DIR, args.event)
+    try:
+        n = run_monitor(source, publisher, max_seconds=args.max_seconds)
+    except KeyboardInterrupt:
+        n = None
+    finally:
+        source.close()
+        publisher.close()
+
+    logging.info(f"Monitor stopped{'' if n is None else f' after {n} frames'}, output: {publisher.log_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import config
-import pandas as pd
 
 from utils.plot_utils import (
     plot_variable_against_frame,
@@ -10,19 +9,81 @@ from utils.plot_utils import (
     plot_xy_mov_tracks_color_vel,
     plot_track_grainsize_bubble,
     plot_cross_section_velocity,
-    plot_track_vel_and_grainsize
-
+    plot_track_vel_and_grainsize,
+    plot_width_px,
 )
+from utils.lod import LOD_SERIES, load_lod_pyramid, lod_envelope
+
+from utils.product_io import read_product, load_products
+from utils.profiling import profiled
+from utils.window_sweep import sweep_windows
+
+
+# Frame column and padding rows of each product when a window is cut out of it (sweep mode, utils/window_sweep.py)
+WINDOW_SLICING = {
+    "time": ("frame", 1),
+    "mova": ("frame", 1),
+    "piv_mova": ("frame", 1),
+    "velocities_lowess": ("frame", 1),
+    "grainsize_lowess": ("frame", 1),
+    "per_track_velocities": ("center_frame", 0),
+    "per_track_grainsize": ("center_frame", 0),
+    "clean": ("frame", 0),
+    "bad": ("frame", 0),
+}
+
+
+@profiled()
+def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame_sequence,
+               windows: list | None = None) -> None:
+    """
+    Per-frame, per-track and xy plots for config START_FRAME - END_FRAME or for every (start, end) in windows
+    (products loaded once, sweep mode).
+    """
+    # --- Load DataFrames (only what the selected plots need, so each plot can run on its own), all at once
+    products = []
+    if plot_stats_per_frame or plot_stats_per_track:
+        products += ["time", "piv_mova"]
+    if plot_stats_per_frame:
+        products += ["mova"]
+    if plot_stats_per_track:
+        products += ["per_track_velocities", "velocities_lowess"]
+    if plot_xy_mov_for_frame_sequence:
+        products += ["clean", "bad"]
 
-def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame_sequence) -> None:
+    xy_columns = ["frame", "track", "velocity", "bb_center_lidar_x", "bb_center_lidar_y"]
+    extra_loaders = {"lod": load_lod_pyramid} if plot_stats_per_frame and config.USE_LOD_PYRAMID else None
+    dfs = load_products(products, columns={"clean": xy_columns, "bad": xy_columns}, extra_loaders=extra_loaders)
 
-    # --- Load DataFrames
-    df_time = pd.read_parquet(config.OUTPUT_DIR/ f"df_time_{config.EVENT}.parquet")
-    df_mova = pd.read_parquet(config.OUTPUT_DIR/ f"df_mova_{config.EVENT}.parquet")
-    df_piv_mova = pd.read_parquet(config.OUTPUT_DIR/ f"df_piv_mova_{config.EVENT}.parquet")
-    df_clean = pd.read_parquet(config.OUTPUT_DIR / f"df_clean_{config.EVENT}.parquet")
+    sweep_windows(render_stats, dfs, WINDOW_SLICING, windows or [(config.START_FRAME, config.END_FRAME)],
+                  plot_stats_per_frame=plot_stats_per_frame,
+                  plot_stats_per_track=plot_stats_per_track,
+                  plot_xy_mov_for_frame_sequence=plot_xy_mov_for_frame_sequence)
+
+
+def lod_series(df_lod, product, columns, df_full):
+    """
+    LOD envelope of product columns for the current window and figure width, df_full if the full series fits.
+    """
+    df_envelope = lod_envelope(df_lod, product, columns, config.START_FRAME, config.END_FRAME, plot_width_px(config))
+    return df_full if df_envelope is None else df_envelope
+
+
+def render_stats(dfs, plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame_sequence) -> None:
+
+    if plot_stats_per_frame or plot_stats_per_track:
+        df_time = dfs["time"]
+        df_piv_mova = dfs["piv_mova"]
 
     if  plot_stats_per_frame:       # Per Frame Plots
+        df_mova = dfs["mova"]
+
+        df_piv_frame = df_piv_mova
+
+        # Long windows: min / max envelope of the LOD level matching the figure width instead of every frame
+        if dfs.get("lod") is not None:
+            df_mova = lod_series(dfs["lod"], "mova", LOD_SERIES["mova"], df_mova)
+            df_piv_frame = lod_series(dfs["lod"], "piv_mova", ["piv_vel_smoothed"], df_piv_mova)
 
         #  Plot velocity
         plot_variable_against_frame(
@@ -49,7 +110,7 @@ def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame
         )
 
         # Plot
-        plot_piv_and_mean_velocity_per_frame(df_piv_mova, df_mova, df_time, config)
+        plot_piv_and_mean_velocity_per_frame(df_piv_frame, df_mova, df_time, config)
         print("--- Per FRAME plots done --- \n")
 
 
@@ -57,8 +118,8 @@ def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame
     if  plot_stats_per_track:       # ---  Per Track Plots
 
         # --- Load DataFrames
-        df_per_track_velocities = pd.read_parquet(config.OUTPUT_DIR/ f"df_per_track_velocities_{config.EVENT}.parquet")
-        df_velocities_lowess = pd.read_parquet(config.OUTPUT_DIR/ f"df_velocities_lowess_{config.EVENT}.parquet")
+        df_per_track_velocities = dfs["per_track_velocities"]
+        df_velocities_lowess = dfs["velocities_lowess"]
 
         # --- Plot Track Velocities
         plot_track_velocities_lowess(df_per_track_velocities, df_velocities_lowess, df_piv_mova, df_time, config,
@@ -75,7 +136,8 @@ def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame
     if plot_xy_mov_for_frame_sequence:
 
         # --- Load DataFrames
-        df_bad = pd.read_parquet(config.OUTPUT_DIR/ f"df_bad_{config.EVENT}.parquet")
+        df_clean = dfs["clean"]
+        df_bad = dfs["bad"]
         df_bad_sequence = df_bad[df_bad['frame'].between(config.START_FRAME,config.END_FRAME)]
         df_clean_sequence = df_clean[df_clean['frame'].between(config.START_FRAME,config.END_FRAME)]
 
@@ -89,14 +151,23 @@ def plot_stats(plot_stats_per_frame, plot_stats_per_track, plot_xy_mov_for_frame
 
 
 
-def plot_grainsize() -> None:
+@profiled()
+def plot_grainsize(windows: list | None = None) -> None:
 
     # --- Load DataFrames
-    df_time = pd.read_parquet(config.OUTPUT_DIR/ f"df_time_{config.EVENT}.parquet")
-    df_per_track_grainsize = pd.read_parquet(config.OUTPUT_DIR/ f"df_per_track_grainsize_{config.EVENT}.parquet")
-    df_grainsize_lowess = pd.read_parquet(config.OUTPUT_DIR/ f"df_grainsize_lowess_{config.EVENT}.parquet")
-    df_per_track_velocities = pd.read_parquet(config.OUTPUT_DIR/ f"df_per_track_velocities_{config.EVENT}.parquet")
-    df_velocities_lowess = pd.read_parquet(config.OUTPUT_DIR/ f"df_velocities_lowess_{config.EVENT}.parquet")
+    dfs = load_products(["time", "per_track_grainsize", "grainsize_lowess",
+                         "per_track_velocities", "velocities_lowess"])
+
+    sweep_windows(render_grainsize, dfs, WINDOW_SLICING, windows or [(config.START_FRAME, config.END_FRAME)])
+
+
+def render_grainsize(dfs) -> None:
+
+    df_time = dfs["time"]
+    df_per_track_grainsize = dfs["per_track_grainsize"]
+    df_grainsize_lowess = dfs["grainsize_lowess"]
+    df_per_track_velocities = dfs["per_track_velocities"]
+    df_velocities_lowess = dfs["velocities_lowess"]
 
 
     '''# --- GRAIN SIZE per Track
@@ -124,10 +195,16 @@ def plot_grainsize() -> None:
 
 
 
-def plot_cross_section() -> None:
+@profiled()
+def plot_cross_section(windows: list | None = None) -> None:
 
     # --- Load DataFrames
-    df_clean = pd.read_parquet(config.OUTPUT_DIR/ f"df_clean_{config.EVENT}.parquet")
+    dfs = {"clean": read_product("clean")}
+
+    sweep_windows(render_cross_section, dfs, WINDOW_SLICING, windows or [(config.START_FRAME, config.END_FRAME)])
+
+
+def render_cross_section(dfs) -> None:
 
-    plot_cross_section_velocity(df_clean, config)
+    plot_cross_section_velocity(dfs["clean"], config)
     print("--- Velocity cross-section plotted --- \n")
@@ -10,14 +10,16 @@
 # ------------------------------
 # Import Libraries
 # ------------------------------
+# Stage modules (and with them pandas, matplotlib, scipy, statsmodels) are imported
+# inside main() only when their stage runs -> fast start and small workers.
+import argparse
 import logging
-from OEB_Filter_process import filter_process
-from OEB_Calculations import calculate_vel, calculate_gs
-from OEB_Plotting import plot_stats, plot_grainsize, plot_cross_section
-from OEB_GSD import plot_gsd
-from OEB_Boulder_Detections import plot_detections
-from utils.data_utils import setup_logging
+import time
+
 import config
+from utils.run_utils import apply_run_settings
+from utils.product_io import product_path, window_product_name, WINDOWED_PRODUCTS
+from utils.scheduler import Task, run_task_graph
 
 
 # ------------------------------
@@ -35,6 +37,8 @@ run_calc_per_frame = True               # df_mova and df_stats (moving averages
 run_calc_per_track = True               # lowess track velocity
 # Grain SIze
 run_calc_GS = True                      # lowess track grainsize
+# Plot data
+run_calc_LOD = True                     # LOD pyramid of the per-frame series (min / max envelopes of long windows)
 
 # ------------------------------
 # --- Plotting ---
@@ -47,36 +51,374 @@ plot_number_of_detections = True         # Plot number of Detections (YOLO, trac
 plot_GSD = True                          # plot GSD for each surge type and compare gsd curves
 plot_GSD_all_events= False               # plot all GSD curve for all events (run separate)
 
-def main():
+# ------------------------------
+# Stages
+# ------------------------------
+# Stages that work on the complete event (independent of the frame window)
+EVENT_STAGES = ["filter", "calc_per_frame", "calc_per_track", "calc_gs", "lod"]
+# Plot stages that are rendered per frame window (START_FRAME - END_FRAME)
+WINDOW_STAGES = ["plot_stats_per_frame", "plot_track_velocity", "plot_xy", "plot_grainsize",
+                 "plot_cross_section", "plot_detections"]
+# Calculation stages, run per frame window instead of per event with config.WINDOWED_CALCULATION
+CALC_STAGES = ["calc_per_frame", "calc_per_track", "calc_gs"]
+# Plot stages per event (not depending on the frame window)
+EVENT_PLOT_STAGES = ["plot_gsd", "plot_gsd_all_events"]
+
+ALL_STAGES = EVENT_STAGES + WINDOW_STAGES + EVENT_PLOT_STAGES
+# Stages reading whole-event calculation products, skipped in a windowed run (no whole-event products there)
+WHOLE_EVENT_STAGES = ["lod", "plot_gsd", "plot_gsd_all_events"]
+
+STAGE_GROUPS = {
+    "all": EVENT_STAGES + WINDOW_STAGES + ["plot_gsd"],
+    "calc": ["calc_per_frame", "calc_per_track", "calc_gs"],
+    "calc_vel": ["calc_per_frame", "calc_per_track"],
+    "plot": WINDOW_STAGES + ["plot_gsd"],
+}
+
+# Products (df_<product>_<event>.parquet in OUTPUT_DIR) read and written by each stage
+STAGE_IO = {
+    "filter":               ([], ["raw", "clean", "time", "bad"]),
+    "calc_per_frame":       (["clean"], ["mova", "piv_mova"]),
+    "calc_per_track":       (["clean"], ["per_track_velocities", "velocities_lowess"]),
+    "calc_gs":              (["clean"], ["per_track_grainsize", "grainsize_lowess"]),
+    "lod":                  (["raw", "clean", "mova", "piv_mova"], ["lod"]),
+    "plot_stats_per_frame": (["time", "mova", "piv_mova"], []),
+    "plot_track_velocity":  (["time", "piv_mova", "per_track_velocities", "velocities_lowess"], []),
+    "plot_xy":              (["clean", "bad"], []),
+    "plot_grainsize":       (["time", "per_track_grainsize", "grainsize_lowess",
+                              "per_track_velocities", "velocities_lowess"], []),
+    "plot_cross_section":   (["clean"], []),
+    "plot_detections":      (["time", "clean", "raw"], []),
+    "plot_gsd":             (["per_track_grainsize"], []),
+}
+
+# Products a stage uses when they exist: only waited for when they are produced in the same run
+OPTIONAL_INPUTS = {
+    "plot_stats_per_frame": ["lod"],
+    "plot_detections":      ["lod"],
+}
+
+
+def stages_from_run_options() -> set:
+    """
+    Stage selection defined by the run options at the top of this script.
+    """
+    selected = {
+        "filter": Run_Filter,
+        "calc_per_frame": Run_Calculations and run_calc_Vel and run_calc_per_frame,
+        "calc_per_track": Run_Calculations and run_calc_Vel and run_calc_per_track,
+        "calc_gs": Run_Calculations and run_calc_GS,
+        "lod": Run_Calculations and run_calc_LOD,
+        "plot_stats_per_frame": Run_Plotting and plot_stats_per_frame,
+        "plot_track_velocity": Run_Plotting and plot_track_velocity,
+        "plot_xy": Run_Plotting and plot_xy_mov_for_frame_sequence,
+        "plot_grainsize": Run_Plotting and plot_track_grainsize,
+        "plot_cross_section": Run_Plotting and plot_cross_sec,
+        "plot_detections": Run_Plotting and plot_number_of_detections,
+        "plot_gsd": Run_Plotting and plot_GSD,
+        "plot_gsd_all_events": Run_Plotting and plot_GSD and plot_GSD_all_events,
+    }
+    return {stage for stage, run in selected.items() if run}
+
+
+def run_stages(stages, event=None, start_frame=None, end_frame=None, windows=None, **config_overrides) -> list[dict]:
+    """
+    Run the selected stages for one event / frame window and return the stage timing records.
+    windows: list of (start, end), the plot stages load their products once and render every window (sweep mode).
+    Can be called in a worker process: all settings are passed as arguments.
+    """
+    from utils.profiling import get_stage_metrics, reset_stage_metrics
+
+    apply_run_settings(config, event=event, start_frame=start_frame, end_frame=end_frame, **config_overrides)
+    reset_stage_metrics()
+    stages = set(stages)
+
+    if "filter" in stages:
+        from utils.data_utils import setup_logging
+        from OEB_Filter_process import filter_process
 
-    if Run_Filter:
         setup_logging(config, log_name="LOG_FILE_FILTER", save_conf=True)
         filter_process()
 
-    if Run_Calculations:
-        if run_calc_Vel:
-            calculate_vel(run_calc_per_frame, run_calc_per_track)
-        if run_calc_GS:
-            calculate_gs()
+    if stages & {"calc_per_frame", "calc_per_track"}:
+        from OEB_Calculations import calculate_vel
+        calculate_vel("calc_per_frame" in stages, "calc_per_track" in stages)
+
+    if "calc_gs" in stages:
+        from OEB_Calculations import calculate_gs
+        calculate_gs()
+
+    if "lod" in stages:
+        from utils.lod import build_lod_pyramid
+        build_lod_pyramid()
 
-    if Run_Plotting:
-        plot_stats(plot_stats_per_frame, plot_track_velocity, plot_xy_mov_for_frame_sequence)
+    if stages & {"plot_stats_per_frame", "plot_track_velocity", "plot_xy"}:
+        from OEB_Plotting import plot_stats
+        plot_stats("plot_stats_per_frame" in stages, "plot_track_velocity" in stages, "plot_xy" in stages,
+                   windows=windows)
 
-        if plot_track_grainsize:
-            plot_grainsize()
+    if "plot_grainsize" in stages:
+        from OEB_Plotting import plot_grainsize
+        plot_grainsize(windows=windows)
 
-        if plot_cross_sec:
-            plot_cross_section()
+    if "plot_cross_section" in stages:
+        from OEB_Plotting import plot_cross_section
+        plot_cross_section(windows=windows)
 
-        if plot_number_of_detections:
-            plot_detections()
+    if "plot_detections" in stages:
+        from OEB_Boulder_Detections import plot_detections
+        plot_detections(windows=windows)
 
-        if plot_GSD:
-            plot_gsd(plot_GSD_all_events)
+    if "plot_gsd" in stages:
+        from OEB_GSD import plot_gsd
+        plot_gsd("plot_gsd_all_events" in stages)
 
+    records = get_stage_metrics().to_dict("records")
+    for record in records:
+        record.update(event=config.EVENT, start_frame=config.START_FRAME, end_frame=config.END_FRAME)
+
+    return records
+
+
+def main():
+
+    records = run_stages(stages_from_run_options())
+
+    from utils.profiling import write_stage_metrics
+    write_stage_metrics(config.OUTPUT_DIR, run_name="OEB_main", records=records)
     logging.info("\n All done \n")
 
 
+# ------------------------------
+# Command line
+# ------------------------------
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="OEB debris-flow pipeline: filter tracks, compute velocities / grain sizes and plot.",
+        epilog="Stages: " + ", ".join(ALL_STAGES) + " | groups: " + ", ".join(STAGE_GROUPS),
+    )
+    parser.add_argument("--stages", nargs="+", default=None, metavar="STAGE",
+                        help="stages or stage groups to run (default: run options in OEB_main.py)")
+    parser.add_argument("--events", nargs="+", default=None, metavar="EVENT",
+                        help=f"events to process (default: config.EVENT = {config.EVENT})")
+    parser.add_argument("--frames", nargs=2, type=int, action="append", default=None,
+                        metavar=("START", "END"),
+                        help="frame window for the plots, can be repeated (default: config START/END_FRAME)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of worker processes, independent stages run in parallel")
+    parser.add_argument("--shared-memory", action="store_true",
+                        help="publish df_clean, df_time and the per-track tables once as memory-mapped "
+                             "Arrow files that all workers attach to (config.SHARED_PRODUCTS)")
+    parser.add_argument("--intermediate-format", choices=["parquet", "arrow"], default=config.INTERMEDIATE_FORMAT,
+                        help="format the stages read intermediate products from (Parquet is always written)")
+    parser.add_argument("--windowed", action="store_true", default=config.WINDOWED_CALCULATION,
+                        help="calculations only for each frame window plus a margin (config.WINDOWED_CALCULATION)")
+    parser.add_argument("--window-margin", type=int, default=config.WINDOW_MARGIN_FRAMES,
+                        help="frames of context before and after the window of a windowed calculation")
+    parser.add_argument("--sweep", action="store_true",
+                        help="plot stages load their products once and render all --frames windows in one task")
+    parser.add_argument("--sweep-jobs", type=int, default=config.SWEEP_JOBS,
+                        help="processes rendering the windows of a plot stage in sweep mode")
+    parser.add_argument("--export-profile", choices=list(config.EXPORT_PROFILES), default=config.EXPORT_PROFILE,
+                        help="format / dpi of the saved figures, e.g. preview for fast exploratory runs")
+    parser.add_argument("--bootstrap", type=int, default=config.BOOTSTRAP_REPLICATES, metavar="N",
+                        help="bootstrap replicates of the LOWESS confidence bands in the calculations (0 = none)")
+    parser.add_argument("--no-profile", action="store_true", help="disable stage profiling")
+    args = parser.parse_args(argv)
+
+    if args.sweep and args.windowed:
+        parser.error("--sweep renders all windows from the same products, it cannot be combined with --windowed")
+
+    if args.stages is not None:
+        stages = set()
+        for name in args.stages:
+            if name in STAGE_GROUPS:
+                stages.update(STAGE_GROUPS[name])
+            elif name in ALL_STAGES:
+                stages.add(name)
+            else:
+                parser.error(f"unknown stage '{name}'")
+        if "plot_gsd_all_events" in stages:
+            stages.add("plot_gsd")          # the all-events GSD plot runs inside the plot_gsd task
+        args.stages = stages
+
+    return args
+
+
+def product_ids(event: str, products: list, window: tuple | None = None) -> list[tuple]:
+    """
+    (event, product) ids of the scheduler. With a window the calculation products carry the
+    frame window in their name (windowed calculation).
+    """
+    if window is None:
+        return [(event, p) for p in products]
+    return [(event, window_product_name(p, *window) if p in WINDOWED_PRODUCTS else p) for p in products]
+
+
+def stage_inputs(stage: str, stages: set) -> list:
+    """
+    Inputs of a stage, with its optional inputs that are produced by one of the selected stages.
+    """
+    produced = {product for s in stages if s in STAGE_IO for product in STAGE_IO[s][1]}
+    return STAGE_IO[stage][0] + [p for p in OPTIONAL_INPUTS.get(stage, []) if p in produced]
+
+
+def build_tasks(stages: set, events: list, windows: list, config_overrides: dict, sweep: bool = False) -> list[Task]:
+    """
+    One task per stage and event (event stages, GSD plots) or per stage, event and frame window (plots,
+    and the calculations in a windowed run). With sweep=True one plot task per stage and event renders all
+    windows. Inputs / outputs are (event, product) pairs, so the scheduler runs every stage as soon as its
+    products exist, e.g. all calculations and the df_clean plots in parallel after the filter.
+    """
+    windowed = config_overrides.get("WINDOWED_CALCULATION", config.WINDOWED_CALCULATION)
+    if windowed and stages & set(WHOLE_EVENT_STAGES):
+        skipped = [s for s in WHOLE_EVENT_STAGES if s in stages]
+        logging.warning(f"Windowed calculation: skipping {', '.join(skipped)} (needs the whole-event products, "
+                        f"run them without --windowed)")
+        stages = stages - set(skipped)
+    event_stages = [s for s in EVENT_STAGES if not (windowed and s in CALC_STAGES)]
+    window_stages = (CALC_STAGES if windowed else []) + ([] if sweep else WINDOW_STAGES)
+
+    tasks = []
+
+    for i, event in enumerate(events):
+        for stage in event_stages:
+            if stage in stages:
+                inputs, outputs = STAGE_IO[stage]
+                tasks.append(Task(
+                    f"{stage}[{event}]", run_stages, args=([stage], event), kwargs=config_overrides,
+                    inputs=product_ids(event, inputs), outputs=product_ids(event, outputs),
+                ))
+
+        if sweep:
+            start, end = min(w[0] for w in windows), max(w[1] for w in windows)
+            for stage in WINDOW_STAGES:
+                if stage in stages:
+                    inputs = stage_inputs(stage, stages)
+                    tasks.append(Task(
+                        f"{stage}[{event} sweep {len(windows)} windows]", run_stages,
+                        args=([stage], event, start, end), kwargs={**config_overrides, "windows": windows},
+                        inputs=product_ids(event, inputs),
+                    ))
+
+        for start, end in windows:
+            window = (start, end) if windowed else None
+            for stage in window_stages:
+                if stage in stages:
+                    inputs, outputs = stage_inputs(stage, stages), STAGE_IO[stage][1]
+                    tasks.append(Task(
+                        f"{stage}[{event} {start}-{end}]", run_stages, args=([stage], event, start, end),
+                        kwargs=config_overrides, inputs=product_ids(event, inputs, window),
+                        outputs=product_ids(event, outputs, window),
+                    ))
+
+        if "plot_gsd" in stages:
+            gsd_stages = ["plot_gsd"]
+            inputs = [(event, "per_track_grainsize")]
+            if "plot_gsd_all_events" in stages and i == 0:
+                # all-events GSD only once, after the grain sizes of all selected events
+                gsd_stages.append("plot_gsd_all_events")
+                inputs = [(e, "per_track_grainsize") for e in events]
+            start, end = windows[0]
+            tasks.append(Task(
+                f"plot_gsd[{event}]", run_stages, args=(gsd_stages, event, start, end),
+                kwargs=config_overrides, inputs=inputs,
+            ))
+
+    return tasks
+
+
+def product_exists(product_id) -> bool:
+    event, product = product_id
+    return product_path(product, event).exists()
+
+
+def publish_existing_products(tasks: list[Task]) -> None:
+    """
+    Publish the shared products that are read in this run but not produced by it (they already exist
+    as Parquet). Products written during the run are published by write_product().
+    """
+    from utils.product_io import read_product, publish_shared_product
+
+    produced = {p for task in tasks for p in task.outputs}
+    needed = {p for task in tasks for p in task.inputs if p not in produced}
+
+    for event, product in sorted(needed):
+        if product in config.SHARED_PRODUCTS and product_exists((event, product)):
+            publish_shared_product(read_product(product, event=event), product, event)
+
+
+def build_arrow_caches(tasks: list[Task]) -> None:
+    """
+    Arrow caches (INTERMEDIATE_FORMAT = "arrow") of the existing products read in this run, built once here
+    instead of by several workers at the same time.
+    """
+    from utils.product_io import ensure_arrow_cache
+
+    produced = {p for task in tasks for p in task.outputs}
+    needed = {p for task in tasks for p in task.inputs if p not in produced}
+
+    for event, product in sorted(needed):
+        if product_exists((event, product)):
+            ensure_arrow_cache(product, event)
+
+
+def print_timing_report(records: list[dict]) -> None:
+    print(f"\n{'Event':<14}{'Window':<16}{'Stage':<40}{'Wall (s)':>10}{'CPU (s)':>10}")
+    for r in records:
+        if r.get("depth", 0) != 0 or "wall_time_s" not in r:
+            continue
+        window = f"{r['start_frame']}-{r['end_frame']}"
+        print(f"{r['event']:<14}{window:<16}{r['stage']:<40}{r['wall_time_s']:>10.2f}{r['cpu_time_s']:>10.2f}")
+
+
+def cli(argv=None) -> None:
+    args = parse_args(argv)
+
+    stages = args.stages if args.stages is not None else stages_from_run_options()
+    events = args.events or [config.EVENT]
+    windows = [tuple(w) for w in args.frames] if args.frames else [(config.START_FRAME, config.END_FRAME)]
+    config_overrides = {
+        "PROFILE_STAGES": not args.no_profile,
+        "INTERMEDIATE_FORMAT": args.intermediate_format,
+        "WINDOWED_CALCULATION": args.windowed,
+        "WINDOW_MARGIN_FRAMES": args.window_margin,
+        "SWEEP_JOBS": args.sweep_jobs,
+        "EXPORT_PROFILE": args.export_profile,
+        "BOOTSTRAP_REPLICATES": args.bootstrap,
+        # the bootstrap pool runs inside the scheduler workers: share the processes between the two pools
+        "BOOTSTRAP_JOBS": max(1, config.BOOTSTRAP_JOBS // args.jobs),
+    }
+
+    tasks = build_tasks(stages, events, windows, config_overrides, sweep=args.sweep)
+
+    t_start = time.perf_counter()
+    if args.intermediate_format == "arrow":
+        build_arrow_caches(tasks)
+    if args.shared_memory:
+        from utils.product_io import create_shared_dir, release_shared_dir
+        create_shared_dir()
+        publish_existing_products(tasks)
+    try:
+        results = run_task_graph(tasks, n_jobs=args.jobs, product_exists=product_exists)
+    finally:
+        if args.shared_memory:
+            release_shared_dir()
+    records = [record for task in tasks for record in results[task.name]]
+    wall = time.perf_counter() - t_start
+
+    if records:
+        print_timing_report(records)
+
+        from utils.profiling import write_stage_metrics
+        for event in events:
+            event_records = [r for r in records if r["event"] == event]
+            apply_run_settings(config, event=event)
+            write_stage_metrics(config.OUTPUT_DIR, run_name="OEB_main", records=event_records)
+
+    print(f"\nAll done: {len(tasks)} stages in {wall:.1f} s")
+
+
 if __name__ == "__main__":
 
     # frame_ranges = [
@@ -93,4 +435,12 @@ if __name__ == "__main__":
     #     config.START_FRAME = start
     #     config.END_FRAME = end
     #     main()
-    main()
\ No newline at end of file
+    #
+    # -> same from the command line:
+    # python OEB_main.py --stages plot --frames 0 100000 --frames 8000 23000 --jobs 4
+
+    import sys
+    if len(sys.argv) > 1:
+        cli()
+    else:
+        main()
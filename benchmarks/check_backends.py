@@ -0,0 +1,93 @@
+# check_backends.py
+
+# Equivalence check of the execution backends (config.BACKEND) on synthetic data.
+# Runs the filter steps, per-frame and per-track statistics with pandas and with Polars and compares all products.
+# Run from the repository root, e.g.:
+#   python -m benchmarks.check_backends --frames 20000
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+from benchmarks.synthetic_tracks import write_event_inputs
+from benchmarks.run_benchmarks import BENCH_EVENT
+
+
+def run_backend(backend: str, df_raw: pd.DataFrame) -> tuple[dict, float]:
+    from OEB_Filter_process import apply_filters
+    from utils.data_utils import compute_mean_median_per_frame, compute_track_velocities, compute_track_grainsize
+
+    previous = config.BACKEND
+    config.BACKEND = backend
+    try:
+        t_start = time.perf_counter()
+        df_clean, df_bad = apply_filters(df_raw)
+        df_stats = compute_mean_median_per_frame(df_clean, config)
+        df_per_track_velocities, df_velocities_lowess = compute_track_velocities(df_clean, config)
+        df_per_track_grainsize, df_grainsize_lowess = compute_track_grainsize(df_clean, config)
+        duration = time.perf_counter() - t_start
+    finally:
+        config.BACKEND = previous
+
+    products = {
+        "clean": df_clean,
+        "bad": df_bad,
+        "stats": df_stats,
+        # track order within equal center frames is not defined -> compare per track
+        "per_track_velocities": df_per_track_velocities.sort_values("track").reset_index(drop=True),
+        "per_track_grainsize": df_per_track_grainsize.sort_values("track").reset_index(drop=True),
+        "velocities_lowess": df_velocities_lowess,
+        "grainsize_lowess": df_grainsize_lowess,
+    }
+    return products, duration
+
+
+def compare_products(reference: dict, candidate: dict, rtol: float) -> list[str]:
+    failures = []
+    for name, df_ref in reference.items():
+        try:
+            pd.testing.assert_frame_equal(df_ref, candidate[name], check_dtype=False, rtol=rtol)
+            print(f"  {name:<24} OK      ({len(df_ref)} rows)")
+        except AssertionError as e:
+            print(f"  {name:<24} DIFFERS {str(e).splitlines()[0]}")
+            failures.append(name)
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the pandas and Polars backends on synthetic data.")
+    parser.add_argument("--frames", type=int, default=20000, help="number of image frames")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-6, help="relative tolerance of float columns")
+    args = parser.parse_args(argv)
+
+    from utils.data_utils import load_and_merge_event_data
+    from utils.schema import enforce_schema
+
+    with tempfile.TemporaryDirectory(prefix="oeb_backends_") as workdir:
+        input_dir = Path(workdir) / "input_data"
+        write_event_inputs(input_dir, BENCH_EVENT, n_frames=args.frames, seed=args.seed)
+        df_raw = enforce_schema(load_and_merge_event_data(BENCH_EVENT, base_dir=input_dir), "raw")
+
+    # some missing values, like in the real tracking output
+    rng = np.random.default_rng(args.seed)
+    df_raw.loc[rng.random(len(df_raw)) < 0.02, "velocity"] = np.nan
+    df_raw.loc[rng.random(len(df_raw)) < 0.005, "bb_center_lidar_y"] = np.nan
+
+    reference, t_pandas = run_backend("pandas", df_raw)
+    candidate, t_polars = run_backend("polars", df_raw)
+
+    print(f"{len(df_raw)} detections | pandas {t_pandas:.2f} s | polars {t_polars:.2f} s")
+    failures = compare_products(reference, candidate, args.rtol)
+    print("Backends equivalent." if not failures else f"Backends differ in: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
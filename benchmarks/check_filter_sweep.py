@@ -0,0 +1,99 @@
+# check_filter_sweep.py
+
+# Equivalence check of the filter threshold sweep (OEB_Filter_Sweep.py) on synthetic data.
+# Runs filter steps 1 - 5 (OEB_Filter_process.apply_filters) for a few combinations of the sweep grid and compares
+# the kept / jumping tracks and detections with the sweep result.
+# Run from the repository root, e.g.:
+#   python -m benchmarks.check_filter_sweep --frames 20000
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+from benchmarks.synthetic_tracks import write_event_inputs
+from benchmarks.run_benchmarks import BENCH_EVENT
+
+
+CHECK_GRID = {
+    "VELOCITY_RANGE": [(0, 10), (0.2, 4)],
+    "MIN_ROLL_WINDOW": [3, 5],
+    "MAX_ROLL_WINDOW": [11],
+    "YAXIS_MIN_LENGTH": [0.05, 0.2, 0.5, 1.0],
+    "JUMP_THRESHOLD": [0.25, 1, 2],
+    "MIN_MEDIAN_TRACK_VEL": [0, 0.1, 0.5],
+}
+
+
+def run_filter(df_raw: pd.DataFrame, settings: dict) -> dict:
+    from OEB_Filter_process import apply_filters
+
+    previous = {name: getattr(config, name) for name in settings}
+    for name, value in settings.items():
+        setattr(config, name, value)
+    try:
+        df_clean, df_bad = apply_filters(df_raw)
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+    return {
+        "tracks_kept": df_clean["track"].nunique(),
+        "tracks_jumping": df_bad["track"].nunique(),
+        "detections_kept": len(df_clean),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the filter threshold sweep with the filter steps.")
+    parser.add_argument("--frames", type=int, default=20000, help="number of image frames")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checks", type=int, default=12, help="grid combinations run through the filter steps")
+    args = parser.parse_args(argv)
+
+    from OEB_Filter_Sweep import sweep_filter_thresholds
+    from utils.data_utils import load_and_merge_event_data
+    from utils.schema import enforce_schema
+
+    with tempfile.TemporaryDirectory(prefix="oeb_filter_sweep_") as workdir:
+        input_dir = Path(workdir) / "input_data"
+        write_event_inputs(input_dir, BENCH_EVENT, n_frames=args.frames, seed=args.seed)
+        df_raw = enforce_schema(load_and_merge_event_data(BENCH_EVENT, base_dir=input_dir), "raw")
+
+    # some missing values, like in the real tracking output
+    rng = np.random.default_rng(args.seed)
+    df_raw.loc[rng.random(len(df_raw)) < 0.02, "velocity"] = np.nan
+    df_raw.loc[rng.random(len(df_raw)) < 0.005, "bb_center_lidar_y"] = np.nan
+
+    t_start = time.perf_counter()
+    df_sweep = sweep_filter_thresholds(df_raw, CHECK_GRID)
+    t_sweep = time.perf_counter() - t_start
+
+    failures = 0
+    t_filter = 0.0
+    for i in rng.choice(len(df_sweep), size=min(args.checks, len(df_sweep)), replace=False):
+        row = df_sweep.iloc[i]
+        settings = {name: row[name].item() if isinstance(row[name], np.generic) else row[name] for name in CHECK_GRID}
+        t_start = time.perf_counter()
+        expected = run_filter(df_raw, settings)
+        t_filter += time.perf_counter() - t_start
+
+        got = {name: int(row[name]) for name in expected}
+        status = "OK     " if got == expected else "DIFFERS"
+        failures += got != expected
+        print(f"  {status} {settings} filter {expected} sweep {got}")
+
+    n_checks = min(args.checks, len(df_sweep))
+    print(f"{len(df_raw)} detections | sweep of {len(df_sweep)} combinations {t_sweep:.2f} s | "
+          f"filter steps {t_filter / max(n_checks, 1):.2f} s per combination")
+    print("Sweep equivalent." if not failures else f"Sweep differs in {failures} of {n_checks} combinations")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
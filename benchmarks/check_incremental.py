@@ -0,0 +1,124 @@
+# check_incremental.py
+
+# Equivalence check of the incremental run (OEB_Incremental.py) on synthetic data.
+# all_stats is written in byte chunks (cut in the middle of lines and frames, like a file that is still being
+# written), one incremental update per chunk, some of them with --up-to, then --finalize. The products are
+# compared with the filter steps and per-frame statistics of a batch run over the complete file.
+# Run from the repository root, e.g.:
+#   python -m benchmarks.check_incremental --frames 20000 --updates 12
+
+import argparse
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+from benchmarks.synthetic_tracks import write_event_inputs
+from benchmarks.run_benchmarks import BENCH_EVENT
+
+
+def run_batch(input_dir: Path) -> dict:
+    from OEB_Filter_process import apply_filters
+    from utils.data_utils import (
+        load_and_merge_event_data,
+        extract_frame_time_table,
+        compute_mean_median_per_frame,
+        prepare_df_for_plot,
+    )
+    from utils.schema import enforce_schema
+
+    df_raw = enforce_schema(load_and_merge_event_data(BENCH_EVENT, base_dir=input_dir), "raw")
+    df_clean, df_bad = apply_filters(df_raw)
+    df_stats = compute_mean_median_per_frame(df_clean, config)
+    df_mova = prepare_df_for_plot(df_stats, window_size=config.MOVING_AVERAGE_WINDOW_SIZE,
+                                  gap_threshold=config.GAP_THRESHOLD)
+
+    return {
+        "raw": df_raw,
+        "time": enforce_schema(extract_frame_time_table(df_raw), "time"),
+        "clean": enforce_schema(df_clean, "clean"),
+        "bad": enforce_schema(df_bad, "bad"),
+        "mova": enforce_schema(df_mova, "mova"),
+        # CSV export, read back like the incremental one
+        "stats": pd.read_csv(io.StringIO(df_stats.to_csv(index=False))),
+    }
+
+
+def run_incremental(input_dir: Path, all_stats: bytes, n_updates: int, seed: int) -> dict:
+    from OEB_Incremental import incremental_update
+    from utils.product_io import read_product, product_path, resolve_product
+
+    stats_path = input_dir / BENCH_EVENT / f"all_stats_{BENCH_EVENT}.txt"
+    frames = pd.read_csv(io.BytesIO(all_stats), usecols=["frame"])["frame"].to_numpy()
+    line_ends = np.flatnonzero(np.frombuffer(all_stats, dtype=np.uint8) == ord("\n")) + 1
+
+    rng = np.random.default_rng(seed)
+    cuts = np.sort(rng.integers(line_ends[0], len(all_stats), n_updates))
+
+    for i, cut in enumerate(cuts):
+        stats_path.write_bytes(all_stats[:cut])
+        # every third update only up to a frame in the middle of the complete rows (--up-to)
+        n_rows = np.searchsorted(line_ends, cut, side="right") - 1
+        up_to = int(frames[n_rows // 2]) if i % 3 == 2 and n_rows else None
+        incremental_update(up_to_frame=up_to, base_dir=input_dir)
+
+    stats_path.write_bytes(all_stats)
+    incremental_update(finalize=True, base_dir=input_dir)
+
+    products = {p: read_product(p) for p in ["raw", "time", "clean", "bad", "mova"]}
+    products["stats"] = pd.read_csv(product_path(resolve_product("stats"), ext="csv"))
+    return products
+
+
+def compare_products(reference: dict, candidate: dict) -> list[str]:
+    failures = []
+    for name, df_ref in reference.items():
+        try:
+            pd.testing.assert_frame_equal(df_ref, candidate[name], check_index_type=False)
+            print(f"  {name:<8} OK      ({len(df_ref)} rows)")
+        except AssertionError as e:
+            print(f"  {name:<8} DIFFERS {str(e).splitlines()[0]}")
+            failures.append(name)
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the incremental run with a batch run on synthetic data.")
+    parser.add_argument("--frames", type=int, default=20000, help="number of image frames")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--updates", type=int, default=12, help="incremental updates before --finalize")
+    args = parser.parse_args(argv)
+
+    from utils.run_utils import apply_run_settings
+
+    with tempfile.TemporaryDirectory(prefix="oeb_incremental_") as workdir:
+        input_dir = Path(workdir) / "input_data"
+        event_dir = write_event_inputs(input_dir, BENCH_EVENT, n_frames=args.frames, seed=args.seed)
+        all_stats = (event_dir / f"all_stats_{BENCH_EVENT}.txt").read_bytes()
+
+        apply_run_settings(config, event=BENCH_EVENT)
+        config.OUTPUT_DIR = Path(workdir) / "output" / BENCH_EVENT
+        config.OUTPUT_DIR.mkdir(parents=True)
+
+        t_start = time.perf_counter()
+        reference = run_batch(input_dir)
+        t_batch = time.perf_counter() - t_start
+
+        t_start = time.perf_counter()
+        candidate = run_incremental(input_dir, all_stats, args.updates, args.seed)
+        t_incremental = time.perf_counter() - t_start
+
+    print(f"{len(reference['raw'])} detections | batch {t_batch:.2f} s | "
+          f"{args.updates} incremental updates + finalize {t_incremental:.2f} s")
+    failures = compare_products(reference, candidate)
+    print("Incremental run equivalent." if not failures else f"Incremental run differs in: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+# run_benchmarks.py
+
+# Benchmark of all pipeline stages on synthetic data (see benchmarks/synthetic_tracks.py).
+# Run from the repository root, e.g.:
+#   python -m benchmarks.run_benchmarks --frames 20000 --label baseline
+#   python -m benchmarks.run_benchmarks --frames 20000 --label new --compare output/benchmarks/bench_baseline_<time>.json
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import matplotlib
+matplotlib.use("Agg")
+
+import pandas as pd
+
+import config
+from benchmarks.synthetic_tracks import write_event_inputs
+from utils.profiling import profile_stage, get_stage_metrics, reset_stage_metrics
+
+
+BENCH_EVENT = "synthetic"
+
+
+def make_bench_config(output_dir: Path, start_frame: int, end_frame: int) -> SimpleNamespace:
+    """
+    Copy of all config constants with the benchmark event, output folder and frame window.
+    """
+    values = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    values.update(
+        EVENT=BENCH_EVENT,
+        OUTPUT_DIR=output_dir,
+        START_FRAME=start_frame,
+        END_FRAME=end_frame,
+        PROFILE_STAGES=True,
+    )
+    return SimpleNamespace(**values)
+
+
+def run_pipeline_once(cfg: SimpleNamespace, input_dir: Path, run_plots: bool = True) -> None:
+    # imports here so that the import time is not part of the first stage
+    from utils.data_utils import (
+        load_and_merge_event_data,
+        extract_frame_time_table,
+        compute_mean_median_per_frame,
+        prepare_df_for_plot,
+        compute_track_velocities,
+        compute_track_grainsize,
+    )
+    from utils.data_filter import (
+        filter_tracks_range,
+        rolling_median_filter,
+        filter_tracks_by_movement,
+        filter_tracks_that_jump,
+        filter_tracks_by_stats,
+    )
+    from utils.gsd_utils import build_gsd_summary, compute_gsd_curve
+    from utils import plot_utils
+
+    # --- Ingest ---
+    df_raw = load_and_merge_event_data(cfg.EVENT, base_dir=input_dir)
+    df_time = extract_frame_time_table(df_raw)
+
+    # --- Filters ---
+    with profile_stage("filters", rows_in=len(df_raw)) as record:
+        df = filter_tracks_range(df_raw, vel_range=cfg.VELOCITY_RANGE, gs_range=cfg.GRAINSIZE_RANGE)
+        df = rolling_median_filter(df, min_window=cfg.MIN_ROLL_WINDOW, max_window=cfg.MAX_ROLL_WINDOW)
+        df = filter_tracks_by_movement(df, yaxis_min_length=cfg.YAXIS_MIN_LENGTH)
+        df, df_bad = filter_tracks_that_jump(df, jump_threshold=cfg.JUMP_THRESHOLD)
+        df_clean = filter_tracks_by_stats(df, min_median_track_vel=cfg.MIN_MEDIAN_TRACK_VEL)
+        record["rows_out"] = len(df_clean)
+
+    # --- Per-frame statistics ---
+    df_stats = compute_mean_median_per_frame(df_clean, cfg)
+    df_mova = prepare_df_for_plot(df_stats, window_size=cfg.MOVING_AVERAGE_WINDOW_SIZE,
+                                  gap_threshold=cfg.GAP_THRESHOLD)
+
+    # --- Per-track LOWESS ---
+    df_per_track_velocities, df_velocities_lowess = compute_track_velocities(df_clean, cfg)
+    df_per_track_grainsize, df_grainsize_lowess = compute_track_grainsize(df_clean, cfg)
+
+    # --- GSD ---
+    with profile_stage("gsd", rows_in=len(df_per_track_grainsize)):
+        build_gsd_summary(df_per_track_grainsize, cfg.EVENT)
+        compute_gsd_curve(df_per_track_grainsize["mean_track_grainsize"].dropna())
+
+    if not run_plots:
+        return
+
+    # --- Main plots ---
+    df_piv_mova = pd.DataFrame({"frame": df_mova["frame"], "piv_vel_smoothed": df_mova["mean_vel_ma"]})
+
+    plot_utils.plot_variable_against_frame(
+        df_mova=df_mova, config=cfg, plot_variable="velocity", statistic="mean",
+        color_ma="Steelblue", label_name="velocity", y_label="Velocity (m/s)",
+        df_time=df_time, y_lim=cfg.YLIM_VELOCITY,
+    )
+    plot_utils.plot_piv_and_mean_velocity_per_frame(df_piv_mova, df_mova, df_time, cfg)
+    plot_utils.plot_track_velocities_lowess(df_per_track_velocities, df_velocities_lowess, df_piv_mova,
+                                            df_time, cfg, add_surge_classes=False, add_percentiles=True)
+    plot_utils.plot_track_vel_and_grainsize(df_per_track_grainsize, df_per_track_velocities,
+                                            df_grainsize_lowess, df_velocities_lowess, df_time, cfg,
+                                            add_surge_classes=False)
+    plot_utils.plot_cross_section_velocity(df_clean, cfg)
+    plot_utils.plot_number_of_detections(df_clean, df_time, cfg)
+
+    df_sequence = df_clean[df_clean["frame"].between(cfg.START_FRAME, cfg.END_FRAME)]
+    plot_utils.plot_xy_mov_tracks(df_sequence, cfg, title="clean")
+
+
+def summarize_metrics(df_metrics: pd.DataFrame) -> dict:
+    """
+    Best (minimum) wall time per stage over all repeats, plus CPU time, in-stage peak RSS (and its rise over the stage start) and row counts.
+    """
+    stages = {}
+    for stage, group in df_metrics.groupby("stage", sort=False):
+        best = group.loc[group["wall_time_s"].idxmin()]
+        stages[stage] = {
+            "wall_time_s": float(best["wall_time_s"]),
+            "wall_time_mean_s": float(group["wall_time_s"].mean()),
+            "cpu_time_s": float(best["cpu_time_s"]),
+            "peak_rss_mb": None if pd.isna(best["peak_rss_mb"]) else float(best["peak_rss_mb"]),
+            "peak_delta_mb": None if pd.isna(best["peak_delta_mb"]) else float(best["peak_delta_mb"]),
+            "rows_in": None if pd.isna(best["rows_in"]) else int(best["rows_in"]),
+            "rows_out": None if pd.isna(best["rows_out"]) else int(best["rows_out"]),
+            "calls": int(len(group)),
+        }
+    return stages
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(report: dict, reference_path: Path) -> None:
+    with open(reference_path) as f:
+        reference = json.load(f)
+
+    print(f"\n{'Stage':<42}{'reference (s)':>15}{'current (s)':>14}{'speedup':>10}")
+    for stage, values in report["stages"].items():
+        ref = reference["stages"].get(stage)
+        if ref is None:
+            continue
+        speedup = ref["wall_time_s"] / values["wall_time_s"] if values["wall_time_s"] > 0 else float("nan")
+        print(f"{stage:<42}{ref['wall_time_s']:>15.3f}{values['wall_time_s']:>14.3f}{speedup:>9.2f}x")
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark the OEB pipeline on synthetic tracking data.")
+    parser.add_argument("--frames", type=int, default=20000, help="number of image frames")
+    parser.add_argument("--tracks-per-frame", type=float, default=0.5, help="mean new tracks per frame")
+    parser.add_argument("--track-length", type=int, nargs=2, default=(5, 80), metavar=("MIN", "MAX"))
+    parser.add_argument("--jump-rate", type=float, default=0.03, help="fraction of jumping tracks")
+    parser.add_argument("--noise", type=float, default=0.02, help="position noise (m)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions, best time per stage is reported")
+    parser.add_argument("--no-plots", action="store_true", help="skip the plot stages")
+    parser.add_argument("--label", default="run", help="name of the report")
+    parser.add_argument("--output", type=Path, default=Path("output") / "benchmarks", help="report folder")
+    parser.add_argument("--compare", type=Path, default=None, help="reference report to compare against")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    scale = {
+        "n_frames": args.frames,
+        "tracks_per_frame": args.tracks_per_frame,
+        "track_length": tuple(args.track_length),
+        "jump_rate": args.jump_rate,
+        "noise": args.noise,
+        "seed": args.seed,
+    }
+
+    with tempfile.TemporaryDirectory(prefix="oeb_bench_") as workdir:
+        workdir = Path(workdir)
+        input_dir = workdir / "input_data"
+        output_dir = workdir / "output" / BENCH_EVENT
+        output_dir.mkdir(parents=True)
+
+        event_dir = write_event_inputs(input_dir, BENCH_EVENT, **scale)
+        n_rows = sum(1 for _ in open(event_dir / f"all_stats_{BENCH_EVENT}.txt")) - 1
+
+        cfg = make_bench_config(output_dir, start_frame=0, end_frame=args.frames)
+
+        previous_flag = config.PROFILE_STAGES
+        config.PROFILE_STAGES = True
+        reset_stage_metrics()
+        try:
+            for i in range(args.repeat):
+                print(f"--- Benchmark run {i + 1}/{args.repeat} ({n_rows} detections) ---")
+                run_pipeline_once(cfg, input_dir, run_plots=not args.no_plots)
+            df_metrics = get_stage_metrics()
+        finally:
+            config.PROFILE_STAGES = previous_flag
+            reset_stage_metrics()
+
+    report = {
+        "label": args.label,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "scale": scale,
+        "n_detections": n_rows,
+        "repeat": args.repeat,
+        "stages": summarize_metrics(df_metrics),
+    }
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path = args.output / f"bench_{args.label}_{timestamp}.json"
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for stage, values in report["stages"].items():
+        print(f"{stage:<42}{values['wall_time_s']:>10.3f} s   rows {values['rows_in']} -> {values['rows_out']}")
+    print(f"\nReport written to {out_path}")
+
+    if args.compare is not None:
+        compare_reports(report, args.compare)
+
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# synthetic_tracks.py
+
+# Synthetic debris-flow detections in the layout of the tracking output
+# (all_stats_<event>.txt + time_column_<event>.txt), used to benchmark the pipeline at any scale.
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def generate_event_data(
+    n_frames: int = 20000,
+    tracks_per_frame: float = 0.5,
+    track_length: tuple = (5, 80),
+    jump_rate: float = 0.03,
+    noise: float = 0.02,
+    stationary_rate: float = 0.1,
+    outlier_rate: float = 0.01,
+    fps: float = 10.0,
+    seed: int = 0,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Generate raw tracking output.
+
+    Parameters
+    ----------
+    n_frames : int
+        Number of image frames of the event
+    tracks_per_frame : float
+        Mean number of new tracks starting per frame (Poisson)
+    track_length : tuple
+        (min, max) track length in frames, uniformly distributed
+    jump_rate : float
+        Fraction of tracks with one position jump (removed by the jump filter)
+    noise : float
+        Std of the position noise (m), velocity and grain size noise scale with it
+    stationary_rate : float
+        Fraction of tracks without downstream movement (removed by the y-movement filter)
+    outlier_rate : float
+        Fraction of detections with unphysical velocities (removed by the range filter)
+    fps : float
+        Frame rate used for positions and the time column
+
+    Returns
+    -------
+    df_all_stats : pd.DataFrame
+        Detections (frame, track, velocity, grainsize, bb_center_lidar_x/y/z, bb_width)
+    df_time_column : pd.DataFrame
+        Frame to time table (frame_img, time)
+    """
+    rng = np.random.default_rng(seed)
+
+    # --- Track starts, lengths and per-track properties ---
+    n_starts = rng.poisson(tracks_per_frame, size=n_frames)
+    start_frame = np.repeat(np.arange(n_frames), n_starts)
+    n_tracks = len(start_frame)
+
+    length = rng.integers(track_length[0], track_length[1] + 1, size=n_tracks)
+    velocity = rng.lognormal(mean=np.log(2.0), sigma=0.35, size=n_tracks)
+    velocity[rng.random(n_tracks) < stationary_rate] = 0.0
+    grainsize = rng.lognormal(mean=np.log(0.25), sigma=0.4, size=n_tracks)
+    x0 = rng.uniform(-8, 1, size=n_tracks)
+    y0 = rng.uniform(6, 9, size=n_tracks)
+
+    # --- Expand to one row per detection ---
+    track = np.repeat(np.arange(n_tracks), length)
+    offsets = np.arange(length.sum()) - np.repeat(np.cumsum(length) - length, length)
+    frame = start_frame[track] + offsets
+    n_rows = len(track)
+
+    y = y0[track] - offsets * velocity[track] / fps + rng.normal(0, noise, n_rows)
+    x = x0[track] + rng.normal(0, noise, n_rows)
+    z = rng.normal(0, noise, n_rows)
+
+    # one jump in the second half of the jumping tracks
+    jumping = rng.random(n_tracks) < jump_rate
+    y += np.where(jumping[track] & (offsets > length[track] // 2), 3.0, 0.0)
+
+    vel = velocity[track] + rng.normal(0, noise * 15, n_rows)
+    vel[rng.random(n_rows) < outlier_rate] = 50.0
+    gs = grainsize[track] + rng.normal(0, noise * 1.5, n_rows)
+
+    df_all_stats = pd.DataFrame({
+        "frame": frame,
+        "track": track,
+        "velocity": vel,
+        "grainsize": gs,
+        "bb_center_lidar_x": x,
+        "bb_center_lidar_y": y,
+        "bb_center_lidar_z": z,
+        "bb_width": gs * 1.1,
+    }).sort_values(["frame", "track"], kind="stable").reset_index(drop=True)
+
+    last_frame = int(frame.max()) if n_rows else n_frames
+    frames = np.arange(last_frame + 1)
+    df_time_column = pd.DataFrame({"frame_img": frames, "time": frames / fps})
+
+    return df_all_stats, df_time_column
+
+
+def write_event_inputs(base_dir, event: str, **generator_kwargs) -> Path:
+    """
+    Write synthetic all_stats / time_column files to <base_dir>/<event>/ and return that folder.
+    """
+    df_all_stats, df_time_column = generate_event_data(**generator_kwargs)
+
+    event_dir = Path(base_dir) / event
+    event_dir.mkdir(parents=True, exist_ok=True)
+
+    df_all_stats.to_csv(event_dir / f"all_stats_{event}.txt", index=False)
+    df_time_column.to_csv(event_dir / f"time_column_{event}.txt", index=False)
+
+    return event_dir
@@ -21,6 +21,31 @@ ADD_PERCENTILES = False
 OUTPUT_DIR = Path.cwd() / "output" / EVENT
 
 
+# --------------------------------------------
+# --- Run diagnostics
+# --------------------------------------------
+PROFILE_STAGES = True   # log wall/CPU time, memory and rows per stage + write stage_metrics_<run>.json to OUTPUT_DIR
+
+# Execution engine of the filter and calculation stages
+BACKEND = "pandas"   # or "polars": lazy, multithreaded Polars versions (utils/polars_backend.py)
+
+# Per-track kernels of the filters and track statistics (utils/track_kernels.py)
+TRACK_KERNELS = "auto"   # Numba if installed, else NumPy / "numba" / "numpy" / "pandas" (original groupby code)
+
+# Compact dtypes (int32 ids, float32 measurements) and no scratch columns in all products (utils/schema.py)
+ENFORCE_SCHEMA = True
+
+# Format in which the stages read intermediate products (Parquet is always written as archival export)
+INTERMEDIATE_FORMAT = "parquet"   # or "arrow": uncompressed Arrow IPC cache next to the Parquet files, memory-mapped on read
+
+# Products published as memory-mapped Arrow files for parallel workers (OEB_main.py --shared-memory)
+SHARED_PRODUCTS = ["clean", "time", "bad", "mova", "piv_mova",
+                   "per_track_velocities", "velocities_lowess", "per_track_grainsize", "grainsize_lowess"]
+
+# Threads that load the products of a plot stage concurrently (utils/product_io.load_products, 1 = sequential)
+LOAD_WORKERS = 8
+
+
 # --------------------------------------------
 # --- FILTER / SMOOTHING parameters
 # --------------------------------------------
@@ -41,6 +66,25 @@ JUMP_THRESHOLD = 1
 # Step 5
 MIN_MEDIAN_TRACK_VEL = 0.1
 
+# Filter threshold sweep (OEB_Filter_Sweep.py): values per parameter, parameters not listed keep the value above
+FILTER_SWEEP_GRID = {
+    "VELOCITY_RANGE": [(0, 10)],
+    "MIN_ROLL_WINDOW": [3],
+    "MAX_ROLL_WINDOW": [11],
+    "YAXIS_MIN_LENGTH": [0.05, 0.1, 0.2, 0.3, 0.5, 1.0],
+    "JUMP_THRESHOLD": [0.25, 0.5, 1, 1.5, 2, 3],
+    "MIN_MEDIAN_TRACK_VEL": [0, 0.05, 0.1, 0.2, 0.3, 0.5],
+}
+
+
+# Incremental processing (OEB_Incremental.py): tracks are final when their last detection is more than
+# this many frames older than the newest received frame
+INCREMENTAL_FINALIZE_FRAMES = 100
+
+# Live monitoring (OEB_Monitor.py)
+MONITOR_POLL_SECONDS = 0.05         # input polling interval
+MONITOR_IDLE_FLUSH_SECONDS = 0.5    # publish the current frame when no rows arrived for this long
+
 
 # --------------------------------------------
 # --- Calculation parameters per frame stats
@@ -57,17 +101,75 @@ LOWESS_FRAME_WINDOW_SIZE = 20
 LOWESS_GAP_THRESHOLD = 150
 LOWESS_SEGMENT_LENGTH = 20
 
+# LOWESS parameter sweep (OEB_Lowess_Sweep.py): values per parameter, parameters not listed keep the value above
+LOWESS_SWEEP_GRID = {
+    "LOWESS_FRAME_WINDOW_SIZE": [10, 20, 40, 80],
+    "LOWESS_GAP_THRESHOLD": [150],
+    "LOWESS_SEGMENT_LENGTH": [20],
+    "LOWESS_ITERATIONS": [1],
+}
+LOWESS_SWEEP_JOBS = 4       # worker processes of the sweep (1 = one parameter set after the other)
+
+# Percentile bands (p5 - p95) of the per track statistics
+PERCENTILE_METHOD = "rolling_mean"  # or "sketch" (rolling window percentiles from merged quantile sketches)
+PERCENTILE_WINDOW = 20
+SKETCH_COMPRESSION = 100
+
+# Bootstrap confidence band of the LOWESS curves (utils/bootstrap.py, columns ci_low / ci_high of the lowess
+# products): resamples of the tracks per segment, 0 = no band (e.g. 1000 for a final run)
+BOOTSTRAP_REPLICATES = 0
+BOOTSTRAP_CI = 0.95             # confidence level
+BOOTSTRAP_JOBS = 4              # worker processes of the LOWESS refits (divided by OEB_main.py --jobs)
+BOOTSTRAP_SEED = 0
+
+# Windowed calculations: per-frame and per-track products only for START_FRAME - END_FRAME plus a margin of
+# context for the moving averages and LOWESS, saved as df_<product>_f<start>-<end>_<event>.parquet
+WINDOWED_CALCULATION = False
+WINDOW_MARGIN_FRAMES = 500
+
 STATISTIC_TYPE = "mean" # or "median"  # Per Track velocity (mean or median over track lifespan) Median --> looks weird, multiple same values due to point cloud interpolation
 
+# --------------------------------------------
+# --- GSD parameters
+# --------------------------------------------
+GSD_BIN_WIDTH = 0.001    # (m) bin width of the cached GSD summaries (gsd_summary_<event>.parquet)
+
 # --------------------------------------------
 # --- Plot Parameters
 # --------------------------------------------
 FIG_SIZE =      (14,7)#(15,6)  #     #2:1 # 2.5:1
 
+# Keep one figure per layout and only replace the data artists between plots (utils/plot_utils.get_figure)
+REUSE_FIGURES = True
+
+# Export profile of all saved figures (utils/plot_utils.save_figure, OEB_main.py --export-profile)
+# format None keeps the file name's extension (JPEG plots, PNG otherwise), bbox_inches None skips the extra
+# draw pass of the tight bounding box
+EXPORT_PROFILE = "production"
+EXPORT_PROFILES = {
+    "preview":     {"format": "png",  "dpi": 60,  "bbox_inches": None},      # fast check during exploration
+    "production":  {"format": None,   "dpi": 300, "bbox_inches": "tight"},   # full quality (previous default)
+    "publication": {"format": "pdf",  "dpi": 300, "bbox_inches": "tight"},   # vector, dpi of rasterized layers
+    "web":         {"format": "png",  "dpi": 110, "bbox_inches": "tight"},
+}
+# Scatter / line collections with more elements are rasterized in vector output (small PDFs that open quickly)
+RASTERIZE_MIN_POINTS = 2000
+
+# Interactive dashboard (OEB_Dashboard.py)
+DASHBOARD_PORT = 8050
+PLOTLY_JS_PATH = None       # local plotly.min.js, None: copy of the plotly Python package (required, no CDN)
+
+# Sweep mode (OEB_main.py --sweep): processes that render the frame windows of a plot stage (1 = one after the other)
+SWEEP_JOBS = 1
+
+# Long windows draw the min / max envelope of the LOD pyramid (product lod, stage "lod") instead of every frame
+USE_LOD_PYRAMID = True
+
 YLIM_VELOCITY = (0, 5)
 YLIM_GRAINSIZE = (0, 1)
 
 # Cross-section plots
+FIG_SIZE_BUBBLE = FIG_SIZE
 Y_AXIS_START= 8
 Y_AXIS_END = -8
 X_LIM_AXIS_CS = (-10, 2)
@@ -0,0 +1,178 @@
+# bootstrap.py
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.profiling import profiled
+
+
+# BOOTSTRAP CONFIDENCE BANDS OF THE LOWESS CURVES
+# The p5 - p95 bands describe the spread of the tracks, not the uncertainty of the smoothed curve. Here the tracks
+# of every LOWESS segment are resampled with replacement and LOWESS is refitted on each resample (same span as the
+# curve) at the center frames of the segment; the percentiles of the replicates per frame give the pointwise
+# confidence band. A resample is a multiplicity weight per track (np.bincount of the drawn indices), so all
+# replicates of a task are fitted at once as weighted local-linear regressions over the tricube neighbourhoods of
+# the curve itself (sparse frames x tracks kernel, one replicates x tracks weight matrix), including the robustness
+# iterations. The replicates of all segments are split into tasks and fitted on parallel processes.
+
+BOOTSTRAP_CHUNK = 200       # replicates per task (fixed, so the random streams do not depend on the job count)
+
+
+def tricube_kernel(frames: np.ndarray, eval_frames: np.ndarray, frac: float):
+    """
+    Neighbourhood weights of statsmodels' lowess at eval_frames for the sorted data frames: the k = frac * n
+    nearest points, tricube of the distance over the neighbourhood radius. Returns the sparse (eval frames x points)
+    kernel and the same pattern holding the distance to the eval frame.
+    """
+    from scipy.sparse import csr_matrix
+
+    n = len(frames)
+    k = min(max(int(frac * n + 1e-10), 2), n)
+
+    # left end of the window of k points, as the sliding window of statsmodels
+    midpoints = (frames[:n - k] + frames[k:]) / 2.0
+    left = np.searchsorted(midpoints, eval_frames, side="left")
+    columns = left[:, None] + np.arange(k)
+    radius = np.maximum(eval_frames - frames[left], frames[left + k - 1] - eval_frames)
+
+    dx = frames[columns] - eval_frames[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = np.clip(1 - (np.abs(dx) / radius[:, None]) ** 3, 0, None) ** 3
+    weights = np.nan_to_num(weights)                                # radius 0: no regression
+
+    rows = np.repeat(np.arange(len(eval_frames)), k)
+    shape = (len(eval_frames), n)
+    kernel = csr_matrix((weights.ravel(), (rows, columns.ravel())), shape=shape)
+    distance = csr_matrix((dx.ravel(), (rows, columns.ravel())), shape=shape)
+    return kernel, distance
+
+
+def weighted_local_linear(kernel, distance, weights: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Local-linear fits at the eval frames of the kernel for every row of weights (replicates x points), with the
+    projection of statsmodels' lowess. Fits with fewer than two weighted points are NaN. Returns replicates x frames.
+    """
+    weights_t = weights.T
+    active = (kernel > 1e-12).astype(np.float64)
+    n_points = (active @ (weights_t > 1e-12)).T
+
+    s0 = (kernel @ weights_t).T
+    s1 = (kernel.multiply(distance) @ weights_t).T
+    s2 = (kernel.multiply(distance.multiply(distance)) @ weights_t).T
+    t0 = (kernel @ (weights_t * values[:, None])).T
+    t1 = (kernel.multiply(distance) @ (weights_t * values[:, None])).T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_dx = s1 / s0
+        sqdev = np.maximum(s2 / s0 - mean_dx ** 2, 1e-12)
+        fits = t0 / s0 - mean_dx * (t1 / s0 - mean_dx * t0 / s0) / sqdev
+    return np.where(n_points >= 2, fits, np.nan)
+
+
+def robustness_weights(residuals: np.ndarray, multiplicity: np.ndarray) -> np.ndarray:
+    """
+    Bisquare weights of the residuals (replicates x points) with the median absolute residual of each resample,
+    every point counted multiplicity times (as np.median over the resampled points).
+    """
+    abs_resid = np.abs(residuals)
+    order = np.argsort(abs_resid, axis=1)
+    sorted_resid = np.take_along_axis(abs_resid, order, axis=1)
+    cumulative = np.cumsum(np.take_along_axis(multiplicity, order, axis=1), axis=1)
+
+    n = cumulative[:, -1:]
+    lower = np.take_along_axis(sorted_resid, (cumulative <= (n - 1) // 2).sum(axis=1, keepdims=True), axis=1)
+    upper = np.take_along_axis(sorted_resid, (cumulative <= n // 2).sum(axis=1, keepdims=True), axis=1)
+    median = (lower + upper) / 2
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scaled = np.where(median > 0, abs_resid / (6.0 * median), (abs_resid > 0).astype(np.float64))
+    return (1 - np.minimum(scaled, 1.0) ** 2) ** 2
+
+
+def _fit_replicates(task) -> tuple[int, np.ndarray]:
+    """
+    LOWESS of n_replicates resamples of one segment, evaluated at eval_frames: array (replicates x frames).
+    """
+    seg_id, frames, values, eval_frames, frac, iterations, n_replicates, seed = task
+    rng = np.random.default_rng(seed)
+    n = len(frames)
+    samples = rng.integers(0, n, size=(n_replicates, n))
+
+    # multiplicity of every track in every resample
+    offsets = np.arange(n_replicates)[:, None] * n
+    multiplicity = np.bincount((samples + offsets).ravel(), minlength=n_replicates * n).reshape(n_replicates, n)
+    multiplicity = multiplicity.astype(np.float64)
+
+    kernel, distance = tricube_kernel(frames, eval_frames, frac)
+    frame_index = np.searchsorted(eval_frames, frames)
+
+    weights = multiplicity
+    for _ in range(iterations):
+        fits = weighted_local_linear(kernel, distance, weights, values)
+        residuals = np.nan_to_num(values - fits[:, frame_index])       # no fit: residual 0, as statsmodels
+        weights = multiplicity * robustness_weights(residuals, multiplicity)
+    return seg_id, weighted_local_linear(kernel, distance, weights, values)
+
+
+@profiled()
+def bootstrap_lowess_bands(df_per_track: pd.DataFrame, value_col: str, df_lowess: pd.DataFrame, config,
+                           n_jobs: int | None = None) -> pd.DataFrame:
+    """
+    Add the pointwise bootstrap confidence band (columns ci_low, ci_high, level config.BOOTSTRAP_CI) of the LOWESS
+    curve of value_col to df_lowess. df_per_track: per-track table with center_frame and segment, as returned by
+    compute_track_velocities / compute_track_grainsize. config.BOOTSTRAP_REPLICATES resamples per segment on
+    n_jobs processes (default config.BOOTSTRAP_JOBS), reproducible with config.BOOTSTRAP_SEED.
+    """
+    n_replicates = config.BOOTSTRAP_REPLICATES
+    n_jobs = config.BOOTSTRAP_JOBS if n_jobs is None else n_jobs
+    if df_lowess.empty or n_replicates <= 0:
+        return df_lowess
+
+    # segments and span as the curve: length and center frames before tracks without a value are dropped
+    segments = []
+    for seg_id, seg in df_per_track.groupby("segment"):
+        if len(seg) < config.LOWESS_SEGMENT_LENGTH:
+            continue
+        frac = min(1.0, config.LOWESS_FRAME_WINDOW_SIZE / seg["center_frame"].nunique())
+        seg = seg.dropna(subset=[value_col]).sort_values("center_frame", kind="stable")
+        if len(seg):
+            segments.append((seg_id, seg, frac))
+
+    # replicates of each segment split into tasks of BOOTSTRAP_CHUNK, one random stream per task
+    chunk = BOOTSTRAP_CHUNK
+    seeds = iter(np.random.SeedSequence(config.BOOTSTRAP_SEED).spawn(len(segments) * -(-n_replicates // chunk)))
+    tasks = []
+    for seg_id, seg, frac in segments:
+        frames = seg["center_frame"].to_numpy(dtype=np.float64)
+        for start in range(0, n_replicates, chunk):
+            tasks.append((seg_id, frames, seg[value_col].to_numpy(dtype=np.float64), np.unique(frames), frac,
+                          config.LOWESS_ITERATIONS, min(chunk, n_replicates - start), next(seeds)))
+
+    logging.info(f"Bootstrap of {value_col}: {n_replicates} replicates x {len(segments)} segments, "
+                 f"{len(tasks)} tasks on {n_jobs} process(es)")
+
+    if n_jobs <= 1 or len(tasks) <= 1:
+        results = [_fit_replicates(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            results = list(executor.map(_fit_replicates, tasks))
+
+    fits = {}
+    for seg_id, seg_fits in results:
+        fits.setdefault(seg_id, []).append(seg_fits)
+
+    alpha = (1 - config.BOOTSTRAP_CI) / 2
+    bands = []
+    for seg_id, seg, _ in segments:
+        seg_fits = np.vstack(fits[seg_id])
+        with np.errstate(invalid="ignore"):
+            ci_low, ci_high = np.nanquantile(seg_fits, [alpha, 1 - alpha], axis=0)
+        bands.append(pd.DataFrame({"frame": np.unique(seg["center_frame"].to_numpy(dtype=np.float64)),
+                                   "ci_low": ci_low, "ci_high": ci_high}))
+
+    # frames in two segments: first segment, as the curve itself (drop_duplicates keep="first")
+    df_bands = pd.concat(bands).drop_duplicates(subset="frame", keep="first")
+    return df_lowess.drop(columns=["ci_low", "ci_high"], errors="ignore").merge(df_bands, on="frame", how="left")
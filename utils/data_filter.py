@@ -4,9 +4,13 @@ import numpy as np
 import pandas as pd
 import logging
 
+from utils import track_kernels
+from utils.profiling import profiled
+
 # FILTER AND SMOOTHING DATA
 
 # Step 1 - Remove clear OUTLIERS and replace zeros with NANS
+@profiled("filter_1_range")
 def filter_tracks_range(
     df: pd.DataFrame,
     vel_range: tuple,
@@ -30,12 +34,16 @@ def filter_tracks_range(
 
 
 # Step 2 - Rolling MEDIAN Filter to remove spikes/artifacts in DATA
+@profiled("filter_2_rolling_median")
 def rolling_median_filter(
     df: pd.DataFrame,
     min_window: int,
     max_window: int,
 ) -> pd.DataFrame:
 
+    if track_kernels.kernels_enabled():
+        return _rolling_median_filter_kernels(df, min_window, max_window)
+
     # Store filtered series per track, keeping original indices
     filtered_velocity: list[pd.Series] = []
     filtered_grainsize: list[pd.Series] = []
@@ -66,12 +74,41 @@ def rolling_median_filter(
     return df
 
 
+def _rolling_median_filter_kernels(df: pd.DataFrame, min_window: int, max_window: int) -> pd.DataFrame:
+    # tracks made contiguous with a stable sort -> same row order within a track as the groupby above
+    order = track_kernels.sort_order(df["track"].to_numpy())
+    rows = np.arange(len(df)) if order is None else order
+    offsets = track_kernels.track_offsets(df["track"].to_numpy()[rows])
+
+    for column in ["velocity", "grainsize"]:
+        filtered = np.empty(len(df))
+        filtered[rows] = track_kernels.rolling_median(
+            df[column].to_numpy()[rows], offsets, min_window, max_window, min_periods=3
+        )
+        df[f"{column}_median_filtered"] = filtered
+
+    return df
+
+
 # Step 3 - FILTER out TrackIDS that have a small Y-AXIS movement
+@profiled("filter_3_y_movement")
 def filter_tracks_by_movement(df: pd.DataFrame, yaxis_min_length: float,
                               track_column: str = 'track',
                               value_column: str = 'bb_center_lidar_y'
 ) -> pd.DataFrame:
 
+    if track_kernels.kernels_enabled():
+        track = df[track_column].to_numpy()
+        order = track_kernels.sort_order(track, df["frame"].to_numpy())
+        if order is not None:
+            track = track[order]
+        offsets = track_kernels.track_offsets(track)
+        y = df[value_column].to_numpy()
+        moving = track_kernels.y_movement_mask(y if order is None else y[order], offsets, yaxis_min_length)
+        moving_tracks = track[offsets[:-1]][moving]
+        return _log_movement_filter(df, df[df[track_column].isin(moving_tracks)], track_column,
+                                    len(moving_tracks), yaxis_min_length)
+
     moving_tracks = []
 
     for track_id, track_df in df.groupby(track_column):
@@ -100,9 +137,13 @@ def filter_tracks_by_movement(df: pd.DataFrame, yaxis_min_length: float,
 
     filtered_df = df[df[track_column].isin(moving_tracks)]
 
+    return _log_movement_filter(df, filtered_df, track_column, len(moving_tracks), yaxis_min_length)
+
+
+def _log_movement_filter(df: pd.DataFrame, filtered_df: pd.DataFrame, track_column: str,
+                         kept_tracks: int, yaxis_min_length: float) -> pd.DataFrame:
     # Stats
     total_tracks = df[track_column].nunique()
-    kept_tracks = len(moving_tracks)
     removed_tracks = total_tracks - kept_tracks
 
     logging.info(' --- 1. Filter Step - Y-Axis Movement ---\n'
@@ -114,42 +155,80 @@ def filter_tracks_by_movement(df: pd.DataFrame, yaxis_min_length: float,
     return filtered_df
 
 # Step 4 - Filter out tracks that jump
+def track_jump_masks(
+        track: np.ndarray,
+        xyz: np.ndarray,
+        jump_threshold: float,
+        return_max_jump: bool = False,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    """
+    Jump kernel on arrays sorted by (track, frame): 3D step lengths per track, reduced to one state per
+    track over the track offsets (utils/track_kernels.py).
+    Returns track ids, track offsets, good/bad track masks and the max jump per track (only computed
+    with return_max_jump=True, otherwise None and the compiled kernel stops at the first jump of a track).
+    Tracks without any valid step (single detection, NaN coordinates) are neither good nor bad.
+    """
+    offsets = track_kernels.track_offsets(track)
+
+    max_jump = None
+    if return_max_jump:
+        max_jump = track_kernels.max_jump(xyz, offsets)
+        good = max_jump <= jump_threshold
+        bad = max_jump > jump_threshold
+    else:
+        state = track_kernels.jump_state(xyz, offsets, jump_threshold)
+        good = state == 0
+        bad = state == 1
+
+    return track[offsets[:-1]], offsets, good, bad, max_jump
+
+
+@profiled("filter_4_jump")
 def filter_tracks_that_jump(
         df: pd.DataFrame,
         jump_threshold: float,
-) -> tuple[pd.DataFrame,pd.DataFrame]:
-
-    # --- Ensure sorted for correct diff ---
-    df = df.sort_values(['track', 'frame'])
-
-    # --- Compute per-frame displacement ---
-    dx = df.groupby("track")["bb_center_lidar_x"].diff()
-    dy = df.groupby("track")["bb_center_lidar_y"].diff()
-    dz = df.groupby("track")["bb_center_lidar_z"].diff()
-
-    # --- 3D Euclidean distance ---
-    df["jump_dist"] = np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-
-    # --- Identify which tracks have ANY bad jump ---
-    track_max_jump = df.groupby('track')["jump_dist"].max()
-
-    good_tracks = track_max_jump[track_max_jump <= jump_threshold].index
-    bad_tracks  = track_max_jump[track_max_jump > jump_threshold].index
+        return_max_jump: bool = False,
+):
+    """
+    Split df into tracks without (df_good) and with (df_bad) a step above jump_threshold,
+    both sorted by track and frame. return_max_jump=True additionally returns the max jump
+    per track (Series indexed by track) for diagnostics.
+    """
+    # --- Ensure sorted for correct steps (only sort when needed) ---
+    order = track_kernels.sort_order(df["track"].to_numpy(), df["frame"].to_numpy())
+    if order is not None:
+        df = df.iloc[order]
+
+    if len(df) == 0:
+        empty = df.iloc[0:0]
+        result = (empty, empty.copy())
+        return result + (pd.Series(dtype=float, name="max_jump"),) if return_max_jump else result
+
+    xyz = df[["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]].to_numpy(dtype=np.float64)
+    track_ids, offsets, good, bad, max_jump = track_jump_masks(
+        df["track"].to_numpy(), xyz, jump_threshold, return_max_jump=return_max_jump
+    )
 
-    df_good = df[df["track"].isin(good_tracks)].copy()
-    df_bad  = df[df["track"].isin(bad_tracks)].copy()
+    # --- Track masks -> row masks, one selection per output ---
+    lengths = np.diff(offsets)
+    df_good = df[np.repeat(good, lengths)]
+    df_bad = df[np.repeat(bad, lengths)]
 
     # --- Print summary ---
     logging.info(" --- Filter Step 2 - Jump Filter\n"
                  f"Threshold: {jump_threshold}\n"
-                 f"Total received: {df['track'].nunique()}\n"
-                 f"Good tracks: {len(good_tracks)}\n"
-                 f"Bad tracks : {len(bad_tracks)}\n"
+                 f"Total received: {len(track_ids)}\n"
+                 f"Good tracks: {int(good.sum())}\n"
+                 f"Bad tracks : {int(bad.sum())}\n"
                  )
+
+    if return_max_jump:
+        return df_good, df_bad, pd.Series(max_jump, index=track_ids, name="max_jump")
     return df_good, df_bad
 
 
 # Step 5 - Filter out track that move very slow
+@profiled("filter_5_slow_tracks")
 def filter_tracks_by_stats(
     df: pd.DataFrame,
     min_median_track_vel: float,
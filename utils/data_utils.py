@@ -1,15 +1,21 @@
 # data_utils.py
 
+import io
+
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from statsmodels.nonparametric.smoothers_lowess import lowess
 from typing import Tuple
 import logging
 from datetime import datetime
 import sys
 import inspect
 
+from utils import track_kernels
+from utils.quantile_sketch import sketch_percentile_bands
+from utils.profiling import profiled
+
+
 def log_config(config_module):
     logging.info("----- CONFIGURATION START -----")
 
@@ -49,12 +55,13 @@ def setup_logging(config, log_name: str = "TEST", save_conf:bool = True) -> None
 
 
 
-def load_and_merge_event_data(event: str) -> pd.DataFrame:
+@profiled()
+def load_and_merge_event_data(event: str, base_dir="input_data") -> pd.DataFrame:
     """
     Load raw stats and time column for a given event, merge them, and return the dataframe.
     """
 
-    event_dir = Path("input_data") / event
+    event_dir = Path(base_dir) / event
 
     # Read files
     df_raw = pd.read_csv(event_dir / f"all_stats_{event}.txt")
@@ -68,6 +75,49 @@ def load_and_merge_event_data(event: str) -> pd.DataFrame:
 
     return df_merged
 
+@profiled()
+def load_new_event_rows(event: str, offset: int, first_row: int = 0, up_to_frame: int | None = None,
+                        complete: bool = False, base_dir="input_data") -> tuple[pd.DataFrame, int]:
+    """
+    Rows of all_stats_<event>.txt from byte offset on (0: first row after the header), merged with the time column,
+    and the byte offset after the returned rows. The file is written in frame order while the event is processed:
+    a half-written last line is not read and the rows of the newest frame are held back (more may follow), unless
+    complete=True (end of the event). With up_to_frame only frames up to it are returned. The index continues the
+    row numbers of the file (first_row: rows returned before), like load_and_merge_event_data.
+    """
+    event_dir = Path(base_dir) / event
+
+    with open(event_dir / f"all_stats_{event}.txt", "rb") as f:
+        header = f.readline()
+        offset = max(offset, len(header))
+        f.seek(offset)
+        chunk = f.read()
+    if not complete:
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+
+    # end of every line in the chunk, one row per line (blank lines kept until the cut is known)
+    line_ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n")) + 1
+    if not chunk.endswith(b"\n"):
+        line_ends = np.append(line_ends, len(chunk))
+    df_new = pd.read_csv(io.BytesIO(header + chunk), skip_blank_lines=False)
+
+    frames = df_new["frame"].to_numpy(dtype=np.float64)
+    held_back = frames > up_to_frame if up_to_frame is not None else np.zeros(len(frames), dtype=bool)
+    if not complete and len(frames):
+        held_back |= frames == np.nanmax(frames)
+    n_rows = int(np.argmax(held_back)) if held_back.any() else len(df_new)
+
+    offset += int(line_ends[n_rows - 1]) if n_rows else 0
+    df_new = df_new.iloc[:n_rows].dropna(how="all")
+    df_new.index = pd.RangeIndex(first_row, first_row + len(df_new))
+
+    time_column = pd.read_csv(event_dir / f"time_column_{event}.txt")
+    df_merged = df_new.merge(time_column, left_on="frame", right_on="frame_img", how="left")
+    df_merged.index = df_new.index
+
+    return df_merged.drop(columns="frame_img"), offset
+
+
 def extract_frame_time_table(
     df: pd.DataFrame,
     frame_col: str = "frame",
@@ -84,17 +134,51 @@ def extract_frame_time_table(
     return df_time
 
 
+def count_tracks_per_frame(df_raw: pd.DataFrame, df_clean: pd.DataFrame) -> pd.DataFrame:
+    """
+    Number of tracked (df_raw) and filtered (df_clean) boulders per frame, one row per frame of df_raw
+    (0 filtered where no track is left), like the detection-count plots.
+    """
+    tracked = df_raw.groupby("frame")["track"].nunique().rename("tracked")
+    filtered = df_clean.groupby("frame")["track"].nunique().rename("filtered")
+    df_counts = pd.concat([tracked, filtered], axis=1).fillna(0).astype(np.int64).sort_index()
+    return df_counts.rename_axis("frame").reset_index()
+
+
+def calculation_window(config) -> tuple[int, int]:
+    """
+    Frame range of a windowed calculation: START_FRAME - END_FRAME plus WINDOW_MARGIN_FRAMES on both sides.
+    """
+    return config.START_FRAME - config.WINDOW_MARGIN_FRAMES, config.END_FRAME + config.WINDOW_MARGIN_FRAMES
+
+
+@profiled()
+def select_tracks_in_window(df: pd.DataFrame, start_frame: int, end_frame: int) -> pd.DataFrame:
+    """
+    All detections of the tracks that have at least one detection between start_frame and end_frame.
+    Tracks are kept complete, so their per-track statistics equal those of the whole-event run.
+    """
+    tracks = df.loc[df["frame"].between(start_frame, end_frame), "track"].unique()
+    return df[df["track"].isin(tracks)]
+
+
+@profiled()
 def compute_mean_median_per_frame(
     df_clean: pd.DataFrame,
+    config,
     columns: list = None,
     ) -> pd.DataFrame:
     """
-    Reduce dataframe to essential columns and compute per-frame statistics.
+    Reduce dataframe to essential columns and compute per-frame statistics (backend: config.BACKEND).
     """
 
     if columns is None:
         columns = ['frame', 'track', 'velocity_median_filtered', 'grainsize_median_filtered', 'time']
 
+    if config.BACKEND == "polars":
+        from utils.polars_backend import per_frame_stats
+        return per_frame_stats(df_clean, columns)
+
     # Reduce size by keeping only essential columns
     df = df_clean[columns].copy()
 
@@ -106,6 +190,7 @@ def compute_mean_median_per_frame(
 
     return df
 
+@profiled()
 def prepare_df_for_plot(
     df: pd.DataFrame,
     window_size: int = 9,
@@ -216,6 +301,7 @@ def load_piv_data(event: str) -> pd.DataFrame:
     return df_piv
 
 
+@profiled()
 def merge_piv_and_tracking(df_piv: pd.DataFrame, df_mova: pd.DataFrame) -> pd.DataFrame:
     """
     Merge PIV and Tracking data on a common time axis by interpolation.
@@ -269,53 +355,140 @@ def merge_piv_and_tracking(df_piv: pd.DataFrame, df_mova: pd.DataFrame) -> pd.Da
     return df_merged
 
 
-def compute_track_velocities(df_filtered: pd.DataFrame, config,
-) -> tuple[pd.DataFrame, pd.DataFrame]:
+PERCENTILE_COLUMNS = {0.05: "p5", 0.25: "p25", 0.5: "p50", 0.75: "p75", 0.95: "p95"}
 
-    # 1) Reduce dataframe
-    columns = ["frame", "track", "velocity_median_filtered", "grainsize_median_filtered", "time"]
-    df = df_filtered[columns].copy()
 
-    # Compute one representative frame and summary statistics per track
-    # 2) Per-track statistics
-    track_velocities = (
-        df.groupby("track")
-        .agg(
-            mean_track_velocity=("velocity_median_filtered", "mean"),
-            median_track_velocity=("velocity_median_filtered", "median")
+def compute_percentile_bands(seg: pd.DataFrame, value_col: str, config) -> pd.DataFrame:
+    """
+    Percentile bands (p5 - p95) of a per-track statistic over the center frames of one segment.
+
+    config.PERCENTILE_METHOD:
+    - "rolling_mean": exact percentiles per center frame, smoothed with a centred rolling mean
+    - "sketch": percentiles of all tracks inside the centred rolling window, answered by merging
+      per-frame quantile sketches (one pass, mergeable across chunks / processes)
+    """
+    window = config.PERCENTILE_WINDOW
+
+    if config.PERCENTILE_METHOD == "sketch":
+        return sketch_percentile_bands(
+            seg, "center_frame", value_col, PERCENTILE_COLUMNS,
+            window=window, compression=config.SKETCH_COMPRESSION,
         )
+
+    df_percentiles = (
+        seg.groupby("center_frame")[value_col]
+        .quantile(list(PERCENTILE_COLUMNS))
+        .unstack()
+        .rename(columns=PERCENTILE_COLUMNS)
+        .reset_index()
+        .rename(columns={"center_frame": "frame"})
+    )
+
+    df_percentiles_smooth = (
+        df_percentiles
+        .set_index("frame")
+        .rolling(window=window, center=True, min_periods=1)
+        .mean()
+        .rename_axis("frame")
+        .reset_index()
     )
 
-    # 3) Center frame per track
+    return df_percentiles_smooth
+
+
+def compute_center_frames(df: pd.DataFrame) -> pd.Series:
+    """
+    Frame of the center detection (position size // 2 in row order) of every track, indexed by track.
+    """
+    if track_kernels.kernels_enabled():
+        track = df["track"].to_numpy()
+        frame = df["frame"].to_numpy()
+        order = track_kernels.sort_order(track)         # stable: row order within a track is kept
+        if order is not None:
+            track, frame = track[order], frame[order]
+        center = track_kernels.center_index(track_kernels.track_offsets(track))
+        return pd.Series(frame[center], index=pd.Index(track[center], name="track"), name="center_frame")
+
     idx = df.groupby("track").cumcount()
     sizes = df.groupby("track")["frame"].transform("size")
     center_mask = idx == (sizes // 2)
 
-    center_frame = (
+    return (
         df.loc[center_mask, ["track", "frame"]]
           .set_index("track")["frame"]
           .rename("center_frame")
     )
 
 
+def assign_segments(df_per_track: pd.DataFrame, gap_threshold: float) -> pd.DataFrame:
+    """
+    Split tracks ordered by center frame into LOWESS segments: a new segment starts after a center frame gap
+    above gap_threshold (columns frame_diff and segment).
+    """
+    df_per_track["frame_diff"] = df_per_track["center_frame"].diff()
+    # Counts True = 1, as soon as threshold reached a new segment starts
+    df_per_track["segment"] = (df_per_track["frame_diff"] > gap_threshold).cumsum()
+    return df_per_track
+
+
+def lowess_segment(seg: pd.DataFrame, value_col: str, out_col: str, frame_window: int,
+                   iterations: int) -> pd.DataFrame:
+    """
+    LOWESS of a per-track statistic over the center frames of one segment, smoothing span frame_window
+    center frames. Returns frame and out_col, sorted by frame.
+    """
+    from statsmodels.nonparametric.smoothers_lowess import lowess   # heavy import, only needed here
+
+    n_frames_segment = seg["center_frame"].nunique()
+    frac = min(1.0, frame_window / n_frames_segment)
+
+    fitted = lowess(
+        endog=seg[value_col],
+        exog=seg["center_frame"],
+        frac=frac,
+        it=iterations,
+        return_sorted=True
+    )
+    return pd.DataFrame(fitted, columns=["frame", out_col])
+
+
+@profiled()
+def compute_track_velocities(df_filtered: pd.DataFrame, config,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    # 1) Reduce dataframe
+    columns = ["frame", "track", "velocity_median_filtered", "grainsize_median_filtered", "time"]
+    df = df_filtered[columns].copy()
+
+    # Compute one representative frame and summary statistics per track
+    if config.BACKEND == "polars":
+        from utils.polars_backend import track_velocity_stats
+        track_velocities = track_velocity_stats(df)
+    else:
+        # 2) Per-track statistics
+        track_velocities = (
+            df.groupby("track")
+            .agg(
+                mean_track_velocity=("velocity_median_filtered", "mean"),
+                median_track_velocity=("velocity_median_filtered", "median")
+            )
+        )
+
+        # 3) Center frame per track
+        track_velocities = track_velocities.join(compute_center_frames(df))
+
     # 4) Combine - trackID with center frame + all stats
     # Take all per-track statistics, attach the representative frame of each track,
     # turn the index into a column, and order tracks in time
     df_per_track_velocities = (
         track_velocities
-        .join(center_frame)
         .reset_index()
         .sort_values("center_frame")
         .reset_index(drop=True)
     )
 
     # 5) SEGMENTATION
-    df_per_track_velocities["frame_diff"] = (
-        df_per_track_velocities["center_frame"].diff()
-    )
-    df_per_track_velocities["segment"] = (
-            df_per_track_velocities["frame_diff"] > config.LOWESS_GAP_THRESHOLD
-    ).cumsum() # Counts True = 1, as soon as threshold reached a new segment starts
+    df_per_track_velocities = assign_segments(df_per_track_velocities, config.LOWESS_GAP_THRESHOLD)
 
     # 6) LOWESS per segment
     lowess_results: list[pd.DataFrame] = []
@@ -325,56 +498,17 @@ def compute_track_velocities(df_filtered: pd.DataFrame, config,
         if len(seg) < config.LOWESS_SEGMENT_LENGTH:
             continue  # too short for smoothing
 
-        n_frames_segment = seg["center_frame"].nunique()
-        frac = min(1.0, config.LOWESS_FRAME_WINDOW_SIZE / n_frames_segment)
-
         # Mean smoothing
-        lowess_mean = lowess(
-            endog=seg["mean_track_velocity"],
-            exog=seg["center_frame"],
-            frac=frac,
-            it=config.LOWESS_ITERATIONS,
-            return_sorted=True
-        )
-
-        df_lowess_mean = pd.DataFrame(
-            lowess_mean,
-            columns=["frame", "lowess_mean_track_velocity"]
-        )
+        df_lowess_mean = lowess_segment(seg, "mean_track_velocity", "lowess_mean_track_velocity",
+                                        config.LOWESS_FRAME_WINDOW_SIZE, config.LOWESS_ITERATIONS)
 
         # Median smoothing
-        lowess_median = lowess(
-            endog=seg["median_track_velocity"],
-            exog=seg["center_frame"],
-            frac=frac,
-            it=config.LOWESS_ITERATIONS,
-            return_sorted=True
-        )
-
-        df_lowess_median = pd.DataFrame(
-            lowess_median,
-            columns=["frame", "lowess_median_track_velocity"]
-        )
+        df_lowess_median = lowess_segment(seg, "median_track_velocity", "lowess_median_track_velocity",
+                                          config.LOWESS_FRAME_WINDOW_SIZE, config.LOWESS_ITERATIONS)
 
         # ---- Percentiles per frame
-        # compute p5, p50, p95 of mean_track_velocity per frame
-        df_percentiles = (
-            seg.groupby("center_frame")["mean_track_velocity"]
-            .quantile([0.05,0.25,0.5,0.75,0.95])
-            .unstack()
-            .rename(columns={0.05: "p5",0.25: "p25",0.5: "p50", 0.75: "p75", 0.95: "p95"})
-            .reset_index()
-            .rename(columns={"center_frame": "frame"})
-        )
-
-        df_percentiles_smooth = (
-            df_percentiles
-            .set_index("frame")
-            .rolling(window=20, center=True, min_periods=1)
-            .mean()
-            .rename_axis("frame")
-            .reset_index()
-        )
+        # compute p5 - p95 of mean_track_velocity per frame
+        df_percentiles_smooth = compute_percentile_bands(seg, "mean_track_velocity", config)
 
         df_segment = (
             df_lowess_mean
@@ -402,6 +536,7 @@ def compute_track_velocities(df_filtered: pd.DataFrame, config,
     return df_per_track_velocities, df_velocities_lowess
 
 
+@profiled()
 def compute_track_grainsize(
         df_filtered: pd.DataFrame, config
 ) -> tuple[pd.DataFrame, pd.DataFrame]:
@@ -418,70 +553,53 @@ def compute_track_grainsize(
     df = df_filtered[cols]
     df = df.sort_values(["track", "frame"])
 
-    # 1) Calculate step distance between track appearance
-    dxyz = (
-        df.groupby("track")[["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]]
-        .diff()
-    )
-    df["step_distance"] = (             # calc the vector length row wise.
-        np.linalg.norm(
-            dxyz[[
-                "bb_center_lidar_x",
-                "bb_center_lidar_y",
-                "bb_center_lidar_z"
-            ]],
-            axis=1
-        )
-    )
-
-    # 2) Calculate statistic per TRACK
-    track_stats = (
-        df.groupby("track")
-        .agg(
-            # grain size
-            mean_track_grainsize=("grainsize_median_filtered", "mean"),
-            median_track_grainsize=("grainsize_median_filtered", "median"),
-            # geometry
-            mean_track_bb_width=("bb_width", "mean"),
-            # track length (frames)
-            track_length_frames=("frame", "count"),
-            # track duration
-            track_duration=("time", lambda x: x.max() - x.min()),
-            # distance traveled
-            track_distance=("step_distance", "sum"),
+    if config.BACKEND == "polars":
+        from utils.polars_backend import track_grainsize_stats
+        track_stats = track_grainsize_stats(df)
+    else:
+        # 1) Calculate step distance between track appearance
+        xyz_cols = ["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]
+        if track_kernels.kernels_enabled():
+            offsets = track_kernels.track_offsets(df["track"].to_numpy())
+            df["step_distance"] = track_kernels.step_distance(df[xyz_cols].to_numpy(), offsets)
+        else:
+            dxyz = df.groupby("track")[xyz_cols].diff()
+            df["step_distance"] = np.linalg.norm(dxyz[xyz_cols], axis=1)     # calc the vector length row wise.
+
+        # 2) Calculate statistic per TRACK
+        track_stats = (
+            df.groupby("track")
+            .agg(
+                # grain size
+                mean_track_grainsize=("grainsize_median_filtered", "mean"),
+                median_track_grainsize=("grainsize_median_filtered", "median"),
+                # geometry
+                mean_track_bb_width=("bb_width", "mean"),
+                # track length (frames)
+                track_length_frames=("frame", "count"),
+                # track duration
+                track_duration=("time", lambda x: x.max() - x.min()),
+                # distance traveled
+                track_distance=("step_distance", "sum"),
+            )
         )
-    )
-    # Remove TrackIDS with only NANs
-    track_stats = track_stats.dropna(subset=["mean_track_grainsize", "median_track_grainsize"])
-
-    # 3) Center frame per track
-    idx = df.groupby("track").cumcount()
-    sizes = df.groupby("track")["frame"].transform("size")
-    center_mask = idx == (sizes // 2)
+        # Remove TrackIDS with only NANs
+        track_stats = track_stats.dropna(subset=["mean_track_grainsize", "median_track_grainsize"])
 
-    center_frame = (
-        df.loc[center_mask, ["track", "frame"]]
-        .set_index("track")["frame"]
-        .rename("center_frame")
-    )
+        # 3) Center frame per track
+        track_stats = track_stats.join(compute_center_frames(df))
 
     # 4) Combine - trackID with center frame + all stats
     # Take all per-track statistics, attach the representative frame of each track,
     # turn the index into a column, and order tracks in time
     df_per_track_grainsize = (
         track_stats
-        .join(center_frame)
         .reset_index()
         .sort_values("center_frame")
     )
 
     # 5) SEGMENTATION
-    df_per_track_grainsize["frame_diff"] = (
-        df_per_track_grainsize["center_frame"].diff()
-    )
-    df_per_track_grainsize["segment"] = (
-            df_per_track_grainsize["frame_diff"] > config.LOWESS_GAP_THRESHOLD
-    ).cumsum()  # Counts True = 1, as soon as threshold reached a new segment starts
+    df_per_track_grainsize = assign_segments(df_per_track_grainsize, config.LOWESS_GAP_THRESHOLD)
 
     # 6) LOWESS per segment
     lowess_results: list[pd.DataFrame] = []
@@ -490,39 +608,10 @@ def compute_track_grainsize(
         if len(seg) < config.LOWESS_SEGMENT_LENGTH:
             continue  # too short for smoothing
 
-        n_frames_segment = seg["center_frame"].nunique()
-        frac = min(1.0, config.LOWESS_FRAME_WINDOW_SIZE / n_frames_segment)
-
-        grainsize_lowess_mean = lowess(
-            endog=seg["mean_track_grainsize"],
-            exog=seg["center_frame"],
-            frac=frac,
-            it=config.LOWESS_ITERATIONS,
-            return_sorted=True
-        )
-
-        df_grainsize_lowess = pd.DataFrame(
-            grainsize_lowess_mean,
-            columns=["frame", "lowess_mean_track_grainsize"]
-        )
+        df_grainsize_lowess = lowess_segment(seg, "mean_track_grainsize", "lowess_mean_track_grainsize",
+                                             config.LOWESS_FRAME_WINDOW_SIZE, config.LOWESS_ITERATIONS)
 
-        df_percentiles_gs = (
-            seg.groupby("center_frame")["mean_track_grainsize"]
-            .quantile([0.05, 0.25, 0.5, 0.75, 0.95])
-            .unstack()
-            .rename(columns={0.05: "p5", 0.25: "p25", 0.5: "p50", 0.75: "p75", 0.95: "p95"})
-            .reset_index()
-            .rename(columns={"center_frame": "frame"})
-        )
-
-        df_percentiles_smooth = (
-            df_percentiles_gs
-            .set_index("frame")
-            .rolling(window=20, center=True, min_periods=1)
-            .mean()
-            .rename_axis("frame")
-            .reset_index()
-        )
+        df_percentiles_smooth = compute_percentile_bands(seg, "mean_track_grainsize", config)
 
         df_segment = (
             df_grainsize_lowess
@@ -0,0 +1,39 @@
+# decimation.py
+
+import numpy as np
+
+
+# MIN / MAX DECIMATION
+# Reduces a series to a few points per pixel column (the first row, and the minimum and maximum of every value
+# array inside the column), in their original order. Peaks and troughs stay visible at any zoom level, and the
+# number of points sent to a plot depends on its pixel width, not on the number of frames.
+
+def minmax_decimate(x: np.ndarray, ys: list, start: float, end: float, width: int) -> np.ndarray:
+    """
+    Row positions to keep from the series x (sorted ascending) with the value arrays ys, for the
+    range start - end drawn width pixels wide. Missing values only survive as the first row of a column
+    (a gap in the line).
+    """
+    lo = int(np.searchsorted(x, start, side="left"))
+    hi = int(np.searchsorted(x, end, side="right"))
+    if hi - lo <= 2 * width or end <= start:
+        return np.arange(lo, hi)
+
+    x_window = x[lo:hi]
+    bins = np.minimum(((x_window - start) / (end - start) * width).astype(np.int64), width - 1)
+
+    keep = [np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])]      # first row of each column
+    for y in ys:
+        y = np.asarray(y[lo:hi], dtype=float)
+        valid = ~np.isnan(y)
+        if not valid.any():
+            continue
+        rows = np.flatnonzero(valid)
+        # sorted by column, then value: first row of a column = minimum, last row = maximum
+        order = rows[np.lexsort((y[rows], bins[rows]))]
+        col = bins[order]
+        first = np.r_[True, col[1:] != col[:-1]]
+        last = np.r_[col[1:] != col[:-1], True]
+        keep += [order[first], order[last]]
+
+    return lo + np.unique(np.concatenate(keep))
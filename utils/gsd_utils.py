@@ -5,10 +5,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
 
-from sympy.printing.pretty.pretty_symbology import line_width
-
 import config
-from utils.plot_utils import style_main_axis
+from utils.plot_utils import style_main_axis, save_figure
+
+from utils.profiling import profiled
 
 
 def get_grainsizes_in_range(df, start, end):
@@ -31,7 +31,138 @@ def get_global_x_limits(gsd_curves):
     return min_x, max_x
 
 
+# --- GSD summary store ------------------------------------------------------------------------------------------
+# Grain sizes are binned on a fixed grid (config.GSD_BIN_WIDTH) and only the non-empty bins are stored.
+# Histograms on the same grid merge by summing counts, so multi-event / season-wide GSD curves
+# can be built from the summaries without re-reading the per-track tables.
+SUMMARY_COLUMNS = ["event", "scope", "surge_id", "components", "start_frame", "end_frame", "bin", "count"]
+
+
+def _histogram_rows(grainsizes, bin_width, **labels):
+    bins, counts = np.unique(
+        np.floor(np.asarray(grainsizes) / bin_width).astype(np.int64),
+        return_counts=True
+    )
+    df = pd.DataFrame({"bin": bins, "count": counts})
+    for name, value in labels.items():
+        df[name] = value
+    return df
+
+
+def build_gsd_summary(
+    df_per_track_grainsize: pd.DataFrame,
+    event: str,
+    df_surges: pd.DataFrame | None = None,
+    bin_width: float = config.GSD_BIN_WIDTH,
+) -> pd.DataFrame:
+    """
+    Build the binned GSD summary of one event: one histogram for the complete event (scope 'event')
+    and one per surge of the surge classification (scope 'surge').
+    """
+    parts = []
+
+    grainsizes = df_per_track_grainsize["mean_track_grainsize"].dropna()
+    if len(grainsizes) > 0:
+        parts.append(_histogram_rows(
+            grainsizes, bin_width,
+            event=event, scope="event", surge_id=-1, components=-1,
+            start_frame=df_per_track_grainsize["center_frame"].min(),
+            end_frame=df_per_track_grainsize["center_frame"].max(),
+        ))
+
+    if df_surges is not None:
+        for surge_id, row in enumerate(df_surges.itertuples(index=False)):
+            grainsizes = get_grainsizes_in_range(df_per_track_grainsize, row.frame_start, row.frame_end)
+            if len(grainsizes) == 0:
+                continue
+            parts.append(_histogram_rows(
+                grainsizes, bin_width,
+                event=event, scope="surge", surge_id=surge_id, components=row.components,
+                start_frame=row.frame_start, end_frame=row.frame_end,
+            ))
+
+    if not parts:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS + ["bin_width"])
+
+    df_summary = pd.concat(parts, ignore_index=True)[SUMMARY_COLUMNS]
+    df_summary["bin_width"] = bin_width
+
+    return df_summary
+
+
+def gsd_summary_path(event, base_output_dir=Path.cwd() / "output"):
+    return Path(base_output_dir) / event / f"gsd_summary_{event}.parquet"
+
+
+def save_gsd_summary(df_summary, event, base_output_dir=Path.cwd() / "output"):
+    out_path = gsd_summary_path(event, base_output_dir)
+    df_summary.to_parquet(out_path, index=False)
+    return out_path
+
+
+def load_gsd_summary(
+    event,
+    base_output_dir=Path.cwd() / "output",
+    input_dir="input_data",
+    bin_width: float = config.GSD_BIN_WIDTH,
+) -> pd.DataFrame:
+    """
+    Load the cached GSD summary of an event. The summary is (re)built from the per-track grain size table
+    if it is missing, older than the per-track table or binned with a different bin width.
+    """
+    summary_path = gsd_summary_path(event, base_output_dir)
+    track_path = Path(base_output_dir) / event / f"df_per_track_grainsize_{event}.parquet"
+
+    if summary_path.exists() and (
+        not track_path.exists() or summary_path.stat().st_mtime >= track_path.stat().st_mtime
+    ):
+        df_summary = pd.read_parquet(summary_path)
+        if df_summary.empty or np.isclose(df_summary["bin_width"].iloc[0], bin_width):
+            return df_summary
+
+    df = pd.read_parquet(track_path, columns=["center_frame", "mean_track_grainsize"])
+
+    surge_file = Path(input_dir) / event / f"surge_classification_{event}.csv"
+    df_surges = pd.read_csv(surge_file, sep=";") if surge_file.exists() else None
+
+    df_summary = build_gsd_summary(df, event, df_surges, bin_width=bin_width)
+    save_gsd_summary(df_summary, event, base_output_dir)
+
+    return df_summary
+
+
+def merge_gsd_summaries(df_summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    Merge binned histograms (e.g. several events or all surges of one type) into a single histogram.
+    """
+    return (
+        df_summary.groupby("bin", as_index=False)["count"].sum()
+        .sort_values("bin")
+        .reset_index(drop=True)
+    )
+
+
+def gsd_curve_from_histogram(df_hist: pd.DataFrame, bin_width: float = config.GSD_BIN_WIDTH):
+    counts = df_hist["count"].to_numpy()
+    x = (df_hist["bin"].to_numpy() + 1) * bin_width     # upper bin edge
+    cdf = np.cumsum(counts) / counts.sum()
+    return x, cdf
+
+
+def gsd_percentile_from_histogram(df_hist: pd.DataFrame, q: float, bin_width: float = config.GSD_BIN_WIDTH):
+    """
+    Percentile (q in 0-100) of a binned GSD, linearly interpolated within the bins.
+    """
+    counts = df_hist["count"].to_numpy()
+    lower = df_hist["bin"].to_numpy() * bin_width
+    cum = np.concatenate([[0], np.cumsum(counts)]) / counts.sum()
+
+    edges_x = np.concatenate([lower[:1], lower + bin_width])
+    return float(np.interp(q / 100, cum, edges_x))
+
+
 # --- GSD per surge and surge type
+@profiled()
 def plot_gsd_per_surge(
     df_per_track_grainsize,
     df_surges,
@@ -130,13 +261,12 @@ def plot_gsd_per_surge(
     fig_name = f'GSD_per_surge_type_{config.EVENT}'
     output_dir_for_plots = Path(config.OUTPUT_DIR)
     output_path = Path(output_dir_for_plots) / fig_name
-    fig.tight_layout()
-    fig.savefig(output_path, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+    save_figure(fig, output_path)
 
     return df_stats
 
 # --- GSD complete Event
+@profiled()
 def plot_gsd_single_event(
     df_per_track_grainsize,
     event_name=None,
@@ -181,34 +311,28 @@ def plot_gsd_single_event(
     fig_name = f'GSD_complete_event_{config.EVENT}'
     output_dir_for_plots = Path(config.OUTPUT_DIR)
     output_path = Path(output_dir_for_plots) / fig_name
-    fig.tight_layout()
-    fig.savefig(output_path, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+    save_figure(fig, output_path)
 
 
+@profiled()
 def plot_gsd_all_events(
     events,
     base_output_dir=Path.cwd() / "output",
+    add_all_events_curve: bool = False,
 ):
     gsd_curves = []
+    event_summaries = []
 
     for event in events:
-        output_dir = base_output_dir / event
-
-        df = pd.read_parquet(
-            output_dir / f"df_per_track_grainsize_{event}.parquet"
-        )
-
-        grainsizes = get_grainsizes_in_range(
-            df,
-            df["center_frame"].min(),
-            df["center_frame"].max(),
-        )
+        # cached binned GSD per event (rebuilt from df_per_track_grainsize only if outdated)
+        df_summary = load_gsd_summary(event, base_output_dir)
+        df_event = df_summary[df_summary["scope"] == "event"]
 
-        if len(grainsizes) == 0:
+        if df_event.empty:
             continue
 
-        x, y = compute_gsd_curve(grainsizes)
+        x, y = gsd_curve_from_histogram(merge_gsd_summaries(df_event), df_event["bin_width"].iloc[0])
+        event_summaries.append(df_event)
 
         gsd_curves.append({
             "event": event,
@@ -216,6 +340,15 @@ def plot_gsd_all_events(
             "y": y
         })
 
+    if add_all_events_curve and event_summaries:
+        df_all = pd.concat(event_summaries, ignore_index=True)
+        x, y = gsd_curve_from_histogram(merge_gsd_summaries(df_all), df_all["bin_width"].iloc[0])
+        gsd_curves.append({
+            "event": "All events",
+            "x": x,
+            "y": y
+        })
+
     fig, ax = plt.subplots(figsize=(8, 8))
 
     for curve in gsd_curves:
@@ -249,13 +382,12 @@ def plot_gsd_all_events(
     fig_name = f'GSD_all_events_{config.EVENT}'
     output_dir_for_plots = Path(config.OUTPUT_DIR)
     output_path = Path(output_dir_for_plots) / fig_name
-    fig.tight_layout()
-    fig.savefig(output_path, dpi=300, bbox_inches="tight")
-    plt.close(fig)
+    save_figure(fig, output_path)
 
 
 
 # Compare Debris flow surges
+@profiled()
 def plot_surge_types_comparison(df_gsd_stats, surge_labels, surge_colors) -> None:
 
     df = df_gsd_stats.copy()
@@ -337,6 +469,4 @@ def plot_surge_types_comparison(df_gsd_stats, surge_labels, surge_colors) -> Non
     fig_name = f'GSD_surge_type_compare_{config.EVENT}'
     output_dir_for_plots = Path(config.OUTPUT_DIR)
     output_path = Path(output_dir_for_plots) / fig_name
-    fig.tight_layout()
-    fig.savefig(output_path, dpi=300, bbox_inches="tight")
-    plt.close(fig)
\ No newline at end of file
+    save_figure(fig, output_path)
\ No newline at end of file
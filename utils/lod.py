@@ -0,0 +1,155 @@
+# lod.py
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.data_utils import count_tracks_per_frame
+from utils.product_io import read_product, write_product, product_path
+from utils.profiling import profiled
+
+
+# LEVEL-OF-DETAIL PYRAMID OF THE PER-FRAME SERIES (product df_lod_<event>)
+# Level k holds min / max / mean / count of every series in buckets of 2**k frames (bucket = frame // 2**k),
+# level 0 is the product itself. A plot or viewer showing start - end on width pixels reads the level with
+# about two buckets per pixel column (lod_level) and draws the min / max envelope of each bucket, so the
+# number of drawn points depends on the pixel width and not on the length of the window.
+
+LOD_SERIES = {
+    "mova": ["mean_velocity_per_frame", "mean_vel_ma", "median_velocity_per_frame", "median_vel_ma",
+             "mean_grainsize_per_frame", "mean_grain_ma", "median_grainsize_per_frame", "median_grain_ma"],
+    "piv_mova": ["piv_vel_smoothed"],
+    "detections": ["tracked", "filtered"],          # tracked / filtered boulders per frame
+}
+
+LOD_MIN_BUCKETS = 64            # coarsest level still has at least this many buckets
+LOD_SOURCES = ["raw", "clean", "mova", "piv_mova"]      # products the pyramid is built from
+
+
+def bucket_stats(frames: np.ndarray, values: np.ndarray, level: int) -> pd.DataFrame:
+    """
+    min / max / mean / count (missing values ignored) of values per bucket of 2**level frames.
+    frames must be sorted ascending.
+    """
+    bucket = np.floor_divide(frames, 2 ** level).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid.astype(np.int64), starts)
+    total = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+
+    return pd.DataFrame({
+        "frame": bucket[starts] * 2 ** level,
+        "min": np.fmin.reduceat(values, starts),         # fmin / fmax skip NaN, NaN only for empty buckets
+        "max": np.fmax.reduceat(values, starts),
+        "mean": mean,
+        "count": count,
+    })
+
+
+def build_pyramid(series: dict) -> pd.DataFrame:
+    """
+    Pyramid of {name: (frames, values)}: one row per series, level (1, 2, 4, ... frames per bucket) and bucket.
+    """
+    parts = []
+    for name, (frames, values) in series.items():
+        order = np.argsort(frames, kind="stable")
+        frames = np.asarray(frames, dtype=float)[order]
+        values = np.asarray(values, dtype=float)[order]
+        if len(frames) == 0:
+            continue
+
+        span = frames[-1] - frames[0] + 1
+        level = 1
+        while span / 2 ** level >= LOD_MIN_BUCKETS or level == 1:
+            df_level = bucket_stats(frames, values, level)
+            parts.append(df_level.assign(series=name, level=level))
+            level += 1
+
+    columns = ["series", "level", "frame", "min", "max", "mean", "count"]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(parts, ignore_index=True)[columns]
+
+
+@profiled()
+def build_lod_pyramid(event: str | None = None) -> pd.DataFrame:
+    """
+    LOD pyramid of the per-frame series of an event (whole-event products), saved as product "lod".
+    """
+    df_counts = count_tracks_per_frame(read_product("raw", columns=["frame", "track"], event=event, windowed=False),
+                                       read_product("clean", columns=["frame", "track"], event=event, windowed=False))
+    sources = {
+        "mova": read_product("mova", event=event, windowed=False),
+        "piv_mova": read_product("piv_mova", event=event, windowed=False),
+        "detections": df_counts,
+    }
+
+    series = {
+        f"{product}.{column}": (sources[product]["frame"].to_numpy(), sources[product][column].to_numpy())
+        for product, columns in LOD_SERIES.items()
+        for column in columns if column in sources[product].columns
+    }
+    df_lod = build_pyramid(series)
+    write_product(df_lod, "lod", event)
+
+    print(f"LOD pyramid of event {event or config.EVENT}: {len(series)} series, {len(df_lod)} buckets")
+    return df_lod
+
+
+def lod_level(start: float, end: float, width: int) -> int:
+    """
+    Pyramid level for the range start - end drawn width pixels wide (0: draw the product itself).
+    """
+    frames_per_pixel = (end - start) / max(width, 1)
+    return max(int(np.floor(np.log2(frames_per_pixel / 2))), 0) if frames_per_pixel > 2 else 0
+
+
+def load_lod_pyramid(event: str | None = None) -> pd.DataFrame | None:
+    """
+    LOD pyramid of an event, None if it is missing or older than one of its source products (stale pyramid:
+    the plots draw every frame, rebuild it with the "lod" stage).
+    """
+    lod_path = product_path("lod", event)
+    if not lod_path.exists():
+        return None
+
+    lod_mtime = lod_path.stat().st_mtime
+    newer = [product for product in LOD_SOURCES
+             if product_path(product, event).exists() and product_path(product, event).stat().st_mtime > lod_mtime]
+    if newer:
+        logging.warning(f"LOD pyramid of event {event or config.EVENT} is older than {', '.join(newer)}, "
+                        f"not used (rebuild with --stages lod)")
+        return None
+    return read_product("lod", event=event, windowed=False)
+
+
+def lod_envelope(df_lod: pd.DataFrame, product: str, columns: list, start: float, end: float,
+                 width: int) -> pd.DataFrame | None:
+    """
+    Envelope of product columns between start and end at the level matching width pixels: two rows per
+    bucket (the minima, then the maxima of all columns) at the bucket's first frame, so a line through the
+    rows draws the same vertical strokes as the full series. None if level 0 fits or a series is missing.
+    """
+    level = min(lod_level(start, end, width), int(df_lod["level"].max()))
+    if level == 0:
+        return None
+
+    df_level = df_lod[(df_lod["level"] == level) & df_lod["frame"].between(start - 2 ** level, end)]
+    envelope = None
+    for column in columns:
+        df_series = df_level[df_level["series"] == f"{product}.{column}"]
+        if df_series.empty:
+            return None
+        values = np.column_stack([df_series["min"].to_numpy(), df_series["max"].to_numpy()]).ravel()
+        if envelope is None:
+            envelope = pd.DataFrame({"frame": np.repeat(df_series["frame"].to_numpy(), 2)})
+        elif len(envelope) != len(values):
+            return None
+        envelope[column] = values
+
+    return envelope
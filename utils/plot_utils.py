@@ -6,11 +6,15 @@ import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from pathlib import Path
 from matplotlib.colors import Normalize
-from matplotlib.collections import LineCollection
-from scipy.interpolate import interp1d
+from matplotlib.collections import Collection, LineCollection
 import matplotlib.cm as cm
 import matplotlib.patches as mpatches
 import os
+import weakref
+from functools import lru_cache
+
+import config
+from utils.profiling import profiled
 
 # --- Helper Functions for all plots - basics ------------------------------------------------------------------
 def style_main_axis(
@@ -33,44 +37,54 @@ def style_main_axis(
     ax.tick_params(axis="both", labelsize=fontsize, pad=6, length=4, width=1)
     if add_grid:
         ax.grid(True, linestyle="-", alpha=0.4)
+    else:
+        ax.grid(False)      # template figures keep the grid of the previous plot otherwise
 
 
-def make_frame_to_mmss_formatter(df_time: pd.DataFrame | None):
-    if df_time is None or df_time.empty:
-        return lambda frame, _: ""
-
-    # Convert to sorted arrays for fast lookup
-    frames = df_time["frame"].to_numpy()
-    times = df_time["time"].to_numpy()
-
-    # Ensure frames are sorted
-    sorted_idx = np.argsort(frames)
-    frames = frames[sorted_idx]
-    times = times[sorted_idx]
-
-    def formatter(frame, _):
-        # Find nearest frame efficiently
-        idx = np.searchsorted(frames, frame)
-        if idx == 0:
-            nearest_idx = 0
-        elif idx >= len(frames):
-            nearest_idx = len(frames) - 1
-        else:
-            # Choose the closer of the two neighbors
-            if abs(frames[idx] - frame) < abs(frames[idx - 1] - frame):
-                nearest_idx = idx
-            else:
-                nearest_idx = idx - 1
-
-        seconds = times[nearest_idx]
-        if pd.isna(seconds):
-            return ""
-
-        minutes = int(seconds) // 60
-        secs = int(seconds) % 60
-        return f"{minutes:02d}:{secs:02d}"
+class FrameTimeFormatter(ticker.Formatter):
+    """
+    Tick labels MM:SS of the nearest frame in df_time ('frame', 'time' columns).
+    All ticks of an axis are mapped with one vectorized lookup (format_ticks).
+    """
 
-    return formatter
+    def __init__(self, df_time: pd.DataFrame | None):
+        self.df_time = None
+        self.frames = self.times = np.empty(0)
+        self.set_time_table(df_time)
+
+    def set_time_table(self, df_time: pd.DataFrame | None) -> None:
+        if df_time is self.df_time:
+            return
+        self.df_time = df_time
+        if df_time is None or df_time.empty:
+            self.frames = self.times = np.empty(0)
+            return
+
+        # Sorted arrays for the lookup
+        frames = df_time["frame"].to_numpy(dtype=float)
+        order = np.argsort(frames, kind="stable")
+        self.frames = frames[order]
+        self.times = df_time["time"].to_numpy(dtype=float)[order]
+
+    def format_ticks(self, values) -> list[str]:
+        values = np.asarray(values, dtype=float)
+        if len(self.frames) == 0:
+            return [""] * len(values)
+
+        # Nearest frame: the closer of the two neighbours (the left one on a tie)
+        last = len(self.frames) - 1
+        idx = np.searchsorted(self.frames, values)
+        left = np.clip(idx - 1, 0, last)
+        right = np.clip(idx, 0, last)
+        nearest = np.where(np.abs(self.frames[right] - values) < np.abs(self.frames[left] - values), right, left)
+
+        seconds = self.times[nearest]
+        valid = ~np.isnan(seconds)
+        whole = np.where(valid, seconds, 0).astype(np.int64)
+        return [f"{m:02d}:{sec:02d}" if ok else "" for m, sec, ok in zip(whole // 60, whole % 60, valid)]
+
+    def __call__(self, x, pos=None) -> str:
+        return self.format_ticks([x])[0]
 
 
 def add_time_top_axis(
@@ -79,19 +93,73 @@ def add_time_top_axis(
     x_label: str = "Time [MM:SS]",
     fontsize: int = 14,
 ):
-    ax_top = ax.twiny()
+    ax_top = _TIME_AXES.get(ax)
+    if ax_top is None:
+        ax_top = ax.twiny()
+        ax_top.xaxis.set_major_locator(ticker.AutoLocator())
+        ax_top.xaxis.set_major_formatter(FrameTimeFormatter(df_time))
+        _TIME_AXES[ax] = ax_top
+    else:
+        # template figure: top axis already exists, only the time table of the event may change
+        ax_top.xaxis.get_major_formatter().set_time_table(df_time)
+
     ax_top.set_xlim(ax.get_xlim())
     ax_top.set_xlabel(x_label, fontsize=fontsize)
-
-    formatter = make_frame_to_mmss_formatter(df_time)
-
-    ax_top.xaxis.set_major_locator(ticker.AutoLocator())
-    ax_top.xaxis.set_major_formatter(ticker.FuncFormatter(formatter))
     ax_top.tick_params(axis="x", labelsize=fontsize, pad=4, length=4, width=1)
 
     return ax_top
 
 
+# --- Figure templates -------------------------------------------------------------------------------------------
+# The frame-axis plots share one layout (config.FIG_SIZE, frame axis, MM:SS top axis). With config.REUSE_FIGURES
+# the figure of a layout is kept after saving: the next plot (other window, event or plot type) only removes the
+# data artists and draws its own, the figure, axes, top time axis and tick styling are not built again.
+_FIGURE_TEMPLATES = {}
+_TIME_AXES = weakref.WeakKeyDictionary()     # main axis -> top time axis
+
+
+def get_figure(config, layout: str = "frame_time", figsize: tuple | None = None):
+    """
+    Figure and main axis for a layout: the template figure with its data artists removed (config.REUSE_FIGURES)
+    or a new figure.
+    """
+    figsize = tuple(figsize or config.FIG_SIZE)
+    if not config.REUSE_FIGURES:
+        return plt.subplots(figsize=figsize)
+
+    key = (layout, figsize)
+    if key not in _FIGURE_TEMPLATES:
+        _FIGURE_TEMPLATES[key] = plt.subplots(figsize=figsize)
+        return _FIGURE_TEMPLATES[key]
+
+    fig, ax = _FIGURE_TEMPLATES[key]
+    clear_data_artists(ax)
+    return fig, ax
+
+
+def clear_data_artists(ax: plt.Axes) -> None:
+    """
+    Remove lines, scatters, spans, texts and legends of the previous plot and reset the data limits.
+    """
+    for artist in [*ax.lines, *ax.collections, *ax.patches, *ax.texts, *ax.images, *ax.artists]:
+        artist.remove()
+    if ax.get_legend() is not None:
+        ax.get_legend().remove()
+
+    ax.relim()
+    ax.autoscale()
+
+
+def is_template_figure(fig) -> bool:
+    return any(fig is template_fig for template_fig, _ in _FIGURE_TEMPLATES.values())
+
+
+def close_figure_templates() -> None:
+    for fig, _ in _FIGURE_TEMPLATES.values():
+        plt.close(fig)
+    _FIGURE_TEMPLATES.clear()
+
+
 def add_standard_legend(
     ax: plt.Axes,
     ax2: plt.Axes = None,   # <-- NEW
@@ -133,13 +201,68 @@ def  save_plot(fig, fig_name, output_dir, start_frame, end_frame):
     os.makedirs(output_dir_for_plots, exist_ok=True)
 
     output_path = Path(output_dir_for_plots) / fig_name
+    save_figure(fig, output_path)
+
+
+# --- Export profiles (config.EXPORT_PROFILE)
+VECTOR_FORMATS = {"pdf", "svg", "eps", "ps"}
+
+
+def export_path(output_path, profile: dict) -> Path:
+    """
+    File name of a figure in the export profile: the profile's format replaces the extension of the name.
+    """
+    output_path = Path(output_path)
+    if profile["format"] is None:
+        return output_path
+    return output_path.with_name(output_path.name.removesuffix(output_path.suffix) + "." + profile["format"])
+
+
+def rasterize_heavy_layers(fig, min_points: int) -> None:
+    # Large scatter / line collections as one embedded image, axes, text and lines stay vector
+    for ax in fig.axes:
+        for artist in ax.collections:
+            if isinstance(artist, Collection) and len(artist.get_offsets()) + len(artist.get_paths()) > min_points:
+                artist.set_rasterized(True)
+
+
+def plot_width_px(config, figsize: tuple | None = None) -> int:
+    """
+    Width in pixels of a saved figure (export profile dpi), e.g. to choose the LOD level of a series.
+    """
+    figsize = figsize or config.FIG_SIZE
+    return int(figsize[0] * config.EXPORT_PROFILES[config.EXPORT_PROFILE]["dpi"])
+
+
+def save_figure(fig, output_path, profile_name: str | None = None) -> Path:
+    """
+    Save fig with the export profile (format, dpi, bounding box) of config.EXPORT_PROFILE and close it
+    (template figures stay open). Returns the written path.
+    """
+    profile_name = profile_name or config.EXPORT_PROFILE
+    if profile_name not in config.EXPORT_PROFILES:
+        raise ValueError(f"Unknown export profile '{profile_name}', choose from {list(config.EXPORT_PROFILES)}")
+    profile = config.EXPORT_PROFILES[profile_name]
+
+    output_path = export_path(output_path, profile)
+    fmt = (profile["format"] or output_path.suffix.lstrip(".") or "png").lower()
+    if fmt in VECTOR_FORMATS:
+        rasterize_heavy_layers(fig, config.RASTERIZE_MIN_POINTS)
 
     fig.tight_layout()
-    fig.savefig(output_path, dpi=300, bbox_inches="tight")
+    fig.savefig(output_path, dpi=profile["dpi"], bbox_inches=profile["bbox_inches"])
 
-    plt.close(fig)
+    if not is_template_figure(fig):
+        plt.close(fig)
+    return output_path
 
 # --- Helper for all - surge types and classifications
+@lru_cache(maxsize=None)
+def load_surge_classification(event: str, base_dir: str = "input_data") -> pd.DataFrame:
+    event_dir = Path(base_dir) / event
+    return pd.read_csv(event_dir / f"surge_classification_{event}.csv", sep=";")
+
+
 def add_surge_background(
     ax,
     event,
@@ -157,12 +280,8 @@ def add_surge_background(
     Only surges overlapping the visible frame range are shown.
     """
 
-    # --- Load surge file ---
-    event_dir = Path(base_dir) / event
-    df_surges = pd.read_csv(
-        event_dir / f"surge_classification_{event}.csv",
-        sep=";"
-    )
+    # --- Load surge file (read once per event) ---
+    df_surges = load_surge_classification(event, str(base_dir)).copy()
 
     # --- Mapping ---
     surge_labels = {
@@ -291,6 +410,7 @@ def get_plot_columns(plot_variable: str, statistic: str):
 
 
 # Moving Average per frame plot Function
+@profiled()
 def plot_variable_against_frame(df_mova: pd.DataFrame, config,
                                 plot_variable, statistic,
                                 color_ma: str, label_name: str, y_label: str,
@@ -320,7 +440,7 @@ def plot_variable_against_frame(df_mova: pd.DataFrame, config,
     raw_col, ma_col = get_plot_columns(plot_variable, statistic)
 
     # --- Start plotting
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
     # Raw values
     ax.plot(
@@ -359,6 +479,7 @@ def plot_variable_against_frame(df_mova: pd.DataFrame, config,
     save_plot(fig, fig_name, config.OUTPUT_DIR, start_frame, end_frame)
 
 
+@profiled()
 def plot_piv_and_mean_velocity_per_frame(
     df_piv_mova: pd.DataFrame,
     df_mova: pd.DataFrame,
@@ -375,7 +496,7 @@ def plot_piv_and_mean_velocity_per_frame(
     end_frame = config.END_FRAME
 
     # --- Create figure and axes ---
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
 
     # --- Plot velocities ---
@@ -425,7 +546,20 @@ def plot_piv_and_mean_velocity_per_frame(
 
 # --- Function for plotting per Track data -----------------------------------------------------------------------
 
+def split_by_track(df: pd.DataFrame, columns: list) -> list[np.ndarray]:
+    """
+    Values of columns per track (tracks ascending, row order within a track kept), like iterating
+    df.groupby("track") without building a DataFrame per track.
+    """
+    track = df["track"].to_numpy()
+    order = np.argsort(track, kind="stable")
+    values = df[columns].to_numpy(dtype=float)[order]
+    starts = np.flatnonzero(np.diff(track[order])) + 1
+    return np.split(values, starts) if len(values) else []
+
+
 # --- XY Track path movement ---
+@profiled()
 def plot_xy_mov_tracks(df: pd.DataFrame, config,
                     title: str = None
 ):
@@ -435,11 +569,11 @@ def plot_xy_mov_tracks(df: pd.DataFrame, config,
     """
     fig, ax = plt.subplots(figsize=(8, 8))
 
-    # iterate over track IDs
-    for tid, df_track in df.groupby("track"):
-        ax.plot(df_track["bb_center_lidar_x"],
-                df_track["bb_center_lidar_y"],
-                linewidth=1)
+    # all track paths as one collection (one artist instead of one line per track), colors of the axes cycle
+    cycle_colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    paths = split_by_track(df, ["bb_center_lidar_x", "bb_center_lidar_y"])
+    ax.add_collection(LineCollection(paths, colors=[cycle_colors[i % len(cycle_colors)] for i in range(len(paths))],
+                                     linewidth=1))
 
     style_main_axis(ax,
                     xlim=config.X_LIM_AXIS,
@@ -455,6 +589,7 @@ def plot_xy_mov_tracks(df: pd.DataFrame, config,
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 
+@profiled()
 def plot_xy_mov_tracks_color_vel(
     df: pd.DataFrame, config,
     line_width: float = 1,
@@ -466,35 +601,39 @@ def plot_xy_mov_tracks_color_vel(
     Plot tracks as smooth continuous lines colored by velocity.
     Small line segments are interpolated to make the line visually smooth.
     """
+    from scipy.interpolate import interp1d     # only needed for this plot
 
     fig, ax = plt.subplots(figsize=(10, 10))
     cmap = cm.get_cmap(cmap_name)
 
-    for tid, df_track in df.groupby("track"):
-
-        df_track = df_track.iloc[::3]
+    all_segments, all_colors = [], []
+    t_new = np.linspace(0, 1, interp_points)
+    for track_xyv in split_by_track(df, ["bb_center_lidar_x", "bb_center_lidar_y", "velocity"]):
 
-        x = df_track["bb_center_lidar_x"].values
-        y = df_track["bb_center_lidar_y"].values
-        v = df_track["velocity"].values
-        if len(x) < 2:
+        track_xyv = track_xyv[::3]
+        if len(track_xyv) < 2:
             continue
+        x, y, v = track_xyv.T
         # Interpolate to more points for smoothness
-        t = np.linspace(0, 1, len(x))
-        t_new = np.linspace(0, 1, interp_points)
+        t = np.linspace(0, 1, len(track_xyv))
 
-
-        x_smooth = interp1d(t, x, kind='cubic' if len(df_track) >= 5 else 'linear')(t_new) # short tracks are interpolated linear
-        y_smooth = interp1d(t, y, kind='cubic' if len(df_track) >= 5 else 'linear')(t_new)
+        # x and y in one spline call, short tracks are interpolated linear
+        x_smooth, y_smooth = interp1d(t, np.vstack([x, y]), kind='cubic' if len(track_xyv) >= 5 else 'linear',
+                                      axis=1)(t_new)
         v_smooth = interp1d(t, v, kind='linear')(t_new)  # velocity linear
 
         # Create segments for gradient coloring
         points = np.array([x_smooth, y_smooth]).T.reshape(-1, 1, 2)
-        segments = np.concatenate([points[:-1], points[1:]], axis=1)
+        all_segments.append(np.concatenate([points[:-1], points[1:]], axis=1))
+
+        # colors scaled to the velocity range of the track (like a colormapped collection per track),
+        # missing velocities transparent
+        all_colors.append(cmap(Normalize()(np.ma.masked_invalid(v_smooth[1:])), alpha=alpha_line))
 
-        lc = LineCollection(segments, array=v_smooth[1:], cmap=cmap,
-                            linewidth=line_width, alpha=alpha_line)
-        ax.add_collection(lc)
+    # one collection for all tracks: a single artist to draw instead of one per track
+    if all_segments:
+        ax.add_collection(LineCollection(np.concatenate(all_segments), colors=np.concatenate(all_colors),
+                                         linewidth=line_width))
 
     # Axis formatting
     style_main_axis(ax,
@@ -522,6 +661,7 @@ def plot_xy_mov_tracks_color_vel(
 
 
 # --- Per Track Velocity smoothed with LOWESS / Surges segmented
+@profiled()
 def plot_track_velocities_lowess(
     df_per_track_statistic: pd.DataFrame,
     df_lowess: pd.DataFrame,
@@ -554,7 +694,7 @@ def plot_track_velocities_lowess(
         raise ValueError("plot_type must be either 'mean' or 'median'")
 
     # --- Start plotting
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
 
     # Raw values
@@ -594,6 +734,17 @@ def plot_track_velocities_lowess(
                 alpha=0.6,
                 zorder=3
             )
+        # Bootstrap confidence band of the LOWESS curve (calculations with config.BOOTSTRAP_REPLICATES > 0)
+        if "ci_low" in seg.columns:
+            ax.fill_between(
+                seg["frame"],
+                seg["ci_low"],
+                seg["ci_high"],
+                label=f"{config.BOOTSTRAP_CI:.0%} CI (bootstrap)" if i == 0 else None,
+                color="tab:blue",
+                alpha=0.25,
+                zorder=4
+            )
         # LOWESS velocity
         ax.plot(
             seg['frame'],
@@ -643,6 +794,7 @@ def plot_track_velocities_lowess(
 
 
 # --- Per Track Grainsize
+@profiled()
 def plot_track_grainsize_lowess(
     df_per_track_grainsize: pd.DataFrame,
     df_grainsize_lowess: pd.DataFrame,
@@ -654,7 +806,7 @@ def plot_track_grainsize_lowess(
     end_frame = config.END_FRAME
 
 
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
 
     # Raw values
     ax.scatter(
@@ -671,6 +823,18 @@ def plot_track_grainsize_lowess(
         rasterized=True  # optional but recommended
     )
 
+    # Bootstrap confidence band of the LOWESS curve (calculations with config.BOOTSTRAP_REPLICATES > 0)
+    if "ci_low" in df_grainsize_lowess.columns:
+        ax.fill_between(
+            df_grainsize_lowess["frame"],
+            df_grainsize_lowess["ci_low"],
+            df_grainsize_lowess["ci_high"],
+            label=f"{config.BOOTSTRAP_CI:.0%} CI (bootstrap)",
+            color="tab:blue",
+            alpha=0.25,
+            zorder=2
+        )
+
     ax.plot(
         df_grainsize_lowess['frame'],
         df_grainsize_lowess['lowess_mean_track_grainsize'],
@@ -699,7 +863,88 @@ def plot_track_grainsize_lowess(
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 
+# --- LOWESS parameter sweep (OEB_Lowess_Sweep.py)
+SWEEP_LABELS = {
+    "LOWESS_FRAME_WINDOW_SIZE": "window",
+    "LOWESS_GAP_THRESHOLD": "gap",
+    "LOWESS_SEGMENT_LENGTH": "min. tracks",
+    "LOWESS_ITERATIONS": "it",
+}
+
+
+@profiled()
+def plot_lowess_sweep(
+    df_per_track: pd.DataFrame,
+    value_col: str,
+    df_sweep: pd.DataFrame,
+    quantity: str,
+    df_time: pd.DataFrame, config,
+) -> None:
+
+    # Config Values
+    start_frame = config.START_FRAME
+    end_frame = config.END_FRAME
+
+    fig, ax = get_figure(config)
+
+    # Raw values
+    ax.scatter(
+        df_per_track["center_frame"],
+        df_per_track[value_col],
+        label="Mean velocity per track" if quantity == "velocity" else "Mean grain size per track",
+        s=10,
+        c="0.7",
+        alpha=0.45,
+        marker="o",
+        edgecolors="none",
+        linewidths=0,
+        zorder=1,
+        rasterized=True
+    )
+
+    # One curve per parameter set, broken between the LOWESS segments
+    parameter_sets = df_sweep["parameter_set"].unique()
+    colors = plt.get_cmap("viridis")(np.linspace(0, 0.9, max(len(parameter_sets), 1)))
+    varied = [name for name in SWEEP_LABELS if df_sweep[name].nunique() > 1] or list(SWEEP_LABELS)
+
+    for color, (_, df_set) in zip(colors, df_sweep.groupby("parameter_set", sort=True)):
+        df_set = df_set[df_set["frame"].between(start_frame, end_frame)]
+        if df_set.empty:
+            continue
+        frame = df_set["frame"].to_numpy(dtype=float)
+        values = df_set["lowess"].to_numpy(dtype=float)
+        breaks = np.flatnonzero(np.diff(df_set["segment"].to_numpy())) + 1
+        label = ", ".join(f"{SWEEP_LABELS[name]} {df_set[name].iloc[0]}" for name in varied)
+
+        ax.plot(
+            np.insert(frame, breaks, np.nan),
+            np.insert(values, breaks, np.nan),
+            label=label,
+            color=color,
+            linewidth=1.5,
+            zorder=3
+        )
+
+    # --- X and Y Axis
+    style_main_axis(ax,
+                    xlabel="Frame Number",
+                    ylabel="Velocity (m/s)" if quantity == "velocity" else "Grain Size (m)",
+                    xlim=(start_frame, end_frame),
+                    ylim=config.YLIM_VELOCITY if quantity == "velocity" else config.YLIM_GRAINSIZE)
+
+    # --- TOP axis (time in MM:SS)
+    add_time_top_axis(ax, df_time)
+
+    # --- Legend
+    add_standard_legend(ax)
+
+    # --- Save
+    fig_name = f"LOWESS_sweep_{quantity}_{config.EVENT}_{start_frame}_{end_frame}.jpeg"
+    save_plot(fig, fig_name, config.OUTPUT_DIR, start_frame, end_frame)
+
+
 # --- Bubble plot ---
+@profiled()
 def plot_track_grainsize_bubble(
     df_per_track_grainsize: pd.DataFrame,
     df_per_track_velocities: pd.DataFrame,
@@ -840,6 +1085,7 @@ def plot_track_grainsize_bubble(
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 # --- Track Vel with GS scaled
+@profiled()
 def plot_track_vel_and_grainsize(
     df_per_track_grainsize: pd.DataFrame,
     df_per_track_velocities: pd.DataFrame,
@@ -963,6 +1209,7 @@ def plot_track_vel_and_grainsize(
 
 
 # --- Cross-section Plots -----------------------------------------------------------------------------------
+@profiled()
 def plot_cross_section_velocity(df_clean: pd.DataFrame, config) -> None:
 
     # Filter DF with mask - define frame range & Y-AXIS movement range
@@ -1024,24 +1271,34 @@ def plot_cross_section_velocity(df_clean: pd.DataFrame, config) -> None:
 
 
 # --- Plot functions for Boulder Detections -------------------------------------------------------------------------
-def plot_number_of_detections(df_clean: pd.DataFrame,df_time, config) -> None:
-
-    # Config Values
-    start_frame = config.START_FRAME
-    end_frame = config.END_FRAME
-
-    # Filter first
-    df = df_clean.loc[df_clean["frame"].between(start_frame, end_frame)]
+def tracks_per_frame(df: pd.DataFrame, start_frame, end_frame, df_lod_counts=None, lod_column="filtered"):
+    """
+    Unique tracks per frame between start_frame and end_frame (one row per frame), or the column of the
+    LOD envelope of the detection counts (utils/lod.py) when one is given.
+    """
+    if df_lod_counts is not None:
+        return df_lod_counts[["frame", lod_column]].rename(columns={lod_column: "unique_tracks_per_frame"})
 
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts = (
+    df = df.loc[df["frame"].between(start_frame, end_frame)]
+    return (
         df.groupby("frame", as_index=False)
         .agg(unique_tracks_per_frame=("track", "nunique"))
         .sort_values("frame")
         .reset_index(drop=True)
     )
 
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+
+@profiled()
+def plot_number_of_detections(df_clean: pd.DataFrame,df_time, config, df_lod_counts=None) -> None:
+
+    # Config Values
+    start_frame = config.START_FRAME
+    end_frame = config.END_FRAME
+
+    # Unique tracks per frame (one row per frame)
+    df_counts = tracks_per_frame(df_clean, start_frame, end_frame, df_lod_counts, "filtered")
+
+    fig, ax = get_figure(config)
      
 
     ax.plot(
@@ -1073,24 +1330,17 @@ def plot_number_of_detections(df_clean: pd.DataFrame,df_time, config) -> None:
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 
-def plot_number_of_detections_yolo8(df_clean ,df_counts_yolo, df_time, config) -> None:
+@profiled()
+def plot_number_of_detections_yolo8(df_clean ,df_counts_yolo, df_time, config, df_lod_counts=None) -> None:
 
     # Config Values
     start_frame = config.START_FRAME
     end_frame = config.END_FRAME
 
-    # Filter first
-    df = df_clean.loc[df_clean["frame"].between(start_frame, end_frame)]
+    # Unique tracks per frame (one row per frame)
+    df_counts = tracks_per_frame(df_clean, start_frame, end_frame, df_lod_counts, "filtered")
 
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts = (
-        df.groupby("frame", as_index=False)
-        .agg(unique_tracks_per_frame=("track", "nunique"))
-        .sort_values("frame")
-        .reset_index(drop=True)
-    )
-
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
 
 
@@ -1133,37 +1383,23 @@ def plot_number_of_detections_yolo8(df_clean ,df_counts_yolo, df_time, config) -
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 
+@profiled()
 def plot_number_of_detections_yolo8_and_tracking(df_clean ,df_counts_yolo, df_raw, df_time, config,
                                                  legend_loc: str = "upper right",
                                                  add_surge_classes: bool = True,
                                                  legend_loc_surge: str = "upper left",
+                                                 df_lod_counts=None,
                                                  ) -> None:
 
     # Config Values
     start_frame = config.START_FRAME
     end_frame = config.END_FRAME
 
-    # Filter first
-    df_clean = df_clean.loc[df_clean["frame"].between(start_frame, end_frame)]
-    df_raw = df_raw.loc[df_raw["frame"].between(start_frame, end_frame)]
-
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts = (
-        df_clean.groupby("frame", as_index=False)
-        .agg(unique_tracks_per_frame=("track", "nunique"))
-        .sort_values("frame")
-        .reset_index(drop=True)
-    )
-
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts_raw = (
-        df_raw.groupby("frame", as_index=False)
-        .agg(unique_tracks_per_frame=("track", "nunique"))
-        .sort_values("frame")
-        .reset_index(drop=True)
-    )
+    # Unique tracks per frame (one row per frame)
+    df_counts = tracks_per_frame(df_clean, start_frame, end_frame, df_lod_counts, "filtered")
+    df_counts_raw = tracks_per_frame(df_raw, start_frame, end_frame, df_lod_counts, "tracked")
 
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
 
     ax.plot(
@@ -1218,37 +1454,23 @@ def plot_number_of_detections_yolo8_and_tracking(df_clean ,df_counts_yolo, df_ra
     save_plot(fig, fig_name, config.OUTPUT_DIR, config.START_FRAME, config.END_FRAME)
 
 
+@profiled()
 def plot_number_of_detections_tracked_and_filtered(df_clean, df_raw, df_time, config,
                                                  legend_loc: str = "upper right",
                                                  add_surge_classes: bool = True,
                                                  legend_loc_surge: str = "upper left",
+                                                 df_lod_counts=None,
                                                  ) -> None:
 
     # Config Values
     start_frame = config.START_FRAME
     end_frame = config.END_FRAME
 
-    # Filter first
-    df_clean = df_clean.loc[df_clean["frame"].between(start_frame, end_frame)]
-    df_raw = df_raw.loc[df_raw["frame"].between(start_frame, end_frame)]
+    # Unique tracks per frame (one row per frame)
+    df_counts = tracks_per_frame(df_clean, start_frame, end_frame, df_lod_counts, "filtered")
+    df_counts_raw = tracks_per_frame(df_raw, start_frame, end_frame, df_lod_counts, "tracked")
 
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts = (
-        df_clean.groupby("frame", as_index=False)
-        .agg(unique_tracks_per_frame=("track", "nunique"))
-        .sort_values("frame")
-        .reset_index(drop=True)
-    )
-
-    # Compute unique tracks per frame directly (one row per frame)
-    df_counts_raw = (
-        df_raw.groupby("frame", as_index=False)
-        .agg(unique_tracks_per_frame=("track", "nunique"))
-        .sort_values("frame")
-        .reset_index(drop=True)
-    )
-
-    fig, ax = plt.subplots(figsize=config.FIG_SIZE)
+    fig, ax = get_figure(config)
      
 
     ax.plot(
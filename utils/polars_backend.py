@@ -0,0 +1,185 @@
+# polars_backend.py
+
+import logging
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from utils.profiling import profiled
+
+
+# POLARS BACKEND (config.BACKEND = "polars")
+# Lazy, multithreaded versions of the filter steps, the per-frame statistics and the per-track statistics.
+# Polars uses one thread per core (POLARS_MAX_THREADS environment variable to limit it).
+# Missing values are nulls inside Polars (NaN is converted on entry), so mean / median skip them like pandas.
+# Results are equivalent to the pandas code (benchmarks/check_backends.py).
+
+XYZ_COLUMNS = ["bb_center_lidar_x", "bb_center_lidar_y", "bb_center_lidar_z"]
+ROW = "__row"
+
+
+def _to_lazy(df: pd.DataFrame) -> pl.LazyFrame:
+    """
+    Polars copy of df with a row position column, float columns as float64 and NaN as null.
+    """
+    lf = pl.from_pandas(df.reset_index(drop=True)).lazy().with_row_index(ROW)
+    float_cols = [c for c, dtype in df.dtypes.items() if np.issubdtype(dtype, np.floating)]
+    return lf.with_columns([pl.col(c).cast(pl.Float64).fill_nan(None) for c in float_cols])
+
+
+def _to_pandas(df: pl.DataFrame, index=None) -> pd.DataFrame:
+    out = df.drop(ROW).to_pandas()
+    if index is not None:
+        out.index = index
+    return out
+
+
+# --- Filter steps ---------------------------------------------------------------------------------------------
+@profiled("filter_polars")
+def filter_tracks(df_raw: pd.DataFrame, config) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Filter steps 1 - 5 of OEB_Filter_process (range, rolling median, y-movement, jump, slow tracks).
+    Returns df_clean and df_bad like the pandas steps: sorted by track and frame, df_bad keeps the
+    index of df_raw, df_clean has a new index.
+    """
+    lf = _to_lazy(df_raw)
+
+    # Step 1 - range filter, zeros -> missing
+    vel_range, gs_range = config.VELOCITY_RANGE, config.GRAINSIZE_RANGE
+    lf = lf.with_columns([
+        pl.when(pl.col(col).is_between(*rng) & (pl.col(col) != 0)).then(pl.col(col)).otherwise(None).alias(col)
+        for col, rng in [("velocity", vel_range), ("grainsize", gs_range)]
+    ])
+
+    # Step 2 - adaptive rolling median, one pass per window size (only a handful of sizes exist)
+    lf = lf.with_columns(
+        pl.max_horizontal(config.MIN_ROLL_WINDOW,
+                          pl.min_horizontal(config.MAX_ROLL_WINDOW, pl.len().over("track") // 5)).alias("__window")
+    ).with_columns(
+        (pl.col("__window") + (pl.col("__window") % 2 == 0).cast(pl.Int64)).alias("__window")
+    )
+    df = lf.collect()
+
+    windows = df["__window"].unique().sort().to_list()
+    parts = []
+    for w in windows:
+        parts.append(
+            df.lazy().filter(pl.col("__window") == w).with_columns([
+                pl.col(col).rolling_median(window_size=w, center=True, min_samples=3)
+                .over("track").alias(f"{col}_median_filtered")
+                for col in ["velocity", "grainsize"]
+            ])
+        )
+    lf = pl.concat(parts).sort(ROW).drop("__window") if parts else df.lazy().drop("__window")
+
+    # Sorted by track and frame for steps 3 - 5 (stable, like the pandas sort)
+    df = lf.sort(["track", "frame"], maintain_order=True).collect()
+
+    # Step 3 - y-axis movement
+    y = pl.col("bb_center_lidar_y")
+    movement = df.lazy().group_by("track").agg(
+        n=pl.len(),
+        diff1=y.last() - y.slice(1, 1).first(),
+        diff2=y.slice(-2, 1).first() - y.slice(2, 1).first(),
+        diff_long=y.tail(5).median() - y.head(5).median(),
+    ).with_columns(
+        moving=pl.when(pl.col("n") < 3).then(False)
+        .when(pl.col("n") < 20)
+        .then((pl.col("diff1") < -config.YAXIS_MIN_LENGTH) & (pl.col("diff2") < -config.YAXIS_MIN_LENGTH))
+        .otherwise(pl.col("diff_long") < -config.YAXIS_MIN_LENGTH)
+        .fill_null(False)
+    ).collect()
+
+    total_tracks = len(movement)
+    moving_tracks = movement.filter(pl.col("moving"))["track"]
+    logging.info(' --- 1. Filter Step - Y-Axis Movement ---\n'
+                 f"Number of Track IDs: {total_tracks}\n"
+                 f"Tracks kept (movement > {config.YAXIS_MIN_LENGTH}): {len(moving_tracks)}\n"
+                 f"Tracks removed: {total_tracks - len(moving_tracks)}\n")
+    df = df.filter(pl.col("track").is_in(moving_tracks.implode()))
+
+    # Step 4 - jump filter on the max 3D step per track
+    step = sum((pl.col(c).diff().over("track")) ** 2 for c in XYZ_COLUMNS).sqrt()
+    max_jump = df.lazy().group_by("track").agg(max_jump=step.fill_nan(None).max()).collect()
+    good_tracks = max_jump.filter(pl.col("max_jump") <= config.JUMP_THRESHOLD)["track"]
+    bad_tracks = max_jump.filter(pl.col("max_jump") > config.JUMP_THRESHOLD)["track"]
+    logging.info(" --- Filter Step 2 - Jump Filter\n"
+                 f"Threshold: {config.JUMP_THRESHOLD}\n"
+                 f"Total received: {len(max_jump)}\n"
+                 f"Good tracks: {len(good_tracks)}\n"
+                 f"Bad tracks : {len(bad_tracks)}\n")
+
+    df_bad = df.filter(pl.col("track").is_in(bad_tracks.implode()))
+    df_good = df.filter(pl.col("track").is_in(good_tracks.implode()))
+
+    # Step 5 - slow tracks
+    track_stats = df_good.lazy().group_by("track").agg(
+        track_vel_median=pl.col("velocity_median_filtered").median()
+    ).collect()
+    valid_tracks = track_stats.filter(pl.col("track_vel_median") >= config.MIN_MEDIAN_TRACK_VEL)["track"]
+    logging.info(" --- 2. Filter Step - very slow tracks \n"
+                 f"Total tracks: {len(track_stats)}\n"
+                 f"Tracks removed by min track median velocity filter: {len(track_stats) - len(valid_tracks)} \n"
+                 f"Tracks remaining: {len(valid_tracks)}\n")
+    df_clean = df_good.filter(pl.col("track").is_in(valid_tracks.implode()))
+
+    return (
+        _to_pandas(df_clean),
+        _to_pandas(df_bad, index=df_raw.index[df_bad[ROW].to_numpy()]),
+    )
+
+
+# --- Statistics -----------------------------------------------------------------------------------------------
+def per_frame_stats(df_clean: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """
+    compute_mean_median_per_frame: mean / median of the filtered velocity and grain size per frame,
+    broadcast to every detection of the frame.
+    """
+    df = _to_lazy(df_clean[columns]).with_columns(
+        mean_velocity_per_frame=pl.col("velocity_median_filtered").mean().over("frame"),
+        mean_grainsize_per_frame=pl.col("grainsize_median_filtered").mean().over("frame"),
+        median_velocity_per_frame=pl.col("velocity_median_filtered").median().over("frame"),
+        median_grainsize_per_frame=pl.col("grainsize_median_filtered").median().over("frame"),
+    ).collect()
+    return _to_pandas(df, index=df_clean.index)
+
+
+def _center_frame() -> pl.Expr:
+    # frame of the detection at position size // 2 (row order) of the track
+    return pl.col("frame").get(pl.len() // 2).alias("center_frame")
+
+
+def _per_track(lf: pl.LazyFrame, *aggs) -> pd.DataFrame:
+    df = lf.group_by("track").agg(*aggs, _center_frame()).sort("track").collect()
+    return df.to_pandas().set_index("track")
+
+
+def track_velocity_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-track mean / median velocity and center frame, indexed by track.
+    """
+    return _per_track(
+        _to_lazy(df[["track", "frame", "velocity_median_filtered"]]),
+        pl.col("velocity_median_filtered").mean().alias("mean_track_velocity"),
+        pl.col("velocity_median_filtered").median().alias("median_track_velocity"),
+    )
+
+
+def track_grainsize_stats(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-track grain size statistics, bounding box width, length, duration, travelled distance and center frame,
+    indexed by track. df must be sorted by track and frame. Tracks without grain size are dropped.
+    """
+    step = sum((pl.col(c).diff().over("track")) ** 2 for c in XYZ_COLUMNS).sqrt()
+    df_stats = _per_track(
+        _to_lazy(df).with_columns(step.alias("step_distance")),
+        pl.col("grainsize_median_filtered").mean().alias("mean_track_grainsize"),
+        pl.col("grainsize_median_filtered").median().alias("median_track_grainsize"),
+        pl.col("bb_width").mean().alias("mean_track_bb_width"),
+        pl.col("frame").count().alias("track_length_frames"),
+        (pl.col("time").max() - pl.col("time").min()).alias("track_duration"),
+        pl.col("step_distance").sum().alias("track_distance"),
+    )
+    df_stats["track_length_frames"] = df_stats["track_length_frames"].astype(np.int64)
+    return df_stats.dropna(subset=["mean_track_grainsize", "median_track_grainsize"])
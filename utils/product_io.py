@@ -0,0 +1,267 @@
+# product_io.py
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+from utils.schema import enforce_schema
+
+
+# PIPELINE PRODUCTS (df_<product>_<event>.parquet in OUTPUT_DIR)
+# Parquet in OUTPUT_DIR is the archival format of every product. Two faster copies exist next to it:
+# - config.INTERMEDIATE_FORMAT = "arrow": an uncompressed Arrow IPC file (df_<product>_<event>.arrow) in
+#   OUTPUT_DIR, memory-mapped on read -> hot intermediates between filter, calculations and plots
+# - parallel runs: the products are published to a shared-memory folder, so worker processes
+#   memory-map one copy (zero copy for numeric columns) instead of each decoding the Parquet file.
+# Appended products (incremental run) are a folder of that name holding part-NNNNN.parquet files, read as one
+# table, until compact_product() writes them back as a single file.
+
+SHARED_DIR_ENV = "OEB_SHARED_DIR"
+
+# Products of the calculations that get the frame window in their name when config.WINDOWED_CALCULATION is on,
+# e.g. df_mova_f65500-72500_<event>.parquet ("stats" only names the CSV export)
+WINDOWED_PRODUCTS = ["stats", "mova", "piv_mova", "per_track_velocities", "velocities_lowess",
+                     "per_track_grainsize", "grainsize_lowess"]
+
+
+def product_path(product: str, event: str | None = None, output_dir=None, ext: str = "parquet") -> Path:
+    """
+    File of a pipeline product, e.g. product_path("clean") -> OUTPUT_DIR/df_clean_<EVENT>.parquet
+    """
+    if event is None:
+        event = config.EVENT
+    if output_dir is None:
+        output_dir = config.OUTPUT_DIR if event == config.EVENT else Path.cwd() / "output" / event
+    return Path(output_dir) / f"df_{product}_{event}.{ext}"
+
+
+def window_product_name(product: str, start_frame: int, end_frame: int) -> str:
+    return f"{product}_f{start_frame}-{end_frame}"
+
+
+def resolve_product(product: str) -> str:
+    """
+    Name under which a product is stored in this run: calculation products of a windowed run
+    (config.WINDOWED_CALCULATION) carry the frame window START_FRAME - END_FRAME.
+    """
+    if config.WINDOWED_CALCULATION and product in WINDOWED_PRODUCTS:
+        return window_product_name(product, config.START_FRAME, config.END_FRAME)
+    return product
+
+
+def read_product(product: str, columns: list | None = None, event: str | None = None,
+                 windowed: bool = True) -> pd.DataFrame:
+    """
+    Load a product (windowed=False: always the whole-event product, also in a windowed run): attach to the
+    shared-memory copy if one is published, otherwise read the memory-mapped Arrow cache
+    (INTERMEDIATE_FORMAT = "arrow", rebuilt if older than the Parquet file) or the Parquet file.
+    """
+    if windowed:
+        product = resolve_product(product)
+
+    df = attach_shared_product(product, columns=columns, event=event)
+    if df is not None:
+        return df
+
+    if config.INTERMEDIATE_FORMAT == "arrow":
+        return read_arrow_ipc(ensure_arrow_cache(product, event), columns)
+
+    return pd.read_parquet(product_path(product, event), columns=columns)
+
+
+def ensure_arrow_cache(product: str, event: str | None = None) -> Path:
+    """
+    Arrow cache of a stored product (resolved name), built from the Parquet file if it is missing or older.
+    Parallel runs build the caches of their existing inputs once before the workers start (OEB_main.py).
+    """
+    parquet_path = product_path(product, event)
+    arrow_path = product_path(product, event, ext="arrow")
+    if not arrow_path.exists() or arrow_path.stat().st_mtime < parquet_path.stat().st_mtime:
+        # first read after a Parquet-only run
+        write_arrow_ipc(pd.read_parquet(parquet_path), arrow_path)
+    return arrow_path
+
+
+def load_products(products: list, columns: dict | None = None, event: str | None = None,
+                  extra_loaders: dict | None = None, max_workers: int | None = None) -> dict:
+    """
+    Load several products concurrently (thread pool: file I/O and Parquet decoding release the GIL, so the reads
+    overlap, which matters most on a network drive) and return them together as {product: DataFrame}.
+    columns: optional column projection per product, e.g. {"clean": ["frame", "track"]}
+    extra_loaders: further inputs of the stage loaded in the same pool, {name: callable without arguments}
+    """
+    columns = columns or {}
+    jobs = {product: (read_product, (product, columns.get(product), event)) for product in products}
+    jobs.update({name: (loader, ()) for name, loader in (extra_loaders or {}).items()})
+
+    if max_workers is None:
+        max_workers = min(len(jobs), config.LOAD_WORKERS)
+    if max_workers <= 1:
+        return {name: func(*args) for name, (func, args) in jobs.items()}
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="load_products") as pool:
+        futures = {name: pool.submit(func, *args) for name, (func, args) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def write_product(df: pd.DataFrame, product: str, event: str | None = None) -> Path:
+    """
+    Save a product (compact dtypes, scratch columns dropped) as Parquet, plus the Arrow cache
+    (INTERMEDIATE_FORMAT = "arrow") and the shared-memory copy when a shared folder is active.
+    """
+    df = enforce_schema(df, product)
+    shared = get_shared_dir() is not None and product in config.SHARED_PRODUCTS
+    product = resolve_product(product)
+
+    out_path = product_path(product, event)
+    if out_path.is_dir():
+        shutil.rmtree(out_path)         # parts of an appended product
+    df.to_parquet(out_path)
+
+    if config.INTERMEDIATE_FORMAT == "arrow":
+        write_arrow_ipc(df, product_path(product, event, ext="arrow"))
+
+    if shared:
+        publish_shared_product(df, product, event)
+
+    return out_path
+
+
+def append_product(df_new: pd.DataFrame, product: str, event: str | None = None) -> Path:
+    """
+    Append rows to a product as a new part file, the stored rows are not read or rewritten. The product
+    becomes a folder of part-NNNNN.parquet (index kept as a column), every part is cast to the schema of the first.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = product_path(resolve_product(product), event)
+    if path.is_file():
+        # product of a batch run: first part of the folder
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        os.replace(path, tmp_path)
+        path.mkdir()
+        os.replace(tmp_path, path / "part-00000.parquet")
+    path.mkdir(parents=True, exist_ok=True)
+
+    parts = sorted(path.glob("part-*.parquet"))
+    table = pa.Table.from_pandas(enforce_schema(df_new, product), preserve_index=True)
+    if parts:
+        table = table.cast(pq.read_schema(parts[0]))
+
+    # hidden temporary name (not read as part of the dataset) until the part is complete
+    fd, tmp_name = tempfile.mkstemp(dir=path, prefix=".part-", suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_name)
+        os.replace(tmp_name, path / f"part-{len(parts):05d}.parquet")
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def compact_product(product: str, sort_by: list | None = None, reset_index: bool = False,
+                    event: str | None = None) -> None:
+    """
+    Parts of an appended product written back as a single file, sort_by / reset_index restore the row order of the
+    batch product.
+    """
+    if not product_path(resolve_product(product), event).is_dir():
+        return
+    df = read_product(product, event=event)
+    if sort_by is not None:
+        df = df.sort_values(sort_by, kind="stable")
+    if reset_index:
+        df = df.reset_index(drop=True)
+    write_product(df, product, event)
+
+
+# --- Shared-memory data plane ----------------------------------------------------------------------------------
+def get_shared_dir() -> Path | None:
+    shared_dir = os.environ.get(SHARED_DIR_ENV)
+    return Path(shared_dir) if shared_dir else None
+
+
+def create_shared_dir(prefix: str = "oeb_shared_") -> Path:
+    """
+    Create the shared folder (RAM backed /dev/shm where available) and export it to the environment,
+    so that worker processes started afterwards find the published products.
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    shared_dir = Path(tempfile.mkdtemp(prefix=prefix, dir=base))
+    os.environ[SHARED_DIR_ENV] = str(shared_dir)
+    return shared_dir
+
+
+def release_shared_dir() -> None:
+    shared_dir = get_shared_dir()
+    os.environ.pop(SHARED_DIR_ENV, None)
+    if shared_dir is not None:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+def _shared_path(product: str, event: str | None) -> Path:
+    return get_shared_dir() / f"df_{product}_{event or config.EVENT}.arrow"
+
+
+def write_arrow_ipc(df: pd.DataFrame, path: Path) -> None:
+    """
+    Uncompressed Arrow IPC file with the pandas metadata (category and nullable integer columns read back with
+    their dtypes). NaN of NumPy float columns stays NaN (no null bitmap), which keeps them zero-copy on read.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, column in enumerate(df.columns):
+        if isinstance(df[column].dtype, np.dtype) and df[column].dtype.kind == "f":
+            table = table.set_column(i, table.field(i), pa.array(df[column].to_numpy(), from_pandas=False))
+
+    # write to a temporary file of this writer first: readers never see a half written file, and parallel
+    # writers of the same cache do not share a temporary name
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.stem + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_name, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def read_arrow_ipc(path: Path, columns: list | None = None) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file. Numeric columns without nulls are returned without copying
+    (read-only arrays backed by the mapped file).
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    table = ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(split_blocks=True)
+
+
+def publish_shared_product(df: pd.DataFrame, product: str, event: str | None = None) -> Path:
+    path = _shared_path(product, event)
+    write_arrow_ipc(df, path)
+    return path
+
+
+def attach_shared_product(product: str, columns: list | None = None, event: str | None = None):
+    if get_shared_dir() is None:
+        return None
+    path = _shared_path(product, event)
+    if not path.exists():
+        return None
+    return read_arrow_ipc(path, columns)
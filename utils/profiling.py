@@ -0,0 +1,237 @@
+# profiling.py
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import config
+
+try:
+    import resource             # Unix only
+except ImportError:
+    resource = None
+
+try:
+    import psutil               # optional, needed for memory numbers on Windows
+except ImportError:
+    psutil = None
+
+
+# STAGE TIMING AND MEMORY PROFILER
+# Every profiled stage appends one record (wall time, CPU time, RSS, rows in/out) to _STAGE_METRICS.
+# The records are logged when the stage finishes and written to a JSON file per run with write_stage_metrics().
+# The peak RSS of a stage is the maximum of the RSS samples taken by a background thread while the stage runs
+# (every PROFILE_SAMPLE_SECONDS), the process high-water mark is recorded separately.
+
+_STAGE_METRICS: list[dict] = []
+_STAGE_STACK: list[str] = []
+
+PROFILE_SAMPLE_SECONDS = 0.05
+
+
+def _current_rss_mb() -> float | None:
+    if psutil is not None:
+        return psutil.Process(os.getpid()).memory_info().rss / 1024 ** 2
+    statm = Path("/proc/self/statm")
+    if statm.exists():
+        return int(statm.read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    return None
+
+
+def _peak_rss_mb() -> float | None:
+    """
+    Process high-water mark of the resident memory (since process start).
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process(os.getpid()).memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return None
+
+
+class _RssSampler:
+    """
+    Background thread sampling the RSS while at least one stage is open. Every open stage holds a
+    one-element list with its maximum so far, nested stages are updated by the same samples.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open_peaks: list[list] = []
+        self.thread = None
+
+    def start_stage(self, rss_start: float) -> list:
+        peak = [rss_start]
+        with self.lock:
+            self.open_peaks.append(peak)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="rss_sampler", daemon=True)
+                self.thread.start()
+        return peak
+
+    def end_stage(self, peak: list, rss_end: float) -> float:
+        with self.lock:
+            # by identity: nested stages can hold equal maxima
+            self.open_peaks = [p for p in self.open_peaks if p is not peak]
+        return max(peak[0], rss_end)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(PROFILE_SAMPLE_SECONDS)
+            rss = _current_rss_mb()
+            with self.lock:
+                if not self.open_peaks:
+                    self.thread = None          # restarted by the next stage
+                    return
+                for peak in self.open_peaks:
+                    peak[0] = max(peak[0], rss)
+
+
+_RSS_SAMPLER = _RssSampler()
+
+
+def count_rows(obj) -> int | None:
+    """
+    Rows of a DataFrame, or the summed rows of all DataFrames in a tuple/list (e.g. df_good, df_bad).
+    """
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        counts = [len(o) for o in obj if isinstance(o, pd.DataFrame)]
+        return sum(counts) if counts else None
+    return None
+
+
+@contextmanager
+def profile_stage(name: str, rows_in: int | None = None):
+    """
+    Measure a block of the pipeline. The yielded record can be completed by the caller,
+    e.g. record["rows_out"] = len(df).
+    """
+    record = {
+        "stage": name,
+        "parent": _STAGE_STACK[-1] if _STAGE_STACK else None,
+        "depth": len(_STAGE_STACK),
+        "rows_in": rows_in,
+        "rows_out": None,
+    }
+
+    if not config.PROFILE_STAGES:
+        yield record
+        return
+
+    rss_start = _current_rss_mb()
+    peak = _RSS_SAMPLER.start_stage(rss_start) if rss_start is not None else None
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    _STAGE_STACK.append(name)
+
+    try:
+        yield record
+    finally:
+        _STAGE_STACK.pop()
+        rss_end = _current_rss_mb()
+        peak_rss = _RSS_SAMPLER.end_stage(peak, rss_end) if peak is not None else None
+
+        record.update({
+            "wall_time_s": time.perf_counter() - wall_start,
+            "cpu_time_s": time.process_time() - cpu_start,
+            "rss_start_mb": rss_start,
+            "rss_end_mb": rss_end,
+            "peak_rss_mb": peak_rss,                                        # maximum while the stage ran
+            "peak_delta_mb": None if peak_rss is None else peak_rss - rss_start,
+            "process_peak_rss_mb": _peak_rss_mb(),                          # high-water mark since process start
+            "finished": datetime.now().isoformat(timespec="seconds"),
+        })
+        _STAGE_METRICS.append(record)
+
+        rows = ""
+        if record["rows_in"] is not None or record["rows_out"] is not None:
+            rows = f" | rows {record['rows_in']} -> {record['rows_out']}"
+        peak = "n/a"
+        if record["peak_rss_mb"] is not None:
+            peak = f"{record['peak_rss_mb']:.0f} MB (+{record['peak_delta_mb']:.0f} MB)"
+
+        logging.info(
+            f"[profile] {'  ' * record['depth']}{name}: "
+            f"wall {record['wall_time_s']:.2f} s | cpu {record['cpu_time_s']:.2f} s | "
+            f"peak RSS {peak}{rows}"
+        )
+
+
+def profiled(name: str | None = None):
+    """
+    Decorator version of profile_stage. Rows in are taken from the first DataFrame argument,
+    rows out from the returned DataFrame(s).
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = next(
+                (len(a) for a in list(args) + list(kwargs.values()) if isinstance(a, pd.DataFrame)),
+                None
+            )
+            with profile_stage(stage_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_stage_metrics() -> pd.DataFrame:
+    return pd.DataFrame(_STAGE_METRICS)
+
+
+def reset_stage_metrics() -> None:
+    _STAGE_METRICS.clear()
+
+
+def write_stage_metrics(output_dir, run_name: str = "run", records: list[dict] | None = None) -> Path | None:
+    """
+    Write all stage records of this run to <output_dir>/stage_metrics_<run_name>_<timestamp>.json.
+    records: stage records collected elsewhere (e.g. from worker processes), default are the records
+    of this process.
+    """
+    if records is None:
+        records = _STAGE_METRICS
+    if not records:
+        return None
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_path = output_dir / f"stage_metrics_{run_name}_{timestamp}.json"
+
+    report = {
+        "run": run_name,
+        "event": config.EVENT,
+        "start_frame": config.START_FRAME,
+        "end_frame": config.END_FRAME,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "stages": records,
+    }
+
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    logging.info(f"Stage metrics written to {out_path}")
+    return out_path
@@ -0,0 +1,274 @@
+# quantile_sketch.py
+
+import numpy as np
+import pandas as pd
+
+
+# MERGEABLE QUANTILE SKETCHES
+# A small t-digest style sketch: values are kept as (mean, weight) centroids sorted by mean.
+# As long as a sketch holds fewer values than `compression` it is exact, larger sketches are compressed
+# with the t-digest k1 scale function (small centroids at the tails, larger ones around the median).
+# Sketches of different frames, windows or worker processes merge by concatenating their centroids.
+# Rolling windows (sketch_percentile_bands) work on the flat centroids of all keys: every window is a contiguous
+# slice, so all windows are answered in one vectorized pass instead of merging sketch objects per row.
+
+class QuantileSketch:
+
+    def __init__(self, compression: int = 100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    @classmethod
+    def from_values(cls, values, compression: int = 100) -> "QuantileSketch":
+        sketch = cls(compression)
+        sketch.add(values)
+        return sketch
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values) -> "QuantileSketch":
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self._set_centroids(
+                np.concatenate([self.means, values]),
+                np.concatenate([self.weights, np.ones(len(values))]),
+            )
+        return self
+
+    def merge(self, *others: "QuantileSketch") -> "QuantileSketch":
+        """
+        Return a new sketch holding the values of this sketch and all others.
+        """
+        merged = QuantileSketch(self.compression)
+        merged._set_centroids(
+            np.concatenate([self.means] + [o.means for o in others]),
+            np.concatenate([self.weights] + [o.weights for o in others]),
+        )
+        return merged
+
+    def quantile(self, q):
+        """
+        Quantile(s) q in [0, 1]. Uses linear interpolation between the centroid centres,
+        which equals pandas/numpy 'linear' interpolation while the sketch is exact.
+        """
+        q = np.asarray(q, dtype=float)
+        if len(self.means) == 0:
+            return np.full(q.shape, np.nan)
+
+        # rank position (0-based) of each centroid centre
+        centres = np.cumsum(self.weights) - self.weights + (self.weights - 1) / 2
+        return np.interp(q * (self.count - 1), centres, self.means)
+
+    def _set_centroids(self, means, weights):
+        order = np.argsort(means, kind="stable")
+        means = means[order]
+        weights = weights[order]
+
+        if len(means) > self.compression:
+            means, weights = _compress_centroids(means, weights, self.compression)
+
+        self.means = means
+        self.weights = weights
+
+
+def _compress_centroids(means, weights, compression):
+    # t-digest k1 scale function: centroids whose left edge falls into the same unit of k are merged
+    total = weights.sum()
+    q_left = (np.cumsum(weights) - weights) / total
+    k_left = compression / (2 * np.pi) * np.arcsin(2 * np.clip(q_left, 0, 1) - 1)
+    bucket = np.floor(k_left + compression / 4).astype(np.int64)
+
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    new_weights = np.add.reduceat(weights, starts)
+    new_means = np.add.reduceat(means * weights, starts) / new_weights
+    return new_means, new_weights
+
+
+def build_sketches_per_key(
+    keys,
+    values,
+    compression: int = 100,
+) -> tuple[np.ndarray, list[QuantileSketch]]:
+    """
+    Build one sketch per unique key (e.g. per frame) in a single pass over the sorted values.
+
+    Returns
+    -------
+    unique_keys : np.ndarray
+        Sorted unique keys
+    sketches : list[QuantileSketch]
+        One sketch per unique key
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, dtype=float)
+
+    order = np.lexsort((values, keys))
+    keys = keys[order]
+    values = values[order]
+
+    unique_keys, starts = np.unique(keys, return_index=True)
+    bounds = np.append(starts, len(keys))
+
+    sketches = []
+    for i in range(len(unique_keys)):
+        sketch = QuantileSketch(compression)
+        sketch.add(values[bounds[i]:bounds[i + 1]])
+        sketches.append(sketch)
+
+    return unique_keys, sketches
+
+
+def centroids_per_key(keys, values, compression: int = 100) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Centroids of one sketch per unique key as flat arrays, without sketch objects: keys with at most
+    `compression` values keep their sorted values (weight 1), larger ones are compressed.
+
+    Returns
+    -------
+    unique_keys : np.ndarray
+        Sorted unique keys (also keys whose values are all NaN)
+    bounds : np.ndarray
+        Centroids of key i are means[bounds[i]:bounds[i + 1]]
+    means, weights : np.ndarray
+        Centroids of all keys, in key order
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values, dtype=float)
+    unique_keys = np.unique(keys)
+
+    valid = ~np.isnan(values)
+    keys, values = keys[valid], values[valid]
+    order = np.lexsort((values, keys))
+    keys, means = keys[order], values[order]
+    weights = np.ones(len(means))
+    bounds = np.searchsorted(keys, unique_keys, side="left")
+    bounds = np.append(bounds, len(keys))
+
+    large = np.flatnonzero(np.diff(bounds) > compression)
+    if len(large):
+        parts_m, parts_w, counts = [], [], np.diff(bounds)
+        previous = 0
+        for i in large:
+            parts_m.append(means[previous:bounds[i]])
+            parts_w.append(weights[previous:bounds[i]])
+            m, w = _compress_centroids(means[bounds[i]:bounds[i + 1]], weights[bounds[i]:bounds[i + 1]], compression)
+            parts_m.append(m)
+            parts_w.append(w)
+            counts[i] = len(m)
+            previous = bounds[i + 1]
+        parts_m.append(means[previous:])
+        parts_w.append(weights[previous:])
+        means, weights = np.concatenate(parts_m), np.concatenate(parts_w)
+        bounds = np.append(0, np.cumsum(counts))
+
+    return unique_keys, bounds, means, weights
+
+
+def rolling_centroid_quantiles(
+    bounds: np.ndarray,
+    means: np.ndarray,
+    weights: np.ndarray,
+    quantiles,
+    window: int,
+    max_cells: int = 2_000_000,
+) -> np.ndarray:
+    """
+    Quantiles over a centred rolling window of keys (same row window as pandas rolling(window, center=True,
+    min_periods=1)) from the flat centroids of centroids_per_key. The centroids of a window are contiguous, so all
+    windows are answered at once from a padded (windows x centroids) matrix, max_cells per block. The window
+    centroids are not compressed again: while the per-key sketches are exact the result equals the pandas
+    'linear' quantile of the window values. Returns an array (n_keys, n_quantiles).
+    """
+    quantiles = np.asarray(quantiles, dtype=float)
+    n = len(bounds) - 1
+    rows = np.arange(n)
+    first = bounds[np.maximum(0, rows - window // 2)]
+    last = bounds[np.minimum(n, rows - window // 2 + window)]
+    lengths = last - first
+
+    out = np.full((n, len(quantiles)), np.nan)
+    width = max(int(lengths.max()) if n else 0, 1)
+    block = max(1, max_cells // (width * max(len(quantiles), 1)))
+
+    # exact sketches (all weights 1): the centre of the i-th sorted value is i, no ranks to search
+    unit_weights = bool(np.all(weights == 1))
+
+    for b in range(0, n, block):
+        length = lengths[b:b + block]
+        cols = np.arange(width)
+        valid = cols < length[:, None]
+        idx = np.where(valid, first[b:b + block, None] + cols, 0)
+
+        m = np.where(valid, means[idx] if len(means) else 0.0, np.inf)
+        if unit_weights:
+            m = np.sort(m, axis=1)
+            target = quantiles[None, :] * np.maximum(length[:, None] - 1, 0)
+            lo = np.floor(target).astype(np.int64)
+            hi = np.minimum(lo + 1, np.maximum(length[:, None] - 1, 0))
+            m_lo, m_hi = np.take_along_axis(m, lo, axis=1), np.take_along_axis(m, hi, axis=1)
+            values = m_lo + (target - lo) * (m_hi - m_lo)
+            out[b:b + block] = np.where(length[:, None] > 0, values, np.nan)
+            continue
+
+        order = np.argsort(m, axis=1, kind="stable")
+        m = np.take_along_axis(m, order, axis=1)
+        w = np.take_along_axis(np.where(valid, weights[idx] if len(weights) else 0.0, 0.0), order, axis=1)
+
+        # rank position (0-based) of each centroid centre, padding behind every target
+        cumulative = np.cumsum(w, axis=1)
+        centres = np.where(valid, cumulative - w + (w - 1) / 2, np.inf)
+        target = quantiles[None, :] * (cumulative[:, -1:] - 1)
+
+        # linear interpolation between the neighbouring centres (np.interp per row)
+        above = (centres[:, None, :] <= target[:, :, None]).sum(axis=2)
+        top = np.maximum(length[:, None] - 1, 0)
+        lo = np.clip(above - 1, 0, top)
+        hi = np.clip(above, 0, top)
+        c_lo, c_hi = np.take_along_axis(centres, lo, axis=1), np.take_along_axis(centres, hi, axis=1)
+        m_lo, m_hi = np.take_along_axis(m, lo, axis=1), np.take_along_axis(m, hi, axis=1)
+        with np.errstate(invalid="ignore"):
+            fraction = np.where(c_hi > c_lo, np.clip((target - c_lo) / (c_hi - c_lo), 0, 1), 0.0)
+        values = m_lo + fraction * (m_hi - m_lo)
+        out[b:b + block] = np.where(length[:, None] > 0, values, np.nan)
+
+    return out
+
+
+def rolling_sketch_quantiles(
+    sketches: list[QuantileSketch],
+    quantiles,
+    window: int,
+) -> np.ndarray:
+    """
+    Quantiles over a centred rolling window of sketches (same row window as pandas
+    rolling(window, center=True, min_periods=1)). Returns an array (n_sketches, n_quantiles).
+    """
+    bounds = np.append(0, np.cumsum([len(s.means) for s in sketches]))
+    means = np.concatenate([s.means for s in sketches]) if sketches else np.empty(0)
+    weights = np.concatenate([s.weights for s in sketches]) if sketches else np.empty(0)
+    return rolling_centroid_quantiles(bounds, means, weights, quantiles, window)
+
+
+def sketch_percentile_bands(
+    df: pd.DataFrame,
+    key_col: str,
+    value_col: str,
+    percentiles: dict,
+    window: int,
+    compression: int = 100,
+) -> pd.DataFrame:
+    """
+    Rolling percentile bands answered from merged per-key sketches.
+    percentiles maps quantile -> output column, e.g. {0.05: "p5", 0.5: "p50"}.
+    """
+    keys, bounds, means, weights = centroids_per_key(df[key_col].to_numpy(), df[value_col].to_numpy(), compression)
+    values = rolling_centroid_quantiles(bounds, means, weights, list(percentiles), window)
+
+    df_bands = pd.DataFrame(values, columns=list(percentiles.values()))
+    df_bands.insert(0, "frame", keys)
+
+    return df_bands
@@ -0,0 +1,30 @@
+# run_utils.py
+
+from pathlib import Path
+
+
+def apply_run_settings(
+    config,
+    event: str | None = None,
+    start_frame: int | None = None,
+    end_frame: int | None = None,
+    **overrides,
+) -> None:
+    """
+    Point the config module at another event and/or frame window (e.g. inside a worker process).
+    The output folder follows the event. Further keyword arguments override config constants directly,
+    e.g. PROFILE_STAGES=False.
+    """
+    if event is not None:
+        config.EVENT = event
+        config.OUTPUT_DIR = Path.cwd() / "output" / event
+    if start_frame is not None:
+        config.START_FRAME = start_frame
+    if end_frame is not None:
+        config.END_FRAME = end_frame
+
+    for name, value in overrides.items():
+        if not name.isupper():
+            raise ValueError(f"Only config constants (upper case) can be overridden, got '{name}'")
+        setattr(config, name, value)
+
@@ -0,0 +1,111 @@
+# scheduler.py
+
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+# STAGE DEPENDENCY GRAPH SCHEDULER
+# Every task declares the products it reads (inputs) and writes (outputs). A task is ready as soon as all
+# inputs produced by other tasks of the run are finished; inputs not produced in this run must already exist.
+# Ready tasks run concurrently on a process pool, so the run time drops to the critical path of the graph.
+
+class Task:
+
+    def __init__(self, name: str, func, args=(), kwargs=None, inputs=(), outputs=()):
+        """
+        name : unique task name
+        func : picklable (top-level) callable run in the worker
+        inputs / outputs : hashable product ids, e.g. (event, "clean")
+        """
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+
+def resolve_dependencies(tasks: list[Task], product_exists=None) -> dict:
+    """
+    Map each task name to the set of task names it has to wait for.
+    Raises if a product is written twice or an input is neither produced nor available.
+    """
+    producers = {}
+    for task in tasks:
+        for product in task.outputs:
+            if product in producers:
+                raise ValueError(f"Product {product} is produced by '{producers[product]}' and '{task.name}'")
+            producers[product] = task.name
+
+    dependencies = {}
+    for task in tasks:
+        missing = [
+            p for p in task.inputs
+            if p not in producers and product_exists is not None and not product_exists(p)
+        ]
+        if missing:
+            raise FileNotFoundError(
+                f"Task '{task.name}' needs {missing}, which is neither produced in this run nor on disk"
+            )
+        dependencies[task.name] = {producers[p] for p in task.inputs if p in producers}
+
+    return dependencies
+
+
+def run_task_graph(tasks: list[Task], n_jobs: int = 1, product_exists=None) -> dict:
+    """
+    Run all tasks in dependency order, up to n_jobs at the same time. Returns {task name: result}.
+    """
+    dependencies = resolve_dependencies(tasks, product_exists)
+    by_name = {task.name: task for task in tasks}
+
+    pending = [task.name for task in tasks]
+    done = set()
+    results = {}
+    t_start = time.perf_counter()
+
+    def ready_tasks():
+        return [name for name in pending if dependencies[name] <= done]
+
+    def finished(name, result):
+        results[name] = result
+        done.add(name)
+        print(f"[scheduler] {time.perf_counter() - t_start:7.1f} s  done: {name}")
+
+    if n_jobs <= 1:
+        while pending:
+            ready = ready_tasks()
+            if not ready:
+                raise RuntimeError(f"Cyclic stage dependencies between {pending}")
+            name = ready[0]
+            pending.remove(name)
+            finished(name, by_name[name].run())
+        return results
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        running = {}
+
+        while pending or running:
+            for name in ready_tasks():
+                pending.remove(name)
+                running[executor.submit(by_name[name].run)] = name
+                print(f"[scheduler] {time.perf_counter() - t_start:7.1f} s  submitted: {name}")
+
+            if not running:
+                raise RuntimeError(f"Cyclic stage dependencies between {pending}")
+
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    for other in running:
+                        other.cancel()
+                    raise RuntimeError(f"Stage '{name}' failed") from e
+                finished(name, result)
+
+    return results
@@ -0,0 +1,155 @@
+# schema.py
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+# COMPACT DTYPES PER PIPELINE PRODUCT
+# Applied at the stage boundaries (after loading the raw data and in write_product). Frame / track ids fit
+# in int32 and all measurements in float32 (~7 significant digits, far below the measurement accuracy).
+# 'time' stays float64, it is used to match frames with the PIV time axis.
+
+FRAME_TRACK = {"frame": "int32", "track": "int32"}
+
+DETECTION_COLUMNS = {
+    "velocity": "float32",
+    "grainsize": "float32",
+    "bb_center_lidar_x": "float32",
+    "bb_center_lidar_y": "float32",
+    "bb_center_lidar_z": "float32",
+    "bb_width": "float32",
+    "time": "float64",
+}
+
+FILTERED_COLUMNS = {
+    "velocity_median_filtered": "float32",
+    "grainsize_median_filtered": "float32",
+}
+
+PER_FRAME_COLUMNS = {
+    "mean_velocity_per_frame": "float32",
+    "median_velocity_per_frame": "float32",
+    "mean_grainsize_per_frame": "float32",
+    "median_grainsize_per_frame": "float32",
+    "mean_vel_ma": "float32",
+    "median_vel_ma": "float32",
+    "mean_grain_ma": "float32",
+    "median_grain_ma": "float32",
+}
+
+LOWESS_COLUMNS = {
+    "frame": "float32",
+    "lowess_mean_track_velocity": "float32",
+    "lowess_median_track_velocity": "float32",
+    "lowess_mean_track_grainsize": "float32",
+    "p5": "float32",
+    "p25": "float32",
+    "p50": "float32",
+    "p75": "float32",
+    "p95": "float32",
+    "ci_low": "float32",
+    "ci_high": "float32",
+    "segment": "int32",
+}
+
+PRODUCT_SCHEMAS = {
+    "raw": {**FRAME_TRACK, **DETECTION_COLUMNS},
+    "clean": {**FRAME_TRACK, **DETECTION_COLUMNS, **FILTERED_COLUMNS},
+    "bad": {**FRAME_TRACK, **DETECTION_COLUMNS, **FILTERED_COLUMNS},
+    "time": {"frame": "int32", "time": "float64"},
+    "mova": {**FRAME_TRACK, **FILTERED_COLUMNS, **PER_FRAME_COLUMNS, "time": "float64"},
+    "piv_mova": {
+        "time_sec": "float64",
+        "frame": "float32",
+        "piv_vel_un_smoothed": "float32",
+        "piv_vel_smoothed": "float32",
+    },
+    "per_track_velocities": {
+        "track": "int32",
+        "mean_track_velocity": "float32",
+        "median_track_velocity": "float32",
+        "center_frame": "int32",
+        "segment": "int32",
+    },
+    "per_track_grainsize": {
+        "track": "int32",
+        "mean_track_grainsize": "float32",
+        "median_track_grainsize": "float32",
+        "mean_track_bb_width": "float32",
+        "track_length_frames": "int32",
+        "track_duration": "float32",
+        "track_distance": "float32",
+        "center_frame": "int32",
+        "segment": "int32",
+    },
+    "velocities_lowess": LOWESS_COLUMNS,
+    "grainsize_lowess": LOWESS_COLUMNS,
+    "lowess_sweep": {
+        "parameter_set": "int32",
+        "LOWESS_FRAME_WINDOW_SIZE": "int32",
+        "LOWESS_GAP_THRESHOLD": "int32",
+        "LOWESS_SEGMENT_LENGTH": "int32",
+        "LOWESS_ITERATIONS": "int32",
+        "quantity": "category",
+        "segment": "int32",
+        "frame": "float32",
+        "lowess": "float32",
+    },
+    "lod": {
+        "series": "category",
+        "level": "int32",
+        "frame": "int32",
+        "min": "float32",
+        "max": "float32",
+        "mean": "float32",
+        "count": "int32",
+    },
+}
+
+# Helper columns of the calculations that are not part of any saved product
+SCRATCH_COLUMNS = ["jump_dist", "step_distance", "frame_diff"]
+
+# Columns never downcast, also when not listed in a schema
+KEEP_FLOAT64 = {"time", "time_sec"}
+
+
+def _compact_dtype(series: pd.Series) -> str | None:
+    """
+    Compact dtype for a column without schema entry (extra columns of the tracking output).
+    """
+    if series.name in KEEP_FLOAT64:
+        return None
+    if series.dtype == np.float64:
+        return "float32"
+    if series.dtype == np.int64 and len(series) and \
+            np.iinfo(np.int32).min <= series.min() and series.max() <= np.iinfo(np.int32).max:
+        return "int32"
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        if len(series) and series.nunique() <= len(series) // 2:
+            return "category"
+    return None
+
+
+def enforce_schema(df: pd.DataFrame, product: str) -> pd.DataFrame:
+    """
+    Drop scratch columns and cast all columns to the compact dtypes of the product.
+    Integer targets are only applied to columns without missing values.
+    """
+    if not config.ENFORCE_SCHEMA:
+        return df
+
+    schema = PRODUCT_SCHEMAS.get(product, {})
+    df = df.drop(columns=[c for c in SCRATCH_COLUMNS if c in df.columns])
+
+    casts = {}
+    for col in df.columns:
+        target = schema.get(col) or _compact_dtype(df[col])
+        if target is None or df[col].dtype == target:
+            continue
+        if target.startswith("int") and df[col].isna().any():
+            continue
+        casts[col] = target
+
+    return df.astype(casts) if casts else df
@@ -0,0 +1,343 @@
+# track_kernels.py
+
+import logging
+import warnings
+
+import numpy as np
+
+import config
+
+try:
+    import numba                # optional, compiled loops for the per-track kernels
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+# PER-TRACK KERNELS
+# All kernels work on plain arrays sorted by (track, frame). A track is the row range offsets[t]:offsets[t + 1]
+# (see track_offsets). Each kernel has a Numba loop version (compiled on first use, cached in __pycache__) and a
+# pure NumPy version. config.TRACK_KERNELS selects the backend:
+# "auto" (Numba if installed, else NumPy), "numba", "numpy" or "pandas" (the original groupby code in the callers).
+
+def get_backend() -> str:
+    backend = getattr(config, "TRACK_KERNELS", "auto")
+    if backend == "auto":
+        return "numba" if NUMBA_AVAILABLE else "numpy"
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        logging.warning("TRACK_KERNELS = 'numba' but Numba is not installed -> NumPy kernels used")
+        return "numpy"
+    return backend
+
+
+def kernels_enabled() -> bool:
+    return get_backend() != "pandas"
+
+
+def _jit(func):
+    """
+    numba.njit when Numba is installed. Without Numba the plain Python loop is returned (never dispatched to).
+    """
+    if NUMBA_AVAILABLE:
+        return numba.njit(cache=True, nogil=True)(func)
+    return func
+
+
+# --- Track layout ---------------------------------------------------------------------------------------------
+def sort_order(track: np.ndarray, frame: np.ndarray | None = None) -> np.ndarray | None:
+    """
+    Row order that makes every track contiguous: by track and frame, or by track only (stable, keeps the row
+    order within a track) when frame is None. Returns None if the rows are already in that order.
+    """
+    if len(track) < 2:
+        return None
+
+    same_track = track[1:] == track[:-1]
+    in_order = (track[1:] > track[:-1]) | same_track
+    if frame is not None:
+        in_order &= ~same_track | (frame[1:] >= frame[:-1])
+    if in_order.all():
+        return None
+
+    if frame is None:
+        return np.argsort(track, kind="stable")
+    return np.lexsort((frame, track))
+
+
+def track_offsets(track: np.ndarray) -> np.ndarray:
+    """
+    Start offset of every track in a contiguous track array, plus the total length as last entry.
+    """
+    starts = np.flatnonzero(np.r_[True, track[1:] != track[:-1]]) if len(track) else np.empty(0, dtype=np.int64)
+    return np.r_[starts, len(track)].astype(np.int64)
+
+
+def center_index(offsets: np.ndarray) -> np.ndarray:
+    """
+    Row of the center detection of each track (position size // 2, same as cumcount == size // 2).
+    """
+    return offsets[:-1] + np.diff(offsets) // 2
+
+
+def adaptive_windows(lengths: np.ndarray, min_window: int, max_window: int) -> np.ndarray:
+    """
+    Rolling median window per track: 1/5 of the track length, clipped to [min_window, max_window], made odd.
+    """
+    windows = np.maximum(min_window, np.minimum(max_window, lengths // 5))
+    return windows + (windows % 2 == 0)
+
+
+# --- Numba loops ----------------------------------------------------------------------------------------------
+@_jit
+def _insert_sorted(buf, k, value):
+    m = k
+    while m > 0 and buf[m - 1] > value:
+        buf[m] = buf[m - 1]
+        m -= 1
+    buf[m] = value
+
+
+@_jit
+def _nanmedian_range(values, lo, hi, buf):
+    k = 0
+    for j in range(lo, hi):
+        if not np.isnan(values[j]):
+            _insert_sorted(buf, k, values[j])
+            k += 1
+    if k == 0:
+        return np.nan, 0
+    if k % 2 == 1:
+        return buf[k // 2], k
+    return (buf[k // 2 - 1] + buf[k // 2]) / 2, k
+
+
+@_jit
+def _rolling_median_loop(values, offsets, min_window, max_window, min_periods):
+    out = np.full(values.shape[0], np.nan)
+    buf = np.empty(max(min_window, max_window) + 1)
+    for t in range(offsets.shape[0] - 1):
+        s = offsets[t]
+        e = offsets[t + 1]
+        w = max(min_window, min(max_window, (e - s) // 5))
+        if w % 2 == 0:
+            w += 1
+        h = w // 2
+        for i in range(s, e):
+            median, k = _nanmedian_range(values, max(s, i - h), min(e, i + h + 1), buf)
+            if k >= min_periods:
+                out[i] = median
+    return out
+
+
+@_jit
+def _y_displacement_loop(y, offsets):
+    n_tracks = offsets.shape[0] - 1
+    out = np.full(n_tracks, np.nan)
+    buf = np.empty(5)
+    for t in range(n_tracks):
+        s = offsets[t]
+        e = offsets[t + 1]
+        n = e - s
+        if n < 3:
+            continue
+        if n < 20:
+            diff1 = y[e - 1] - y[s + 1]
+            diff2 = y[e - 2] - y[s + 2]
+            if not (np.isnan(diff1) or np.isnan(diff2)):
+                out[t] = max(diff1, diff2)
+        else:
+            y_start, _ = _nanmedian_range(y, s, s + 5, buf)
+            y_end, _ = _nanmedian_range(y, e - 5, e, buf)
+            out[t] = y_end - y_start
+    return out
+
+
+@_jit
+def _step_distance_loop(xyz, offsets):
+    out = np.empty(xyz.shape[0])
+    for t in range(offsets.shape[0] - 1):
+        s = offsets[t]
+        e = offsets[t + 1]
+        out[s] = np.nan
+        for i in range(s + 1, e):
+            dx = xyz[i, 0] - xyz[i - 1, 0]
+            dy = xyz[i, 1] - xyz[i - 1, 1]
+            dz = xyz[i, 2] - xyz[i - 1, 2]
+            out[i] = np.sqrt(dx * dx + dy * dy + dz * dz)
+    return out
+
+
+@_jit
+def _max_jump_loop(xyz, offsets):
+    n_tracks = offsets.shape[0] - 1
+    out = np.full(n_tracks, np.nan)
+    for t in range(n_tracks):
+        for i in range(offsets[t] + 1, offsets[t + 1]):
+            dx = xyz[i, 0] - xyz[i - 1, 0]
+            dy = xyz[i, 1] - xyz[i - 1, 1]
+            dz = xyz[i, 2] - xyz[i - 1, 2]
+            d = np.sqrt(dx * dx + dy * dy + dz * dz)
+            if not np.isnan(d) and (np.isnan(out[t]) or d > out[t]):
+                out[t] = d
+    return out
+
+
+@_jit
+def _jump_state_loop(xyz, offsets, threshold):
+    n_tracks = offsets.shape[0] - 1
+    state = np.full(n_tracks, -1, dtype=np.int8)
+    for t in range(n_tracks):
+        for i in range(offsets[t] + 1, offsets[t + 1]):
+            dx = xyz[i, 0] - xyz[i - 1, 0]
+            dy = xyz[i, 1] - xyz[i - 1, 1]
+            dz = xyz[i, 2] - xyz[i - 1, 2]
+            d = np.sqrt(dx * dx + dy * dy + dz * dz)
+            if d > threshold:
+                state[t] = 1
+                break           # early exit, the rest of the track does not matter
+            if d <= threshold:
+                state[t] = 0
+    return state
+
+
+# --- NumPy versions -------------------------------------------------------------------------------------------
+def _nanmedian_rows(window_values: np.ndarray) -> np.ndarray:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)     # all-NaN rows -> NaN
+        return np.nanmedian(window_values, axis=1)
+
+
+def _rolling_median_numpy(values, offsets, min_window, max_window, min_periods):
+    n_rows = len(values)
+    out = np.full(n_rows, np.nan)
+    lengths = np.diff(offsets)
+    windows = adaptive_windows(lengths, min_window, max_window)
+
+    row_start = np.repeat(offsets[:-1], lengths)
+    row_end = np.repeat(offsets[1:], lengths)
+    row_window = np.repeat(windows, lengths)
+    padded = np.r_[values, np.nan]          # index n_rows -> NaN for window positions outside the track
+
+    # one (rows x window) matrix per window size, only a handful of sizes exist
+    for w in np.unique(windows):
+        rows = np.flatnonzero(row_window == w)
+        idx = rows[:, None] + np.arange(-(w // 2), w // 2 + 1)
+        inside = (idx >= row_start[rows, None]) & (idx < row_end[rows, None])
+        window_values = padded[np.where(inside, idx, n_rows)]
+
+        enough = (~np.isnan(window_values)).sum(axis=1) >= min_periods
+        out[rows[enough]] = _nanmedian_rows(window_values[enough])
+    return out
+
+
+def _y_displacement_numpy(y, offsets):
+    lengths = np.diff(offsets)
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    out = np.full(len(lengths), np.nan)
+
+    short = (lengths >= 3) & (lengths < 20)
+    s, e = starts[short], ends[short]
+    out[short] = np.maximum(y[e - 1] - y[s + 1], y[e - 2] - y[s + 2])     # NaN if one of both is NaN
+
+    long = lengths >= 20
+    s, e = starts[long], ends[long]
+    y_start = _nanmedian_rows(y[s[:, None] + np.arange(5)])
+    y_end = _nanmedian_rows(y[e[:, None] - 5 + np.arange(5)])
+    out[long] = y_end - y_start
+    return out
+
+
+def _step_distance_numpy(xyz, offsets):
+    out = np.empty(len(xyz))
+    out[0:1] = np.nan
+    out[1:] = np.sqrt((np.diff(xyz, axis=0) ** 2).sum(axis=1))
+    out[offsets[:-1]] = np.nan             # no step across two tracks
+    return out
+
+
+def _max_jump_numpy(xyz, offsets):
+    # fmax ignores NaN -> NaN only if the whole track has no valid step
+    return np.fmax.reduceat(_step_distance_numpy(xyz, offsets), offsets[:-1])
+
+
+# --- Public kernels -------------------------------------------------------------------------------------------
+def _as_float(values) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def rolling_median(values, offsets, min_window: int, max_window: int, min_periods: int = 3) -> np.ndarray:
+    """
+    Centered rolling median per track with the adaptive window (pandas rolling(center=True).median()).
+    """
+    values = _as_float(values)
+    if len(values) == 0:
+        return values
+    if get_backend() == "numba":
+        return _rolling_median_loop(values, offsets, min_window, max_window, min_periods)
+    return _rolling_median_numpy(values, offsets, min_window, max_window, min_periods)
+
+
+def y_displacement(y, offsets) -> np.ndarray:
+    """
+    Downhill movement statistic per track, a track moves at least L when it is below -L: y_end - y_start
+    (medians of the first / last 5 detections), for tracks below 20 detections the larger of the two
+    inner differences (y[-1] - y[1], y[-2] - y[2]). NaN for tracks shorter than 3 detections.
+    """
+    y = _as_float(y)
+    if len(offsets) < 2:
+        return np.empty(0)
+    if get_backend() == "numba":
+        return _y_displacement_loop(y, offsets)
+    return _y_displacement_numpy(y, offsets)
+
+
+def y_movement_mask(y, offsets, min_length: float) -> np.ndarray:
+    """
+    True for tracks that move at least min_length downhill (negative y) between start and end.
+    Tracks shorter than 3 detections are never moving.
+    """
+    return y_displacement(y, offsets) < -min_length         # NaN -> False
+
+
+def step_distance(xyz, offsets) -> np.ndarray:
+    """
+    3D distance to the previous detection of the same track (NaN for the first detection).
+    """
+    xyz = _as_float(xyz)
+    if len(xyz) == 0:
+        return np.empty(0)
+    if get_backend() == "numba":
+        return _step_distance_loop(xyz, offsets)
+    return _step_distance_numpy(xyz, offsets)
+
+
+def max_jump(xyz, offsets) -> np.ndarray:
+    """
+    Largest 3D step per track (NaN if the track has no valid step).
+    """
+    xyz = _as_float(xyz)
+    if len(offsets) < 2:
+        return np.empty(0)
+    if get_backend() == "numba":
+        return _max_jump_loop(xyz, offsets)
+    return _max_jump_numpy(xyz, offsets)
+
+
+def jump_state(xyz, offsets, threshold: float) -> np.ndarray:
+    """
+    Per track: 1 = a step above threshold, 0 = all steps below, -1 = no valid step.
+    The Numba loop stops at the first jump of a track.
+    """
+    xyz = _as_float(xyz)
+    if len(offsets) < 2:
+        return np.empty(0, dtype=np.int8)
+    if get_backend() == "numba":
+        return _jump_state_loop(xyz, offsets, float(threshold))
+
+    jumps = _max_jump_numpy(xyz, offsets)
+    state = np.full(len(jumps), -1, dtype=np.int8)
+    state[jumps <= threshold] = 0
+    state[jumps > threshold] = 1
+    return state
@@ -0,0 +1,85 @@
+# window_sweep.py
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from utils.run_utils import apply_run_settings
+
+
+# MULTI-WINDOW PLOTTING (sweep mode)
+# The products of a plot stage are loaded once and sorted by frame once. Every frame window is then a
+# searchsorted slice (a view, no boolean mask over the whole event) and the figures of all windows are
+# rendered one after the other (template figures are reused) or on a process pool (config.SWEEP_JOBS).
+# Output goes to the <start>_<end> folders of save_plot, like a run per window.
+
+class FrameSlicer:
+
+    def __init__(self, df: pd.DataFrame, column: str = "frame", pad: int = 0):
+        """
+        df : product, sorted by column here if it is not sorted yet (stable, keeps the order within a frame)
+        column : frame column of the product ('frame', 'center_frame', ...)
+        pad : rows kept before and after the window, so lines run on to the plot edge
+        """
+        frames = df[column].to_numpy()
+        if len(frames) > 1 and not (frames[1:] >= frames[:-1]).all():
+            order = np.argsort(frames, kind="stable")
+            df = df.iloc[order]
+            frames = frames[order]
+
+        self.df = df
+        self.frames = frames
+        self.pad = pad
+
+    def window(self, start: int, end: int) -> pd.DataFrame:
+        lo = max(int(np.searchsorted(self.frames, start, side="left")) - self.pad, 0)
+        hi = min(int(np.searchsorted(self.frames, end, side="right")) + self.pad, len(self.frames))
+        return self.df.iloc[lo:hi]
+
+
+def config_settings() -> dict:
+    """
+    All config constants, passed to the sweep workers (a spawned worker imports config fresh).
+    """
+    return {name: getattr(config, name) for name in dir(config) if name.isupper()}
+
+
+def _render_window(render, window: tuple, dfs: dict, settings: dict, render_kwargs: dict) -> tuple:
+    start, end = window
+    apply_run_settings(config, **{**settings, "START_FRAME": start, "END_FRAME": end})
+    render(dfs, **render_kwargs)
+    return window
+
+
+def sweep_windows(render, dfs: dict, slicing: dict, windows: list, n_jobs: int | None = None,
+                  **render_kwargs) -> None:
+    """
+    Call render(dfs, **render_kwargs) for every (start, end) window with config.START_FRAME / END_FRAME set
+    to the window and the products in slicing ({product: (frame column, pad)}) cut to the window.
+    Products not in slicing are passed whole. render must be a module-level function (process pool).
+    """
+    n_jobs = config.SWEEP_JOBS if n_jobs is None else n_jobs
+    slicers = {name: FrameSlicer(dfs[name], column, pad) for name, (column, pad) in slicing.items() if name in dfs}
+
+    def window_dfs(start, end):
+        return {name: slicers[name].window(start, end) if name in slicers else df for name, df in dfs.items()}
+
+    settings = config_settings()
+
+    if n_jobs <= 1 or len(windows) <= 1:
+        try:
+            for start, end in windows:
+                _render_window(render, (start, end), window_dfs(start, end), settings, render_kwargs)
+        finally:
+            apply_run_settings(config, start_frame=settings["START_FRAME"], end_frame=settings["END_FRAME"])
+        return
+
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(windows))) as executor:
+        futures = [
+            executor.submit(_render_window, render, (start, end), window_dfs(start, end), settings, render_kwargs)
+            for start, end in windows
+        ]
+        for future in futures:
+            start, end = future.result()
+            print(f"--- Window {start} - {end} rendered --- ")